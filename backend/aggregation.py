@@ -0,0 +1,83 @@
+from typing import Dict, Iterable, Optional
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+import models
+
+# Sub-PnL metrics that roll up into the parent PnL as plain totals
+SUM_FIELDS = (
+    "features_shipped",
+    "total_testcases_executed",
+    "total_bugs_logged",
+    "regression_bugs_found",
+    "escaped_bugs",
+)
+
+# Sub-PnL metrics that roll up as an average over Sub-PnLs that have metrics
+AVERAGE_FIELDS = (
+    "sanity_time_avg_hours",
+    "automation_coverage_percent",
+)
+
+ROLLUP_FIELDS = SUM_FIELDS + AVERAGE_FIELDS
+
+def _empty_totals() -> dict:
+    totals = {field: 0 for field in ROLLUP_FIELDS}
+    totals["metrics_count"] = 0
+    return totals
+
+def aggregate_sub_pnl_totals(db: Session, pnl_ids: Optional[Iterable[int]] = None) -> Dict[int, dict]:
+    """Sum Sub-PnL metrics per PnL with a single grouped query.
+
+    Returns raw totals keyed by PnL id; every requested PnL is present, PnLs
+    without Sub-PnLs get zeros. Only the first metrics row of each Sub-PnL
+    is counted, matching the ``sub_pnl.sub_pnl_metrics[0]`` semantics of the
+    original Python rollup.
+    """
+    metrics = models.SubPnLMetrics
+    first_metrics_ids = select(func.min(metrics.id)).group_by(metrics.sub_pnl_id)
+
+    columns = [
+        func.coalesce(func.sum(getattr(metrics, field)), 0).label(field)
+        for field in ROLLUP_FIELDS
+    ]
+    stmt = (
+        select(models.PnL.id.label("pnl_id"), *columns, func.count(metrics.id).label("metrics_count"))
+        .select_from(models.PnL)
+        .outerjoin(models.SubPnL, models.SubPnL.pnl_id == models.PnL.id)
+        .outerjoin(metrics, and_(
+            metrics.sub_pnl_id == models.SubPnL.id,
+            metrics.id.in_(first_metrics_ids)
+        ))
+        .group_by(models.PnL.id)
+    )
+
+    if pnl_ids is not None:
+        pnl_ids = list(pnl_ids)
+        if not pnl_ids:
+            return {}
+        stmt = stmt.where(models.PnL.id.in_(pnl_ids))
+
+    totals = {row.pnl_id: dict(row._mapping) for row in db.execute(stmt)}
+    for values in totals.values():
+        values.pop("pnl_id")
+    return totals
+
+def rollup_from_totals(totals: dict) -> dict:
+    """Turn raw Sub-PnL totals into PnL metric values (sums and averages)"""
+    divisor = max(totals["metrics_count"], 1)
+    values = {field: totals[field] for field in SUM_FIELDS}
+    for field in AVERAGE_FIELDS:
+        values[field] = totals[field] / divisor
+    return values
+
+def aggregate_pnl_rollups(db: Session, pnl_ids: Optional[Iterable[int]] = None) -> Dict[int, dict]:
+    """PnL metric values for many PnLs (or all of them) in one query"""
+    return {
+        pnl_id: rollup_from_totals(totals)
+        for pnl_id, totals in aggregate_sub_pnl_totals(db, pnl_ids).items()
+    }
+
+def compute_pnl_rollup(db: Session, pnl_id: int) -> dict:
+    """PnL metric values aggregated from the Sub-PnLs of a single PnL"""
+    totals = aggregate_sub_pnl_totals(db, [pnl_id]).get(pnl_id, _empty_totals())
+    return rollup_from_totals(totals)
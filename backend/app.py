@@ -1,13 +1,39 @@
-from fastapi import FastAPI, Depends, HTTPException, Header, status
+from fastapi import FastAPI, Body, Depends, HTTPException, Header, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
-from typing import List, Optional
+from typing import Any, List, Optional
 from datetime import datetime
-import json
+import logging
 import models
 import schemas
-from database import get_db, engine
-from security import hash_password, verify_password, create_token, decode_token
+import auth
+import refresh_tokens
+import aggregation
+import rollups
+import defaults
+import cache
+import conditional
+import pagination
+import metrics_history
+import bulk_metrics
+import ingest
+import export
+import trends
+import as_of
+import detail_versions
+import events
+import views
+import batch_reads
+import responses
+import derived
+from cache import response_cache
+from password_pool import password_pool
+import database
+from database import get_async_db, engine
+from security import create_user_token
 
 # Create database tables
 models.Base.metadata.create_all(bind=engine)
@@ -15,8 +41,11 @@ models.Base.metadata.create_all(bind=engine)
 app = FastAPI(
     title="QAlytics API",
     description="Quality Analytics and Metrics Platform - Hierarchical PnL Management",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=responses.FastJSONResponse
 )
+# Response models are validated and encoded to JSON in one pass
+app.router.route_class = responses.FastJSONRoute
 
 # CORS middleware
 app.add_middleware(
@@ -25,10 +54,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified", "X-Next-Cursor"],
 )
 
+logger = logging.getLogger("uvicorn.error")
+
+@app.on_event("startup")
+async def report_pool_config():
+    settings = ", ".join(f"{key}={value}" for key, value in database.pool_config().items())
+    logger.info("Database pool: %s", settings)
+
 # Dependency to get current user
-def get_current_user(authorization: Optional[str] = Header(None), db: Session = Depends(get_db)) -> models.User:
+async def get_current_user(authorization: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)) -> auth.Principal:
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -37,189 +74,193 @@ def get_current_user(authorization: Optional[str] = Header(None), db: Session =
         )
     
     token = authorization.split(" ")[1]
-    user_id = decode_token(token)
-    
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    
-    return user
-
-def convert_decimals_to_float(data):
-    """Convert Decimal values to float for JSON serialization"""
-    if isinstance(data, dict):
-        return {key: convert_decimals_to_float(value) for key, value in data.items()}
-    elif isinstance(data, list):
-        return [convert_decimals_to_float(item) for item in data]
-    elif hasattr(data, '__float__'):  # This includes Decimal
-        return float(data)
-    else:
-        return data
+    
+    # Role and email come from the token; the users table is only hit for old tokens
+    return await auth.authenticate(token, lambda user_id: db.get(models.User, user_id))
 
-def create_metrics_history(db: Session, entity_type: str, entity_id: int, 
-                          metrics_data: dict, change_type: str = "update", 
-                          user_id: int = None, description: str = None,
-                          previous_values: dict = None):
-    """Helper function to create metrics history record"""
+async def create_metrics_history(db: AsyncSession, entity_type: str, entity_id: int, 
+                                metrics_data: dict, change_type: str = "update", 
+                                user_id: int = None, description: str = None,
+                                previous_values: dict = None):
+    """Helper function to create metrics history record, mark it as the entity's
+    current version and update its trend buckets"""
     try:
-        # Convert Decimals to floats for JSON serialization
-        metrics_data_serializable = convert_decimals_to_float(metrics_data)
-        previous_values_serializable = convert_decimals_to_float(previous_values) if previous_values else None
-        
-        history_record = models.MetricsHistory(
-            entity_type=entity_type,
-            entity_id=entity_id,
-            metrics_data=json.dumps(metrics_data_serializable),
-            change_type=change_type,
-            changed_by=user_id,
-            change_description=description,
-            previous_values=json.dumps(previous_values_serializable) if previous_values_serializable else None
+        values = metrics_history.history_values(
+            entity_type, entity_id, metrics_data, change_type, user_id, description, previous_values
         )
+        history_record = models.MetricsHistory(**values)
         db.add(history_record)
+        await db.flush()
+        await db.run_sync(metrics_history.set_current_versions, [(entity_type, entity_id, history_record.id)])
+        await db.run_sync(trends.record, [values])
         return history_record
     except Exception as e:
         raise e
 
-def update_pnl_aggregated_metrics(db: Session, pnl_id: int):
-    """Helper function to recalculate and update PnL metrics from Sub-PnLs"""
-    try:
-        # Get all Sub-PnLs for this PnL with their metrics
-        sub_pnls_with_metrics = db.query(models.SubPnL).filter(
-            models.SubPnL.pnl_id == pnl_id
-        ).options(joinedload(models.SubPnL.sub_pnl_metrics)).all()
-        
-        # Aggregate metrics
-        total_features = sum([sub_pnl.sub_pnl_metrics[0].features_shipped if sub_pnl.sub_pnl_metrics else 0 for sub_pnl in sub_pnls_with_metrics])
-        total_testcases = sum([sub_pnl.sub_pnl_metrics[0].total_testcases_executed if sub_pnl.sub_pnl_metrics else 0 for sub_pnl in sub_pnls_with_metrics])
-        total_bugs = sum([sub_pnl.sub_pnl_metrics[0].total_bugs_logged if sub_pnl.sub_pnl_metrics else 0 for sub_pnl in sub_pnls_with_metrics])
-        total_regression_bugs = sum([sub_pnl.sub_pnl_metrics[0].regression_bugs_found if sub_pnl.sub_pnl_metrics else 0 for sub_pnl in sub_pnls_with_metrics])
-        total_escaped_bugs = sum([sub_pnl.sub_pnl_metrics[0].escaped_bugs if sub_pnl.sub_pnl_metrics else 0 for sub_pnl in sub_pnls_with_metrics])
-        
-        # Calculate averages
-        sub_pnl_count = len([sub_pnl for sub_pnl in sub_pnls_with_metrics if sub_pnl.sub_pnl_metrics])
-        avg_sanity_time = sum([sub_pnl.sub_pnl_metrics[0].sanity_time_avg_hours if sub_pnl.sub_pnl_metrics else 0 for sub_pnl in sub_pnls_with_metrics]) / max(sub_pnl_count, 1)
-        avg_automation = sum([sub_pnl.sub_pnl_metrics[0].automation_coverage_percent if sub_pnl.sub_pnl_metrics else 0 for sub_pnl in sub_pnls_with_metrics]) / max(sub_pnl_count, 1)
-        
-        # Get or create PnL metrics
-        pnl_metrics = db.query(models.PnLMetrics).filter(
-            models.PnLMetrics.pnl_id == pnl_id
-        ).first()
-        
-        if pnl_metrics:
-            # Update existing metrics
-            pnl_metrics.features_shipped = total_features
-            pnl_metrics.total_testcases_executed = total_testcases
-            pnl_metrics.total_bugs_logged = total_bugs
-            pnl_metrics.regression_bugs_found = total_regression_bugs
-            pnl_metrics.escaped_bugs = total_escaped_bugs
-            pnl_metrics.sanity_time_avg_hours = avg_sanity_time
-            pnl_metrics.automation_coverage_percent = avg_automation
-        else:
-            # Create new metrics
-            pnl_metrics = models.PnLMetrics(
-                pnl_id=pnl_id,
-                features_shipped=total_features,
-                total_testcases_executed=total_testcases,
-                total_bugs_logged=total_bugs,
-                regression_bugs_found=total_regression_bugs,
-                escaped_bugs=total_escaped_bugs,
-                sanity_time_avg_hours=avg_sanity_time,
-                automation_coverage_percent=avg_automation
-            )
-            db.add(pnl_metrics)
-        
-        db.commit()
-        return pnl_metrics
-    except Exception as e:
-        db.rollback()
-        raise e
+def publish_metrics(entity_type: str, entity_id: int, pnl_id: int, metrics):
+    """Send new metrics values to /events subscribers of the PnL, and of the Sub-PnL they belong to"""
+    topics = [events.pnl_topic(pnl_id)]
+    if entity_type != "pnl":
+        topics.append(events.sub_pnl_topic(entity_id))
+    events.event_bus.publish("metrics", {
+        "entity_type": entity_type,
+        "entity_id": entity_id,
+        "pnl_id": pnl_id,
+        "metrics": metrics.model_dump(mode="json"),
+    }, topics)
+
+def publish_refresh(pnl_ids, sub_pnl_ids):
+    """Tell /events subscribers to reload PnLs and Sub-PnLs changed too broadly to send as values"""
+    events.event_bus.publish(
+        "refresh",
+        {"pnl_ids": sorted(pnl_ids), "sub_pnl_ids": sorted(sub_pnl_ids)},
+        [events.pnl_topic(pnl_id) for pnl_id in pnl_ids] + [events.sub_pnl_topic(sub_pnl_id) for sub_pnl_id in sub_pnl_ids]
+    )
+
+async def publish_pnl_metrics(db: AsyncSession, pnl_id: int):
+    """Publish PnL metrics after they or a Sub-PnL rolled up into them changed; warms the cache too"""
+    tagged = await response_cache.get_or_set(
+        cache.pnl_metrics_key(pnl_id), lambda: db.run_sync(lambda session: conditional.tag(load_pnl_metrics(session, pnl_id)))
+    )
+    publish_metrics("pnl", pnl_id, pnl_id, tagged.payload)
 
 @app.get("/")
-def root():
+async def root():
     return {"message": "QAlytics API v2.0 - Hierarchical PnL Quality Analytics Platform"}
 
 @app.get("/health")
-def health():
+async def health():
     return {"status": "healthy", "timestamp": datetime.utcnow()}
 
+@app.get("/stats")
+async def stats():
+    """Runtime counters for scraping (caches, database pool, password hashing queue)"""
+    return {
+        "response_cache": response_cache.stats(),
+        "events": events.event_bus.stats(),
+        "auth_cache": auth.principal_cache.stats(),
+        "database_pool": database.pool_stats(),
+        "password_hashing": password_pool.stats(),
+    }
+
+@app.get("/events")
+async def stream_events(
+    pnl_id: List[int] = Query([]),
+    sub_pnl_id: List[int] = Query([]),
+    last_event_id: Optional[int] = Header(None),
+):
+    """Server-Sent Events of metric changes, so clients patch their state instead of polling.
+
+    Subscribes to the given PnLs (including changes of their Sub-PnLs) and
+    Sub-PnLs, or to everything without filters. Events: ``metrics`` (new
+    values of one entity), ``history_deleted``, ``refresh`` (reload the
+    listed entities) and ``reset`` (reload everything); idle streams get
+    heartbeat comments. Browsers resume with ``Last-Event-ID`` on reconnect.
+    """
+    topics = [events.pnl_topic(value) for value in pnl_id] + [events.sub_pnl_topic(value) for value in sub_pnl_id]
+    return StreamingResponse(
+        events.event_bus.stream(topics, last_event_id),
+        media_type="text/event-stream",
+        # No buffering by nginx style proxies; events must go out as they happen
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # Authentication endpoints
 @app.post("/auth/signup", response_model=schemas.UserOut)
-def signup(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
+async def signup(user_data: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
     # Check if user exists
-    db_user = db.query(models.User).filter(models.User.email == user_data.email).first()
+    db_user = await db.scalar(select(models.User).where(models.User.email == user_data.email))
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    # Create new user
-    hashed_password = hash_password(user_data.password)
+    # Create new user; bcrypt runs on the bounded password pool, off the event loop
+    hashed_password = await password_pool.hash(user_data.password)
     db_user = models.User(
         email=user_data.email,
         password_hash=hashed_password,
         role=user_data.role
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 @app.post("/auth/login", response_model=schemas.TokenOut)
-def login(user_data: schemas.UserLogin, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == user_data.email).first()
-    if not user or not verify_password(user_data.password, user.password_hash):
+async def login(user_data: schemas.UserLogin, db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(models.User).where(models.User.email == user_data.email))
+    if not user or not await password_pool.verify(user_data.password, user.password_hash):
         raise HTTPException(status_code=400, detail="Invalid credentials")
     
-    token = create_token({"sub": user.id})
+    token = create_user_token(user)
+    refresh_token = await refresh_tokens.issue(db, user.id)
+    await db.commit()
     return {
         "access_token": token,
         "token_type": "bearer",
+        "refresh_token": refresh_token,
         "user": user
     }
 
-# Dashboard endpoint - PnL list with sub-PnL counts and metrics
-@app.get("/dashboard", response_model=List[schemas.PnLWithMetrics])
-def get_dashboard(db: Session = Depends(get_db)):
-    """Dashboard showing PnLs with their sub-PnL counts and aggregated metrics"""
-    pnls = db.query(models.PnL).options(
-        joinedload(models.PnL.sub_pnls),
-        joinedload(models.PnL.pnl_metrics)
-    ).all()
+@app.post("/auth/refresh", response_model=schemas.TokenOut)
+async def refresh(payload: schemas.RefreshRequest, db: AsyncSession = Depends(get_async_db)):
+    """New access token for a refresh token, without a password check; the refresh token is rotated"""
+    user, refresh_token = await refresh_tokens.rotate(db, payload.refresh_token)
+    return {
+        "access_token": create_user_token(user),
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "user": user
+    }
+
+@app.post("/auth/logout")
+async def logout(
+    payload: Optional[schemas.RefreshRequest] = None,
+    current_user: auth.Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Revoke the access token used for this request and, if given, its refresh token"""
+    auth.revoke(current_user)
+    if payload:
+        await refresh_tokens.revoke(db, payload.refresh_token)
+    return {"message": "Logged out"}
+
+# Dashboard endpoint - PnL list with sub-PnL counts and metrics (cached)
+# Cached read builders take a sync Session; handlers run them via AsyncSession.run_sync
+def build_dashboard(db: Session) -> List[schemas.PnLWithMetrics]:
+    """PnLs with their sub-PnL counts and aggregated metrics.
+
+    Read-only: PnLs, their metrics, their rollups and Sub-PnL counts come from a
+    single query. PnLs without a metrics row get virtual metrics computed from
+    their rollup instead of having one inserted.
+    """
+    sub_pnls_count = (
+        select(func.count(models.SubPnL.id))
+        .where(models.SubPnL.pnl_id == models.PnL.id)
+        .correlate(models.PnL)
+        .scalar_subquery()
+    )
+    rows = db.query(
+        models.PnL, models.PnLMetrics, models.PnLRollup, sub_pnls_count.label("sub_pnls_count")
+    ).outerjoin(
+        models.PnLMetrics, models.PnLMetrics.pnl_id == models.PnL.id
+    ).outerjoin(
+        models.PnLRollup, models.PnLRollup.pnl_id == models.PnL.id
+    ).order_by(models.PnL.id, models.PnLMetrics.id).all()
+    
+    # Keep the oldest metrics row if a PnL ever got duplicates
+    entries = {}
+    for pnl, metrics, rollup, count in rows:
+        entries.setdefault(pnl.id, (pnl, metrics, rollup, count))
+    
+    # PnLs with neither metrics nor a rollup yet are aggregated in one grouped query
+    unaggregated_ids = [pnl.id for pnl, metrics, rollup, _ in entries.values() if not metrics and not rollup]
+    aggregated = aggregation.aggregate_pnl_rollups(db, unaggregated_ids) if unaggregated_ids else {}
     
     result = []
-    for pnl in pnls:
-        # Get or create metrics for this PnL (aggregated from Sub-PnLs)
-        metrics = pnl.pnl_metrics[0] if pnl.pnl_metrics else None
+    for pnl, metrics, rollup, count in entries.values():
         if not metrics:
-            # Calculate aggregate metrics from Sub-PnLs
-            sub_pnls_with_metrics = db.query(models.SubPnL).filter(
-                models.SubPnL.pnl_id == pnl.id
-            ).options(joinedload(models.SubPnL.sub_pnl_metrics)).all()
-            
-            # Aggregate metrics
-            total_features = sum([sub_pnl.sub_pnl_metrics[0].features_shipped if sub_pnl.sub_pnl_metrics else 0 for sub_pnl in sub_pnls_with_metrics])
-            total_testcases = sum([sub_pnl.sub_pnl_metrics[0].total_testcases_executed if sub_pnl.sub_pnl_metrics else 0 for sub_pnl in sub_pnls_with_metrics])
-            total_bugs = sum([sub_pnl.sub_pnl_metrics[0].total_bugs_logged if sub_pnl.sub_pnl_metrics else 0 for sub_pnl in sub_pnls_with_metrics])
-            total_regression_bugs = sum([sub_pnl.sub_pnl_metrics[0].regression_bugs_found if sub_pnl.sub_pnl_metrics else 0 for sub_pnl in sub_pnls_with_metrics])
-            total_escaped_bugs = sum([sub_pnl.sub_pnl_metrics[0].escaped_bugs if sub_pnl.sub_pnl_metrics else 0 for sub_pnl in sub_pnls_with_metrics])
-            
-            # Calculate averages
-            sub_pnl_count = len([sub_pnl for sub_pnl in sub_pnls_with_metrics if sub_pnl.sub_pnl_metrics])
-            avg_sanity_time = sum([sub_pnl.sub_pnl_metrics[0].sanity_time_avg_hours if sub_pnl.sub_pnl_metrics else 0 for sub_pnl in sub_pnls_with_metrics]) / max(sub_pnl_count, 1)
-            avg_automation = sum([sub_pnl.sub_pnl_metrics[0].automation_coverage_percent if sub_pnl.sub_pnl_metrics else 0 for sub_pnl in sub_pnls_with_metrics]) / max(sub_pnl_count, 1)
-            
-            # Create or update PnL metrics
-            metrics = models.PnLMetrics(
-                pnl_id=pnl.id,
-                features_shipped=total_features,
-                total_testcases_executed=total_testcases,
-                total_bugs_logged=total_bugs,
-                regression_bugs_found=total_regression_bugs,
-                escaped_bugs=total_escaped_bugs,
-                sanity_time_avg_hours=avg_sanity_time,
-                automation_coverage_percent=avg_automation
-            )
-            db.add(metrics)
-            db.commit()
-            db.refresh(metrics)
+            values = rollups.rollup_values(rollup) if rollup else aggregated[pnl.id]
+            metrics = defaults.virtual_row(models.PnLMetrics, pnl_id=pnl.id, **values)
         
         result.append(schemas.PnLWithMetrics(
             id=pnl.id,
@@ -227,37 +268,90 @@ def get_dashboard(db: Session = Depends(get_db)):
             description=pnl.description,
             created_at=pnl.created_at,
             updated_at=pnl.updated_at,
-            sub_pnls_count=len(pnl.sub_pnls),
+            sub_pnls_count=count,
             metrics=metrics
         ))
     
     return result
 
+@app.get("/dashboard", response_model=List[schemas.PnLWithMetrics])
+async def get_dashboard(
+    request: Request,
+    response: Response,
+    at: Optional[datetime] = Query(None, alias="as_of"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Dashboard showing PnLs with their sub-PnL counts and aggregated metrics.
+
+    ``as_of`` answers from metrics history how the dashboard looked at that time.
+    """
+    if at:
+        return await db.run_sync(as_of.dashboard_at, at)
+    tagged = await response_cache.get_or_set(
+        cache.dashboard_key(), lambda: db.run_sync(lambda session: conditional.tag(build_dashboard(session)))
+    )
+    if conditional.is_not_modified(request, response, tagged.validators):
+        return conditional.not_modified(response)
+    return tagged.payload
+
 # PnL endpoints
 @app.get("/pnls", response_model=List[schemas.PnLOut])
-def list_pnls(db: Session = Depends(get_db)):
-    return db.query(models.PnL).all()
+async def list_pnls(request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
+    pnls = (await db.scalars(select(models.PnL))).all()
+    if conditional.is_not_modified(request, response, conditional.validators_for(pnls)):
+        return conditional.not_modified(response)
+    return pnls
 
 @app.post("/pnls", response_model=schemas.PnLOut)
-def create_pnl(pnl_data: schemas.PnLCreate, db: Session = Depends(get_db)):
+async def create_pnl(pnl_data: schemas.PnLCreate, db: AsyncSession = Depends(get_async_db)):
     db_pnl = models.PnL(**pnl_data.dict())
     db.add(db_pnl)
-    db.commit()
-    db.refresh(db_pnl)
+    await db.commit()
+    await db.refresh(db_pnl)
+    response_cache.invalidate(cache.dashboard_key())
     
     return db_pnl
 
+# Batch reads; registered before /pnls/{pnl_id} and /sub-pnls/{sub_pnl_id},
+# which would otherwise take "metrics" for an id
+@app.get("/pnls/metrics", response_model=schemas.PnLMetricsBatch)
+async def get_pnls_metrics(
+    request: Request,
+    response: Response,
+    ids: str = Query(..., description="Comma separated PnL ids"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Metrics of many PnLs in one call, in the requested order, with the ids not found"""
+    batch = await db.run_sync(batch_reads.pnl_metrics_batch, batch_reads.parse_ids(ids))
+    if conditional.is_not_modified(request, response, conditional.validators_for(batch)):
+        return conditional.not_modified(response)
+    return batch
+
+@app.get("/sub-pnls/metrics", response_model=schemas.DetailMetricsBatch)
+async def get_sub_pnls_detail_metrics(
+    request: Request,
+    response: Response,
+    ids: str = Query(..., description="Comma separated Sub-PnL ids"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Detail metrics of many Sub-PnLs in one call, in the requested order, with the ids not found"""
+    batch = await db.run_sync(batch_reads.detail_metrics_batch, batch_reads.parse_ids(ids))
+    if conditional.is_not_modified(request, response, conditional.validators_for(batch)):
+        return conditional.not_modified(response)
+    return batch
+
 @app.get("/pnls/{pnl_id}", response_model=schemas.PnLOut)
-def get_pnl(pnl_id: int, db: Session = Depends(get_db)):
-    pnl = db.query(models.PnL).filter(models.PnL.id == pnl_id).first()
+async def get_pnl(pnl_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
+    pnl = await db.get(models.PnL, pnl_id)
     if not pnl:
         raise HTTPException(status_code=404, detail="PnL not found")
+    if conditional.is_not_modified(request, response, conditional.validators_for(pnl)):
+        return conditional.not_modified(response)
     return pnl
 
 # PnL Metrics endpoints
-@app.get("/pnls/{pnl_id}/metrics", response_model=schemas.PnLMetricsOut)
-def get_pnl_metrics(pnl_id: int, db: Session = Depends(get_db)):
-    """Get PnL metrics - aggregated from Sub-PnLs or manually set"""
+def load_pnl_metrics(db: Session, pnl_id: int) -> schemas.PnLMetricsOut:
+    """PnL metrics - aggregated from Sub-PnLs or manually set"""
     pnl = db.query(models.PnL).filter(models.PnL.id == pnl_id).first()
     if not pnl:
         raise HTTPException(status_code=404, detail="PnL not found")
@@ -267,57 +361,49 @@ def get_pnl_metrics(pnl_id: int, db: Session = Depends(get_db)):
     ).first()
     
     if not metrics:
-        # Calculate aggregate metrics from Sub-PnLs
-        sub_pnls_with_metrics = db.query(models.SubPnL).filter(
-            models.SubPnL.pnl_id == pnl_id
-        ).options(joinedload(models.SubPnL.sub_pnl_metrics)).all()
-        
-        # Aggregate metrics
-        total_features = sum([sub_pnl.sub_pnl_metrics[0].features_shipped if sub_pnl.sub_pnl_metrics else 0 for sub_pnl in sub_pnls_with_metrics])
-        total_testcases = sum([sub_pnl.sub_pnl_metrics[0].total_testcases_executed if sub_pnl.sub_pnl_metrics else 0 for sub_pnl in sub_pnls_with_metrics])
-        total_bugs = sum([sub_pnl.sub_pnl_metrics[0].total_bugs_logged if sub_pnl.sub_pnl_metrics else 0 for sub_pnl in sub_pnls_with_metrics])
-        total_regression_bugs = sum([sub_pnl.sub_pnl_metrics[0].regression_bugs_found if sub_pnl.sub_pnl_metrics else 0 for sub_pnl in sub_pnls_with_metrics])
-        total_escaped_bugs = sum([sub_pnl.sub_pnl_metrics[0].escaped_bugs if sub_pnl.sub_pnl_metrics else 0 for sub_pnl in sub_pnls_with_metrics])
-        
-        # Calculate averages
-        sub_pnl_count = len([sub_pnl for sub_pnl in sub_pnls_with_metrics if sub_pnl.sub_pnl_metrics])
-        avg_sanity_time = sum([sub_pnl.sub_pnl_metrics[0].sanity_time_avg_hours if sub_pnl.sub_pnl_metrics else 0 for sub_pnl in sub_pnls_with_metrics]) / max(sub_pnl_count, 1)
-        avg_automation = sum([sub_pnl.sub_pnl_metrics[0].automation_coverage_percent if sub_pnl.sub_pnl_metrics else 0 for sub_pnl in sub_pnls_with_metrics]) / max(sub_pnl_count, 1)
-        
-        # Create default metrics if none exist
-        metrics = models.PnLMetrics(
-            pnl_id=pnl_id,
-            features_shipped=total_features,
-            total_testcases_executed=total_testcases,
-            total_bugs_logged=total_bugs,
-            regression_bugs_found=total_regression_bugs,
-            escaped_bugs=total_escaped_bugs,
-            sanity_time_avg_hours=avg_sanity_time,
-            automation_coverage_percent=avg_automation
-        )
-        db.add(metrics)
-        db.commit()
-        db.refresh(metrics)
+        # Virtual metrics aggregated from Sub-PnLs; nothing is written on read
+        metrics = defaults.virtual_pnl_metrics(db, pnl_id)
     
-    return metrics
+    return schemas.PnLMetricsOut.model_validate(metrics)
+
+@app.get("/pnls/{pnl_id}/metrics", response_model=schemas.PnLMetricsOut)
+async def get_pnl_metrics(
+    pnl_id: int,
+    request: Request,
+    response: Response,
+    at: Optional[datetime] = Query(None, alias="as_of"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get PnL metrics - aggregated from Sub-PnLs or manually set (at ``as_of`` if given)"""
+    if at:
+        if not await db.get(models.PnL, pnl_id):
+            raise HTTPException(status_code=404, detail="PnL not found")
+        metrics = await db.run_sync(lambda session: as_of.pnl_metrics_at(session, [pnl_id], at)[pnl_id])
+        return schemas.PnLMetricsOut.model_validate(metrics)
+    tagged = await response_cache.get_or_set(
+        cache.pnl_metrics_key(pnl_id), lambda: db.run_sync(lambda session: conditional.tag(load_pnl_metrics(session, pnl_id)))
+    )
+    if conditional.is_not_modified(request, response, tagged.validators):
+        return conditional.not_modified(response)
+    return tagged.payload
 
 @app.put("/pnls/{pnl_id}/metrics", response_model=schemas.PnLMetricsOut)
-def update_pnl_metrics(
+async def update_pnl_metrics(
     pnl_id: int, 
     metrics_data: schemas.PnLMetricsUpdate, 
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: auth.Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update PnL metrics manually"""
     # Verify PnL exists
-    pnl = db.query(models.PnL).filter(models.PnL.id == pnl_id).first()
+    pnl = await db.get(models.PnL, pnl_id)
     if not pnl:
         raise HTTPException(status_code=404, detail="PnL not found")
     
     # Update or create metrics
-    existing_metrics = db.query(models.PnLMetrics).filter(
+    existing_metrics = await db.scalar(select(models.PnLMetrics).where(
         models.PnLMetrics.pnl_id == pnl_id
-    ).first()
+    ))
     
     if existing_metrics:
         # Capture previous values for history
@@ -326,11 +412,11 @@ def update_pnl_metrics(
             for key in metrics_data.dict().keys()
         }
         
-        for key, value in metrics_data.dict().items():
+        for key, value in derived.with_derived(metrics_data.dict()).items():
             setattr(existing_metrics, key, value)
         
         # Create history record
-        create_metrics_history(
+        await create_metrics_history(
             db=db,
             entity_type="pnl",
             entity_id=pnl_id,
@@ -341,16 +427,18 @@ def update_pnl_metrics(
             previous_values=previous_values
         )
         
-        db.commit()
-        db.refresh(existing_metrics)
+        await db.commit()
+        response_cache.invalidate(cache.dashboard_key(), cache.pnl_metrics_key(pnl_id))
+        await db.refresh(existing_metrics)
+        publish_metrics("pnl", pnl_id, pnl_id, schemas.PnLMetricsOut.model_validate(existing_metrics))
         return existing_metrics
     else:
-        new_metrics = models.PnLMetrics(pnl_id=pnl_id, **metrics_data.dict())
+        new_metrics = models.PnLMetrics(pnl_id=pnl_id, **derived.with_derived(metrics_data.dict()))
         db.add(new_metrics)
-        db.flush()  # Get the ID before history
+        await db.flush()  # Get the ID before history
         
         # Create history record
-        create_metrics_history(
+        await create_metrics_history(
             db=db,
             entity_type="pnl",
             entity_id=pnl_id,
@@ -360,14 +448,15 @@ def update_pnl_metrics(
             description=f"Created metrics for {pnl.name}"
         )
         
-        db.commit()
-        db.refresh(new_metrics)
+        await db.commit()
+        response_cache.invalidate(cache.dashboard_key(), cache.pnl_metrics_key(pnl_id))
+        await db.refresh(new_metrics)
+        publish_metrics("pnl", pnl_id, pnl_id, schemas.PnLMetricsOut.model_validate(new_metrics))
         return new_metrics
 
 # Sub PnL endpoints  
-@app.get("/pnls/{pnl_id}/sub-pnls", response_model=List[schemas.SubPnLWithDetailMetrics])
-def list_sub_pnls(pnl_id: int, db: Session = Depends(get_db)):
-    """List Sub PnLs under a PnL with their detailed metrics"""
+def load_sub_pnls(db: Session, pnl_id: int) -> List[schemas.SubPnLWithDetailMetrics]:
+    """Sub PnLs under a PnL with their detailed metrics"""
     # Verify PnL exists
     pnl = db.query(models.PnL).filter(models.PnL.id == pnl_id).first()
     if not pnl:
@@ -375,17 +464,14 @@ def list_sub_pnls(pnl_id: int, db: Session = Depends(get_db)):
     
     sub_pnls = db.query(models.SubPnL).filter(
         models.SubPnL.pnl_id == pnl_id
-    ).options(joinedload(models.SubPnL.sub_pnl_detail_metrics)).all()
+    ).options(joinedload(models.SubPnL.active_detail_metrics)).all()
     
     result = []
     for sub_pnl in sub_pnls:
-        # Get or create detail metrics for this sub PnL
-        detail_metrics = sub_pnl.sub_pnl_detail_metrics[0] if sub_pnl.sub_pnl_detail_metrics else None
+        # Active detail metrics for this sub PnL, or virtual defaults if none exist
+        detail_metrics = sub_pnl.active_detail_metrics
         if not detail_metrics:
-            detail_metrics = models.SubPnLDetailMetrics(sub_pnl_id=sub_pnl.id)
-            db.add(detail_metrics)
-            db.commit()
-            db.refresh(detail_metrics)
+            detail_metrics = defaults.virtual_row(models.SubPnLDetailMetrics, sub_pnl_id=sub_pnl.id)
         
         result.append(schemas.SubPnLWithDetailMetrics(
             id=sub_pnl.id,
@@ -399,10 +485,20 @@ def list_sub_pnls(pnl_id: int, db: Session = Depends(get_db)):
     
     return result
 
+@app.get("/pnls/{pnl_id}/sub-pnls", response_model=List[schemas.SubPnLWithDetailMetrics])
+async def list_sub_pnls(pnl_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
+    """List Sub PnLs under a PnL with their detailed metrics"""
+    tagged = await response_cache.get_or_set(
+        cache.pnl_sub_pnls_key(pnl_id), lambda: db.run_sync(lambda session: conditional.tag(load_sub_pnls(session, pnl_id)))
+    )
+    if conditional.is_not_modified(request, response, tagged.validators):
+        return conditional.not_modified(response)
+    return tagged.payload
+
 @app.post("/pnls/{pnl_id}/sub-pnls", response_model=schemas.SubPnLOut)
-def create_sub_pnl(pnl_id: int, sub_pnl_data: schemas.SubPnLCreate, db: Session = Depends(get_db)):
+async def create_sub_pnl(pnl_id: int, sub_pnl_data: schemas.SubPnLCreate, db: AsyncSession = Depends(get_async_db)):
     # Verify PnL exists
-    pnl = db.query(models.PnL).filter(models.PnL.id == pnl_id).first()
+    pnl = await db.get(models.PnL, pnl_id)
     if not pnl:
         raise HTTPException(status_code=404, detail="PnL not found")
     
@@ -411,35 +507,35 @@ def create_sub_pnl(pnl_id: int, sub_pnl_data: schemas.SubPnLCreate, db: Session
         **sub_pnl_data.dict()
     )
     db.add(db_sub_pnl)
-    db.commit()
-    db.refresh(db_sub_pnl)
+    await db.flush()
     
-    # Create default metrics for sub-PnL
+    # Create default metrics for sub-PnL and count them in the PnL rollup, all in one transaction
+    await db.run_sync(rollups.count_new_metrics, pnl_id)
     metrics = models.SubPnLMetrics(sub_pnl_id=db_sub_pnl.id)
     db.add(metrics)
     detail_metrics = models.SubPnLDetailMetrics(sub_pnl_id=db_sub_pnl.id)
     db.add(detail_metrics)
-    db.commit()
+    await db.commit()
+    await db.refresh(db_sub_pnl)
+    response_cache.invalidate(cache.dashboard_key(), cache.pnl_metrics_key(pnl_id), cache.pnl_sub_pnls_key(pnl_id))
     
     return db_sub_pnl
 
 @app.get("/sub-pnls/{sub_pnl_id}", response_model=schemas.SubPnLWithDetailMetrics)
-def get_sub_pnl_details(sub_pnl_id: int, db: Session = Depends(get_db)):
+async def get_sub_pnl_details(sub_pnl_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
     """Get Sub PnL with detailed metrics"""
-    sub_pnl = db.query(models.SubPnL).filter(models.SubPnL.id == sub_pnl_id).first()
+    sub_pnl = await db.get(models.SubPnL, sub_pnl_id)
     if not sub_pnl:
         raise HTTPException(status_code=404, detail="Sub PnL not found")
     
-    # Get or create detail metrics
-    detail_metrics = db.query(models.SubPnLDetailMetrics).filter(
-        models.SubPnLDetailMetrics.sub_pnl_id == sub_pnl_id
-    ).first()
+    # Get the active detail metrics, or virtual defaults if none exist
+    detail_metrics = await db.scalar(detail_versions.active(sub_pnl_id))
     
     if not detail_metrics:
-        detail_metrics = models.SubPnLDetailMetrics(sub_pnl_id=sub_pnl_id)
-        db.add(detail_metrics)
-        db.commit()
-        db.refresh(detail_metrics)
+        detail_metrics = defaults.virtual_row(models.SubPnLDetailMetrics, sub_pnl_id=sub_pnl_id)
+    
+    if conditional.is_not_modified(request, response, conditional.validators_for(sub_pnl, detail_metrics)):
+        return conditional.not_modified(response)
     
     return schemas.SubPnLWithDetailMetrics(
         id=sub_pnl.id,
@@ -454,35 +550,37 @@ def get_sub_pnl_details(sub_pnl_id: int, db: Session = Depends(get_db)):
 
 # Sub PnL Metrics endpoints
 @app.get("/sub-pnls/{sub_pnl_id}/metrics", response_model=schemas.SubPnLMetricsOut)
-def get_sub_pnl_metrics(sub_pnl_id: int, db: Session = Depends(get_db)):
-    metrics = db.query(models.SubPnLMetrics).filter(
+async def get_sub_pnl_metrics(sub_pnl_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
+    metrics = await db.scalar(select(models.SubPnLMetrics).where(
         models.SubPnLMetrics.sub_pnl_id == sub_pnl_id
-    ).first()
+    ))
     
     if not metrics:
-        # Create default metrics if none exist
-        metrics = models.SubPnLMetrics(sub_pnl_id=sub_pnl_id)
-        db.add(metrics)
-        db.commit()
-        db.refresh(metrics)
+        # Virtual default metrics if none exist; nothing is written on read
+        metrics = defaults.virtual_row(models.SubPnLMetrics, sub_pnl_id=sub_pnl_id)
     
+    if conditional.is_not_modified(request, response, conditional.validators_for(metrics)):
+        return conditional.not_modified(response)
     return metrics
 
 @app.put("/sub-pnls/{sub_pnl_id}/metrics", response_model=schemas.SubPnLMetricsOut)
-def update_sub_pnl_metrics(
+async def update_sub_pnl_metrics(
     sub_pnl_id: int, 
     metrics_data: schemas.SubPnLMetricsUpdate, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Verify sub PnL exists
-    sub_pnl = db.query(models.SubPnL).filter(models.SubPnL.id == sub_pnl_id).first()
+    sub_pnl = await db.get(models.SubPnL, sub_pnl_id)
     if not sub_pnl:
         raise HTTPException(status_code=404, detail="Sub PnL not found")
     
+    # Load the parent PnL rollup before any metrics change in this session
+    await db.run_sync(rollups.get_or_build_rollup, sub_pnl.pnl_id)
+    
     # Update or create metrics
-    existing_metrics = db.query(models.SubPnLMetrics).filter(
+    existing_metrics = await db.scalar(select(models.SubPnLMetrics).where(
         models.SubPnLMetrics.sub_pnl_id == sub_pnl_id
-    ).first()
+    ))
     
     if existing_metrics:
         # Capture previous values for history
@@ -491,11 +589,11 @@ def update_sub_pnl_metrics(
             for key in metrics_data.dict().keys()
         }
         
-        for key, value in metrics_data.dict().items():
+        for key, value in derived.with_derived(metrics_data.dict()).items():
             setattr(existing_metrics, key, value)
         
         # Create history record
-        create_metrics_history(
+        await create_metrics_history(
             db=db,
             entity_type="sub_pnl",
             entity_id=sub_pnl_id,
@@ -505,20 +603,23 @@ def update_sub_pnl_metrics(
             previous_values=previous_values
         )
         
-        db.commit()
-        db.refresh(existing_metrics)
+        # Apply the change to the parent PnL rollup in the same transaction
+        await db.run_sync(rollups.apply_sub_pnl_change, sub_pnl.pnl_id, previous_values, metrics_data.dict())
         
-        # Update parent PnL aggregated metrics
-        update_pnl_aggregated_metrics(db, sub_pnl.pnl_id)
+        await db.commit()
+        response_cache.invalidate(cache.dashboard_key(), cache.pnl_metrics_key(sub_pnl.pnl_id))
+        await db.refresh(existing_metrics)
+        publish_metrics("sub_pnl", sub_pnl_id, sub_pnl.pnl_id, schemas.SubPnLMetricsOut.model_validate(existing_metrics))
+        await publish_pnl_metrics(db, sub_pnl.pnl_id)
         
         return existing_metrics
     else:
-        new_metrics = models.SubPnLMetrics(sub_pnl_id=sub_pnl_id, **metrics_data.dict())
+        new_metrics = models.SubPnLMetrics(sub_pnl_id=sub_pnl_id, **derived.with_derived(metrics_data.dict()))
         db.add(new_metrics)
-        db.flush()  # Get the ID before history
+        await db.flush()  # Get the ID before history
         
         # Create history record
-        create_metrics_history(
+        await create_metrics_history(
             db=db,
             entity_type="sub_pnl",
             entity_id=sub_pnl_id,
@@ -527,46 +628,83 @@ def update_sub_pnl_metrics(
             description="Sub-PnL metrics created"
         )
         
-        db.commit()
-        db.refresh(new_metrics)
+        # Apply the change to the parent PnL rollup in the same transaction
+        await db.run_sync(rollups.apply_sub_pnl_change, sub_pnl.pnl_id, None, metrics_data.dict())
         
-        # Update parent PnL aggregated metrics
-        update_pnl_aggregated_metrics(db, sub_pnl.pnl_id)
+        await db.commit()
+        response_cache.invalidate(cache.dashboard_key(), cache.pnl_metrics_key(sub_pnl.pnl_id))
+        await db.refresh(new_metrics)
+        publish_metrics("sub_pnl", sub_pnl_id, sub_pnl.pnl_id, schemas.SubPnLMetricsOut.model_validate(new_metrics))
+        await publish_pnl_metrics(db, sub_pnl.pnl_id)
         
         return new_metrics
 
+# Page views: one round trip per page instead of a request per section
+@app.get("/views/sub-pnl/{sub_pnl_id}", response_model=schemas.SubPnLView)
+async def get_sub_pnl_view(
+    sub_pnl_id: int,
+    request: Request,
+    response: Response,
+    history_limit: int = Query(views.VIEW_HISTORY_LIMIT, ge=1, le=pagination.MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Sub-PnL page: the Sub-PnL, its PnL, metrics, detail metrics, recent history and siblings"""
+    view = await db.run_sync(views.build_sub_pnl_view, sub_pnl_id, history_limit)
+    if conditional.is_not_modified(request, response, conditional.validators_for(view)):
+        return conditional.not_modified(response)
+    return view
+
+@app.get("/views/pnl/{pnl_id}", response_model=schemas.PnLView)
+async def get_pnl_view(
+    pnl_id: int,
+    request: Request,
+    response: Response,
+    history_limit: int = Query(views.VIEW_HISTORY_LIMIT, ge=1, le=pagination.MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """PnL page: the PnL, its metrics, recent history and Sub-PnLs with their detail metrics"""
+    view = await db.run_sync(views.build_pnl_view, pnl_id, history_limit)
+    if conditional.is_not_modified(request, response, conditional.validators_for(view)):
+        return conditional.not_modified(response)
+    return view
+
 # Sub PnL Detail Metrics endpoints
 @app.get("/sub-pnls/{sub_pnl_id}/detail-metrics", response_model=schemas.SubPnLDetailMetricsOut)
-def get_sub_pnl_detail_metrics(sub_pnl_id: int, db: Session = Depends(get_db)):
-    metrics = db.query(models.SubPnLDetailMetrics).filter(
-        models.SubPnLDetailMetrics.sub_pnl_id == sub_pnl_id
-    ).first()
+async def get_sub_pnl_detail_metrics(
+    sub_pnl_id: int,
+    request: Request,
+    response: Response,
+    at: Optional[datetime] = Query(None, alias="as_of"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if at:
+        # Detail metrics as they were at that time, from metrics history
+        return await db.run_sync(as_of.detail_metrics_at, sub_pnl_id, at)
+    
+    metrics = await db.scalar(detail_versions.active(sub_pnl_id))
     
     if not metrics:
-        # Create default metrics if none exist
-        metrics = models.SubPnLDetailMetrics(sub_pnl_id=sub_pnl_id)
-        db.add(metrics)
-        db.commit()
-        db.refresh(metrics)
+        # Virtual default metrics if none exist; nothing is written on read
+        metrics = defaults.virtual_row(models.SubPnLDetailMetrics, sub_pnl_id=sub_pnl_id)
     
+    if conditional.is_not_modified(request, response, conditional.validators_for(metrics)):
+        return conditional.not_modified(response)
     return metrics
 
 @app.put("/sub-pnls/{sub_pnl_id}/detail-metrics", response_model=schemas.SubPnLDetailMetricsOut)
-def update_sub_pnl_detail_metrics(
+async def update_sub_pnl_detail_metrics(
     sub_pnl_id: int, 
     metrics_data: schemas.SubPnLDetailMetricsUpdate, 
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: auth.Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Verify sub PnL exists
-    sub_pnl = db.query(models.SubPnL).filter(models.SubPnL.id == sub_pnl_id).first()
+    sub_pnl = await db.get(models.SubPnL, sub_pnl_id)
     if not sub_pnl:
         raise HTTPException(status_code=404, detail="Sub PnL not found")
     
-    # Get existing metrics for history tracking
-    existing_metrics = db.query(models.SubPnLDetailMetrics).filter(
-        models.SubPnLDetailMetrics.sub_pnl_id == sub_pnl_id
-    ).first()
+    # Get the active version for history tracking
+    existing_metrics = await db.scalar(detail_versions.active(sub_pnl_id))
     
     # Prepare new metrics data
     new_data = metrics_data.model_dump()
@@ -579,203 +717,296 @@ def update_sub_pnl_detail_metrics(
             if hasattr(existing_metrics, key)
         }
         
-        # Update existing metrics
-        for key, value in new_data.items():
-            setattr(existing_metrics, key, value)
+        # Append the new values as the active version; earlier versions are kept
+        new_metrics = await db.run_sync(detail_versions.append_version, sub_pnl_id, new_data)
         
-        # Create history record
-        try:
-            history_record = create_metrics_history(
-                db=db,
-                entity_type="sub_pnl_detail",
-                entity_id=sub_pnl_id,
-                metrics_data=new_data,
-                change_type="update",
-                user_id=current_user.id,
-                description=f"Updated detailed metrics for {sub_pnl.name}",
-                previous_values=previous_values
-            )
-        except Exception as e:
-            # Don't fail the whole request if history fails
-            pass
+        # History is part of the same transaction: if it fails, nothing is written
+        await create_metrics_history(
+            db=db,
+            entity_type="sub_pnl_detail",
+            entity_id=sub_pnl_id,
+            metrics_data=new_data,
+            change_type="update",
+            user_id=current_user.id,
+            description=f"Updated detailed metrics for {sub_pnl.name}",
+            previous_values=previous_values
+        )
         
-        db.commit()
-        db.refresh(existing_metrics)
+        await db.commit()
+        response_cache.invalidate(cache.pnl_sub_pnls_key(sub_pnl.pnl_id))
+        await db.refresh(new_metrics)
+        publish_metrics("sub_pnl_detail", sub_pnl_id, sub_pnl.pnl_id, schemas.SubPnLDetailMetricsOut.model_validate(new_metrics))
         
-        return existing_metrics
+        return new_metrics
     else:
-        # Create new metrics
-        new_metrics = models.SubPnLDetailMetrics(sub_pnl_id=sub_pnl_id, **new_data)
-        db.add(new_metrics)
+        # Create the first version
+        new_metrics = await db.run_sync(detail_versions.append_version, sub_pnl_id, new_data)
         
-        # Create history record
-        try:
-            history_record = create_metrics_history(
-                db=db,
-                entity_type="sub_pnl_detail",
-                entity_id=sub_pnl_id,
-                metrics_data=new_data,
-                change_type="create",
-                user_id=current_user.id,
-                description=f"Created detailed metrics for {sub_pnl.name}"
-            )
-        except Exception as e:
-            # Don't fail the whole request if history fails
-            pass
+        # History is part of the same transaction: if it fails, nothing is written
+        await create_metrics_history(
+            db=db,
+            entity_type="sub_pnl_detail",
+            entity_id=sub_pnl_id,
+            metrics_data=new_data,
+            change_type="create",
+            user_id=current_user.id,
+            description=f"Created detailed metrics for {sub_pnl.name}"
+        )
         
-        db.commit()
-        db.refresh(new_metrics)
+        await db.commit()
+        response_cache.invalidate(cache.pnl_sub_pnls_key(sub_pnl.pnl_id))
+        await db.refresh(new_metrics)
+        publish_metrics("sub_pnl_detail", sub_pnl_id, sub_pnl.pnl_id, schemas.SubPnLDetailMetricsOut.model_validate(new_metrics))
         
         return new_metrics
 
+@app.get("/sub-pnls/{sub_pnl_id}/detail-metrics/versions", response_model=List[schemas.SubPnLDetailMetricsVersionOut])
+async def list_sub_pnl_detail_metrics_versions(
+    sub_pnl_id: int,
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Stored detail metrics versions of a Sub PnL, newest first.
+
+    Keyset-paginated: pass the X-Next-Cursor response header back as ``cursor`` to get the next page.
+    """
+    sub_pnl = await db.get(models.SubPnL, sub_pnl_id)
+    if not sub_pnl:
+        raise HTTPException(status_code=404, detail="Sub PnL not found")
+    
+    versions, next_cursor = await pagination.detail_versions_page(db, sub_pnl_id, cursor, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    if conditional.is_not_modified(request, response, conditional.validators_for(versions)):
+        return conditional.not_modified(response)
+    return versions
+
+# Bulk metrics endpoint
+@app.post("/metrics/bulk", response_model=schemas.BulkMetricsResult)
+async def bulk_upsert_metrics(
+    payloads: List[Any] = Body(...),
+    current_user: auth.Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Upsert metrics and/or detail metrics of many Sub-PnLs in one transaction.
+
+    Each item is ``{"sub_pnl_id", "metrics"?, "detail_metrics"?}``. Invalid items
+    are reported per index and skipped; all valid items are applied together.
+    """
+    if len(payloads) > bulk_metrics.BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {bulk_metrics.BULK_MAX_ITEMS} items per request")
+    
+    result, metrics_pnl_ids, detail_pnl_ids = await db.run_sync(bulk_metrics.apply_bulk, payloads, current_user.id)
+    await db.commit()
+    
+    response_cache.invalidate(
+        *([cache.dashboard_key()] if metrics_pnl_ids else []),
+        *(cache.pnl_metrics_key(pnl_id) for pnl_id in metrics_pnl_ids),
+        *(cache.pnl_sub_pnls_key(pnl_id) for pnl_id in detail_pnl_ids)
+    )
+    publish_refresh(
+        metrics_pnl_ids | detail_pnl_ids,
+        [item["sub_pnl_id"] for item in result["results"] if item["status"] == "applied"]
+    )
+    return result
+
+# Ingestion endpoint
+@app.post("/ingest/detail-metrics", response_model=schemas.IngestResult)
+async def ingest_detail_metrics(
+    request: Request,
+    data_format: Optional[str] = Query(None, alias="format", pattern="^(ndjson|csv)$"),
+    current_user: auth.Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Stream historical detail metric snapshots (NDJSON or CSV) into the history.
+
+    The body is read line by line and written in committed batches, so its
+    size does not matter. ``format`` defaults to CSV for text/csv bodies.
+    """
+    if data_format is None:
+        data_format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    ingestion = ingest.DetailMetricsIngestion(data_format, current_user.id)
+    
+    async for line in ingest.aiter_lines(request.stream()):
+        if ingestion.feed(line):
+            await db.run_sync(ingestion.flush)
+            logger.info("Ingest: %s", ingestion.progress())
+    result = await db.run_sync(ingestion.finish)
+    logger.info("Ingest finished: %s", ingestion.progress())
+    
+    response_cache.invalidate(*(cache.pnl_sub_pnls_key(pnl_id) for pnl_id in ingestion.updated_pnl_ids))
+    # Back-dated snapshots change the history of Sub-PnLs whose current metrics stayed
+    publish_refresh(set(ingestion.pnl_ids.values()), list(ingestion.pnl_ids))
+    return result
+
+# Export endpoints
+@app.get("/export/metrics-history")
+async def export_metrics_history(
+    data_format: str = Query("csv", alias="format", pattern="^(csv|ndjson|parquet)$"),
+    entity_type: Optional[str] = None,
+    entity_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    """Stream metrics history entries, oldest first, created in [since, until)"""
+    return export.export_response(
+        export.history_statement(entity_type, entity_id, since, until), data_format, "metrics-history"
+    )
+
+@app.get("/export/metrics")
+async def export_metrics(
+    data_format: str = Query("csv", alias="format", pattern="^(csv|ndjson|parquet)$"),
+    entity_type: str = Query("sub_pnl", pattern="^(pnl|sub_pnl|sub_pnl_detail)$"),
+    entity_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    """Stream current metrics of every PnL, Sub-PnL or Sub-PnL detail, updated in [since, until)"""
+    return export.export_response(
+        export.metrics_statement(entity_type, entity_id, since, until), data_format, f"{entity_type}-metrics"
+    )
+
 # Metrics History endpoints
 @app.get("/metrics-history", response_model=List[schemas.MetricsHistoryOut])
-def list_metrics_history(
+async def list_metrics_history(
+    request: Request,
+    response: Response,
     entity_type: Optional[str] = None,
     entity_id: Optional[int] = None,
-    limit: int = 50,
-    db: Session = Depends(get_db)
+    changed_field: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get metrics history with optional filtering"""
-    query = db.query(models.MetricsHistory).options(joinedload(models.MetricsHistory.user))
+    """Get metrics history with optional filtering, newest first.
+
+    ``changed_field`` keeps only entries where that metric changed. Keyset-paginated:
+    pass the X-Next-Cursor response header back as ``cursor`` to get the next page.
+    """
+    stmt = select(models.MetricsHistory).options(joinedload(models.MetricsHistory.user))
     
     if entity_type:
-        query = query.filter(models.MetricsHistory.entity_type == entity_type)
+        stmt = stmt.where(models.MetricsHistory.entity_type == entity_type)
     if entity_id:
-        query = query.filter(models.MetricsHistory.entity_id == entity_id)
-    
-    history = query.order_by(models.MetricsHistory.created_at.desc()).limit(limit).all()
+        stmt = stmt.where(models.MetricsHistory.entity_id == entity_id)
+    if changed_field:
+        stmt = stmt.where(metrics_history.changed_field_filter(db.bind.dialect.name, changed_field))
+    
+    history, next_cursor = await pagination.history_page(db, stmt, cursor, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    if conditional.is_not_modified(request, response, conditional.validators_for(history)):
+        return conditional.not_modified(response)
     return history
 
 @app.get("/metrics-history/{history_id}", response_model=schemas.MetricsHistoryOut)
-def get_metrics_history_item(history_id: int, db: Session = Depends(get_db)):
+async def get_metrics_history_item(history_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
     """Get specific metrics history item"""
-    history = db.query(models.MetricsHistory).options(joinedload(models.MetricsHistory.user)).filter(
+    history = await db.scalar(select(models.MetricsHistory).options(joinedload(models.MetricsHistory.user)).where(
         models.MetricsHistory.id == history_id
-    ).first()
+    ))
     
     if not history:
         raise HTTPException(status_code=404, detail="Metrics history not found")
     
+    if conditional.is_not_modified(request, response, conditional.validators_for(history)):
+        return conditional.not_modified(response)
     return history
 
 
 @app.get("/sub-pnls/{sub_pnl_id}/metrics-history", response_model=List[schemas.MetricsHistoryOut])
-def get_sub_pnl_metrics_history(sub_pnl_id: int, db: Session = Depends(get_db)):
-    """Get metrics history for a specific Sub-PnL"""
+async def get_sub_pnl_metrics_history(
+    sub_pnl_id: int,
+    request: Request,
+    response: Response,
+    limit: int = Query(100, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get metrics history for a specific Sub-PnL, newest first (keyset-paginated)"""
     # Verify Sub-PnL exists
-    sub_pnl = db.query(models.SubPnL).filter(models.SubPnL.id == sub_pnl_id).first()
+    sub_pnl = await db.get(models.SubPnL, sub_pnl_id)
     if not sub_pnl:
         raise HTTPException(status_code=404, detail="Sub-PnL not found")
     
-    history = db.query(models.MetricsHistory).options(joinedload(models.MetricsHistory.user)).filter(
+    stmt = select(models.MetricsHistory).options(joinedload(models.MetricsHistory.user)).where(
         models.MetricsHistory.entity_type.in_(["sub_pnl", "sub_pnl_detail"]),
         models.MetricsHistory.entity_id == sub_pnl_id
-    ).order_by(models.MetricsHistory.created_at.desc()).all()
+    )
+    history, next_cursor = await pagination.history_page(db, stmt, cursor, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     
+    if conditional.is_not_modified(request, response, conditional.validators_for(history)):
+        return conditional.not_modified(response)
     return history
 
+@app.get("/sub-pnls/{sub_pnl_id}/trends", response_model=schemas.TrendsOut)
+async def get_sub_pnl_trends(
+    sub_pnl_id: int,
+    bucket: str = Query("week", pattern="^(day|week|month)$"),
+    entity_type: str = Query("sub_pnl", pattern="^(sub_pnl|sub_pnl_detail)$"),
+    metric: Optional[str] = None,
+    since: Optional[datetime] = Query(None, alias="from"),
+    until: Optional[datetime] = Query(None, alias="to"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Per-metric last/min/max/avg of a Sub-PnL's history per day, week or month.
+
+    Served from pre-aggregated buckets, so the cost depends on the number
+    of buckets in [from, to), not on how often the metrics were edited.
+    """
+    sub_pnl = await db.get(models.SubPnL, sub_pnl_id)
+    if not sub_pnl:
+        raise HTTPException(status_code=404, detail="Sub-PnL not found")
+    if metric and metric not in metrics_history.METRIC_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Unknown metric field: {metric}")
+    
+    series = await trends.load_series(db, entity_type, sub_pnl_id, bucket, since, until, metric)
+    return {"sub_pnl_id": sub_pnl_id, "entity_type": entity_type, "bucket": bucket, "series": series}
+
 @app.delete("/metrics-history/{history_id}")
-def delete_metrics_history(history_id: int, db: Session = Depends(get_db)):
-    """Delete a specific metrics history entry and restore latest metrics if it was the latest"""
-    # Get the history entry to delete
-    history_entry = db.query(models.MetricsHistory).filter(
-        models.MetricsHistory.id == history_id
-    ).first()
+async def delete_metrics_history(history_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Delete a Sub-PnL metrics history entry and restore the previous metrics if it was the current version"""
+    history_entry = await db.get(models.MetricsHistory, history_id)
     
     if not history_entry:
         raise HTTPException(status_code=404, detail="Metrics history entry not found")
+    if history_entry.entity_type not in metrics_history.RESTORABLE_TYPES:
+        # PnL metrics are entered by hand; there is nothing to restore them from
+        raise HTTPException(status_code=400, detail="Only Sub-PnL metrics history entries can be deleted")
     
     entity_type = history_entry.entity_type
     entity_id = history_entry.entity_id
     
-    # Check if this is the latest entry for this entity
-    latest_history = db.query(models.MetricsHistory).filter(
-        models.MetricsHistory.entity_type == entity_type,
-        models.MetricsHistory.entity_id == entity_id
-    ).order_by(models.MetricsHistory.created_at.desc()).first()
-    
-    is_latest = (latest_history and latest_history.id == history_id)
-    
-    # Delete the history entry
-    db.delete(history_entry)
-    db.commit()
-    
-    # If we deleted the latest entry, restore the next latest metrics
-    if is_latest:
-        # Get the new latest history entry after deletion
-        new_latest_history = db.query(models.MetricsHistory).filter(
-            models.MetricsHistory.entity_type == entity_type,
-            models.MetricsHistory.entity_id == entity_id
-        ).order_by(models.MetricsHistory.created_at.desc()).first()
-        
-        if new_latest_history:
-            # Restore metrics from the new latest history
-            metrics_data = json.loads(new_latest_history.metrics_data)
-            
-            if entity_type == "sub_pnl":
-                # Update Sub-PnL metrics
-                sub_pnl_metrics = db.query(models.SubPnLMetrics).filter(
-                    models.SubPnLMetrics.sub_pnl_id == entity_id
-                ).first()
-                if sub_pnl_metrics:
-                    for key, value in metrics_data.items():
-                        if hasattr(sub_pnl_metrics, key):
-                            setattr(sub_pnl_metrics, key, value)
-                    db.commit()
-            
-            elif entity_type == "sub_pnl_detail":
-                # Update Sub-PnL detail metrics
-                detail_metrics = db.query(models.SubPnLDetailMetrics).filter(
-                    models.SubPnLDetailMetrics.sub_pnl_id == entity_id
-                ).first()
-                if detail_metrics:
-                    for key, value in metrics_data.items():
-                        if hasattr(detail_metrics, key):
-                            setattr(detail_metrics, key, value)
-                    db.commit()
-        else:
-            # No history left, reset to default values
-            if entity_type == "sub_pnl":
-                sub_pnl_metrics = db.query(models.SubPnLMetrics).filter(
-                    models.SubPnLMetrics.sub_pnl_id == entity_id
-                ).first()
-                if sub_pnl_metrics:
-                    # Reset to default values
-                    sub_pnl_metrics.features_shipped = 0
-                    sub_pnl_metrics.total_testcases_executed = 0
-                    sub_pnl_metrics.total_bugs_logged = 0
-                    sub_pnl_metrics.regression_bugs_found = 0
-                    sub_pnl_metrics.sanity_time_avg_hours = 0.0
-                    sub_pnl_metrics.automation_coverage_percent = 0.0
-                    sub_pnl_metrics.escaped_bugs = 0
-                    sub_pnl_metrics.test_coverage_percent = 0.0
-                    sub_pnl_metrics.testcases_per_bug = 0.0
-                    sub_pnl_metrics.bugs_per_100_tests = 0.0
-                    db.commit()
-            
-            elif entity_type == "sub_pnl_detail":
-                detail_metrics = db.query(models.SubPnLDetailMetrics).filter(
-                    models.SubPnLDetailMetrics.sub_pnl_id == entity_id
-                ).first()
-                if detail_metrics:
-                    # Reset to default values
-                    detail_metrics.features_shipped = 0
-                    detail_metrics.total_testcases_executed = 0
-                    detail_metrics.total_bugs_logged = 0
-                    detail_metrics.testcase_peer_review = 0
-                    detail_metrics.regression_bugs_found = 0
-                    detail_metrics.sanity_time_avg_hours = 0.0
-                    detail_metrics.api_test_time_avg_hours = 0.0
-                    detail_metrics.automation_coverage_percent = 0.0
-                    detail_metrics.escaped_bugs = 0
-                    detail_metrics.test_coverage_percent = 0.0
-                    detail_metrics.testcases_per_bug = 0.0
-                    detail_metrics.bugs_per_100_tests = 0.0
-                    db.commit()
-    
-    return {"message": "Metrics history deleted successfully", "restored_latest": is_latest}
-
+    # Delete, restore and refresh the PnL rollup in one transaction
+    restored = await db.run_sync(metrics_history.delete_entry, history_entry)
+    await db.commit()
+    
+    # Restored Sub-PnL metrics feed the dashboard, detail metrics the Sub-PnL list
+    pnl_id = await db.scalar(select(models.SubPnL.pnl_id).where(models.SubPnL.id == entity_id))
+    if restored and entity_type == "sub_pnl":
+        response_cache.invalidate(cache.dashboard_key(), cache.pnl_metrics_key(pnl_id))
+    elif restored:
+        response_cache.invalidate(cache.pnl_sub_pnls_key(pnl_id))
+    
+    if pnl_id is not None:
+        topics = [events.pnl_topic(pnl_id), events.sub_pnl_topic(entity_id)]
+        events.event_bus.publish("history_deleted", {
+            "id": history_id, "entity_type": entity_type, "entity_id": entity_id, "pnl_id": pnl_id, "restored": restored
+        }, topics)
+        if restored and entity_type == "sub_pnl":
+            metrics = await db.scalar(select(models.SubPnLMetrics).where(models.SubPnLMetrics.sub_pnl_id == entity_id))
+            publish_metrics(entity_type, entity_id, pnl_id, schemas.SubPnLMetricsOut.model_validate(metrics))
+            await publish_pnl_metrics(db, pnl_id)
+        elif restored and entity_type == "sub_pnl_detail":
+            metrics = await db.scalar(detail_versions.active(entity_id))
+            publish_metrics(entity_type, entity_id, pnl_id, schemas.SubPnLDetailMetricsOut.model_validate(metrics))
+    
+    return {"message": "Metrics history deleted successfully", "restored_latest": restored}
 
 
 if __name__ == "__main__":
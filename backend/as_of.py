@@ -0,0 +1,193 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, aliased
+import models
+import schemas
+import aggregation
+import defaults
+import detail_versions
+from bulk_metrics import first_rows_by_sub_pnl
+from timeutil import as_utc
+
+class State(NamedTuple):
+    values: Optional[dict]  # None when the entity had no metrics yet
+    recorded_at: Optional[datetime]  # Snapshot time; None when rebuilt from later history
+
+# Columns of a metrics row that are not metric values
+_KEY_COLUMNS = {"id", "pnl_id", "sub_pnl_id", "current_history_id", "created_at", "updated_at"}
+
+def _metric_values(model, values: dict) -> dict:
+    """Metric columns of ``model`` in ``values``, rounded as the column would store them"""
+    result = {}
+    for key, value in values.items():
+        column = model.__table__.columns.get(key)
+        if column is None or key in _KEY_COLUMNS:
+            continue
+        scale = getattr(column.type, "scale", None)
+        result[key] = round(float(value), scale) if scale is not None and value is not None else value
+    return result
+
+def _row_values(row) -> dict:
+    return {
+        column.key: getattr(row, column.key) for column in row.__table__.columns
+        if column.key not in _KEY_COLUMNS
+    }
+
+def _seek(entity_type: str, entity_id, at: datetime, before: bool):
+    # One index seek on (entity_type, entity_id, created_at, id) per entity
+    history = aliased(models.MetricsHistory)
+    if before:
+        condition, order = history.created_at <= at, (history.created_at.desc(), history.id.desc())
+    else:
+        condition, order = history.created_at > at, (history.created_at, history.id)
+    return select(history.id).where(
+        history.entity_type == entity_type,
+        history.entity_id == entity_id,
+        condition
+    ).order_by(*order).limit(1).scalar_subquery()
+
+def entity_states(db: Session, entity_type: str, owner, entity_ids: Iterable[int], at: datetime) -> Dict[int, State]:
+    """Metrics of each entity as they were at ``at``, read from metrics history.
+
+    Every history row stores the complete metrics that were written, so each
+    one is a full checkpoint and nothing has to be replayed: the state is the
+    newest row at or before ``at``. Without one, it is rebuilt from the first
+    later row (its metrics with the previous values of the fields it changed),
+    or is empty if that row created the metrics. Entities without any history
+    are left out; their current row is still their state.
+    """
+    entity_ids = list(entity_ids)
+    if not entity_ids:
+        return {}
+    at = as_utc(at)
+    seeks = db.execute(
+        select(owner.id, _seek(entity_type, owner.id, at, True), _seek(entity_type, owner.id, at, False))
+        .where(owner.id.in_(entity_ids))
+    ).all()
+    history_ids = [history_id for _, *ids in seeks for history_id in ids if history_id]
+    rows = {}
+    if history_ids:
+        rows = {
+            row.id: row for row in db.scalars(
+                select(models.MetricsHistory).where(models.MetricsHistory.id.in_(history_ids))
+            )
+        }
+
+    states = {}
+    for entity_id, before_id, after_id in seeks:
+        if before_id:
+            row = rows[before_id]
+            states[entity_id] = State(row.metrics_data, as_utc(row.created_at))
+        elif after_id:
+            row = rows[after_id]
+            values = None if row.change_type == "create" else {**row.metrics_data, **(row.previous_values or {})}
+            states[entity_id] = State(values, None)
+    return states
+
+def detail_metrics_at(db: Session, sub_pnl_id: int, at: datetime) -> models.SubPnLDetailMetrics:
+    """Sub-PnL detail metrics at ``at``, as an unsaved row"""
+    state = entity_states(db, "sub_pnl_detail", models.SubPnL, [sub_pnl_id], at).get(sub_pnl_id)
+    if state is None:
+        current = db.scalar(detail_versions.active(sub_pnl_id))
+        if current:
+            return current
+        state = State(None, None)
+    return defaults.virtual_row(
+        models.SubPnLDetailMetrics, sub_pnl_id=sub_pnl_id, updated_at=state.recorded_at,
+        **_metric_values(models.SubPnLDetailMetrics, state.values or {})
+    )
+
+def pnl_metrics_at(db: Session, pnl_ids: Iterable[int], at: datetime) -> Dict[int, models.PnLMetrics]:
+    """PnL metrics at ``at`` for several PnLs, as unsaved rows.
+
+    Mirrors how they are maintained live: the manually set metrics, whose
+    rolled up fields are replaced by the Sub-PnL aggregate (over Sub-PnLs
+    created by then, as they were at ``at``) once a Sub-PnL changed after
+    the last manual update. PnLs without a metrics row get the aggregate.
+    """
+    pnl_ids = list(pnl_ids)
+    at = as_utc(at)
+    manual = entity_states(db, "pnl", models.PnL, pnl_ids, at)
+    current = {}
+    without_history = [pnl_id for pnl_id in pnl_ids if pnl_id not in manual]
+    if without_history:
+        for row in db.scalars(
+            select(models.PnLMetrics).where(models.PnLMetrics.pnl_id.in_(without_history)).order_by(models.PnLMetrics.id)
+        ):
+            current.setdefault(row.pnl_id, row)
+
+    sub_pnls = db.execute(
+        select(models.SubPnL.id, models.SubPnL.pnl_id)
+        .where(models.SubPnL.pnl_id.in_(pnl_ids), models.SubPnL.created_at <= at)
+    ).all()
+    sub_states = entity_states(db, "sub_pnl", models.SubPnL, [sub_pnl_id for sub_pnl_id, _ in sub_pnls], at)
+    current_sub = first_rows_by_sub_pnl(
+        db, models.SubPnLMetrics, [sub_pnl_id for sub_pnl_id, _ in sub_pnls if sub_pnl_id not in sub_states]
+    )
+
+    totals = {pnl_id: dict.fromkeys(aggregation.ROLLUP_FIELDS + ("metrics_count",), 0) for pnl_id in pnl_ids}
+    last_sub_change = {}
+    for sub_pnl_id, pnl_id in sub_pnls:
+        state = sub_states.get(sub_pnl_id)
+        if state is None:
+            row = current_sub.get(sub_pnl_id)
+            values = _row_values(row) if row else None
+        else:
+            values = state.values
+            if state.recorded_at and (pnl_id not in last_sub_change or state.recorded_at > last_sub_change[pnl_id]):
+                last_sub_change[pnl_id] = state.recorded_at
+        if values is None:
+            continue
+        for field in aggregation.ROLLUP_FIELDS:
+            totals[pnl_id][field] += float(values.get(field) or 0)
+        totals[pnl_id]["metrics_count"] += 1
+
+    result = {}
+    for pnl_id in pnl_ids:
+        state = manual.get(pnl_id)
+        sub_changed_at = last_sub_change.get(pnl_id)
+        if state and state.recorded_at and (sub_changed_at is None or state.recorded_at >= sub_changed_at):
+            values, updated_at = state.values, state.recorded_at
+        else:
+            if state:
+                base = state.values
+            else:
+                base = _row_values(current[pnl_id]) if pnl_id in current else None
+            if base is None or sub_changed_at:
+                values = {**(base or {}), **aggregation.rollup_from_totals(totals[pnl_id])}
+            else:
+                values = base
+            changed_at = [time for time in (state.recorded_at if state else None, sub_changed_at) if time]
+            updated_at = max(changed_at, default=None)
+        result[pnl_id] = defaults.virtual_row(
+            models.PnLMetrics, pnl_id=pnl_id, updated_at=updated_at,
+            **_metric_values(models.PnLMetrics, values)
+        )
+    return result
+
+def dashboard_at(db: Session, at: datetime) -> List[schemas.PnLWithMetrics]:
+    """The dashboard as it was at ``at``: PnLs and Sub-PnLs created by then, with their metrics then"""
+    at = as_utc(at)
+    sub_pnls_count = (
+        select(func.count(models.SubPnL.id))
+        .where(models.SubPnL.pnl_id == models.PnL.id, models.SubPnL.created_at <= at)
+        .correlate(models.PnL)
+        .scalar_subquery()
+    )
+    rows = db.execute(
+        select(models.PnL, sub_pnls_count).where(models.PnL.created_at <= at).order_by(models.PnL.id)
+    ).all()
+    metrics = pnl_metrics_at(db, [pnl.id for pnl, _ in rows], at)
+    return [
+        schemas.PnLWithMetrics(
+            id=pnl.id,
+            name=pnl.name,
+            description=pnl.description,
+            created_at=pnl.created_at,
+            updated_at=pnl.updated_at,
+            sub_pnls_count=count,
+            metrics=metrics[pnl.id]
+        )
+        for pnl, count in rows
+    ]
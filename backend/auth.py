@@ -0,0 +1,61 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Awaitable, Callable, NamedTuple, Optional
+from cache import ResponseCache
+from security import decode_claims, invalid_token_error
+
+# Verified principals are cached per token; revocation is checked on every hit
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "4096"))
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+
+class Principal(NamedTuple):
+    """The authenticated user as described by a verified access token"""
+    id: int
+    email: str
+    role: str
+    jti: Optional[str]
+    expires_at: float
+
+principal_cache = ResponseCache(max_entries=AUTH_CACHE_MAX_ENTRIES, ttl_seconds=AUTH_CACHE_TTL_SECONDS)
+
+# Revoked token ids, kept until the token would have expired anyway
+_revoked = {}
+_revoked_lock = threading.Lock()
+
+def token_key(token: str):
+    return ("principal", hashlib.sha256(token.encode()).hexdigest())
+
+def revoke(principal: Principal):
+    """Reject the principal's token from now on (in this process)"""
+    now = time.time()
+    with _revoked_lock:
+        for jti in [jti for jti, expires_at in _revoked.items() if expires_at <= now]:
+            del _revoked[jti]
+        if principal.jti:
+            _revoked[principal.jti] = principal.expires_at
+
+def is_revoked(jti: Optional[str]) -> bool:
+    return jti is not None and jti in _revoked
+
+async def _verify(token: str, load_user: Callable[[int], Awaitable]) -> Principal:
+    claims = decode_claims(token)
+    if "email" in claims and "role" in claims:
+        return Principal(claims["sub"], claims["email"], claims["role"], claims.get("jti"), claims["exp"])
+
+    # Tokens issued before role/email were embedded: look the user up once
+    user = await load_user(claims["sub"])
+    if not user:
+        raise invalid_token_error()
+    return Principal(user.id, user.email, user.role, claims.get("jti"), claims["exp"])
+
+async def authenticate(token: str, load_user: Callable[[int], Awaitable]) -> Principal:
+    """Principal of a bearer token, verified once and then served from memory.
+
+    ``load_user`` is only awaited for tokens that do not carry role and email.
+    """
+    principal = await principal_cache.get_or_set(token_key(token), lambda: _verify(token, load_user))
+    if is_revoked(principal.jti) or principal.expires_at <= time.time():
+        raise invalid_token_error()
+    return principal
\ No newline at end of file
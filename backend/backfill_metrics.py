@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Metrics backfill job for QAlytics
+Creates the default metrics rows that GET endpoints serve virtually,
+so reads never have to insert them
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import SessionLocal
+import defaults
+
+def main():
+    db = SessionLocal()
+    try:
+        created = defaults.backfill_missing_rows(db)
+    except Exception as e:
+        print(f"❌ Backfill failed: {str(e)}")
+        db.rollback()
+        sys.exit(1)
+    finally:
+        db.close()
+
+    for table, count in created.items():
+        print(f"   - {table}: {count} row(s) created")
+    print("✅ Metrics backfill completed successfully!")
+
+if __name__ == "__main__":
+    main()
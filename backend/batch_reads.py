@@ -0,0 +1,88 @@
+import os
+from typing import List
+from fastapi import HTTPException
+from sqlalchemy import and_, select
+from sqlalchemy.orm import Session
+import models
+import schemas
+import aggregation
+import defaults
+import rollups
+
+# Most ids accepted by one batch read, and ids per IN query
+BATCH_READ_MAX_IDS = int(os.getenv("BATCH_READ_MAX_IDS", "10000"))
+BATCH_READ_CHUNK_SIZE = int(os.getenv("BATCH_READ_CHUNK_SIZE", "500"))
+
+def parse_ids(raw: str) -> List[int]:
+    """Ids of a comma separated list, in order, without repeats"""
+    try:
+        ids = list(dict.fromkeys(int(part) for part in raw.split(",") if part.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma separated list of integers")
+    if not ids:
+        raise HTTPException(status_code=400, detail="ids must not be empty")
+    if len(ids) > BATCH_READ_MAX_IDS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_READ_MAX_IDS} ids per request")
+    return ids
+
+def _chunks(ids: List[int]):
+    # Keeps each IN list well under the bound parameter limits
+    for start in range(0, len(ids), BATCH_READ_CHUNK_SIZE):
+        yield ids[start:start + BATCH_READ_CHUNK_SIZE]
+
+def detail_metrics_batch(db: Session, sub_pnl_ids: List[int]) -> schemas.DetailMetricsBatch:
+    """Active detail metrics of many Sub-PnLs, one IN query per chunk of ids.
+
+    Items follow the order of ``sub_pnl_ids``; Sub-PnLs without detail
+    metrics get virtual defaults, ids without a Sub-PnL are listed as missing.
+    """
+    model = models.SubPnLDetailMetrics
+    found = {}
+    for chunk in _chunks(sub_pnl_ids):
+        for sub_pnl_id, row in db.execute(
+            select(models.SubPnL.id, model)
+            .outerjoin(model, and_(model.sub_pnl_id == models.SubPnL.id, model.is_active))
+            .where(models.SubPnL.id.in_(chunk))
+        ):
+            found[sub_pnl_id] = row or defaults.virtual_row(model, sub_pnl_id=sub_pnl_id)
+    return schemas.DetailMetricsBatch(
+        items=[found[sub_pnl_id] for sub_pnl_id in sub_pnl_ids if sub_pnl_id in found],
+        missing=[sub_pnl_id for sub_pnl_id in sub_pnl_ids if sub_pnl_id not in found]
+    )
+
+def pnl_metrics_batch(db: Session, pnl_ids: List[int]) -> schemas.PnLMetricsBatch:
+    """Metrics of many PnLs, one IN query per chunk of ids.
+
+    Items follow the order of ``pnl_ids``; like ``GET /pnls/{id}/metrics``,
+    PnLs without a metrics row get virtual metrics from their rollup, or from
+    one grouped aggregate query for those without a rollup either. Ids
+    without a PnL are listed as missing.
+    """
+    entries = {}
+    for chunk in _chunks(pnl_ids):
+        rows = db.execute(
+            select(models.PnL.id, models.PnLMetrics, models.PnLRollup)
+            .outerjoin(models.PnLMetrics, models.PnLMetrics.pnl_id == models.PnL.id)
+            .outerjoin(models.PnLRollup, models.PnLRollup.pnl_id == models.PnL.id)
+            .where(models.PnL.id.in_(chunk))
+            .order_by(models.PnL.id, models.PnLMetrics.id)
+        )
+        # Keep the oldest metrics row if a PnL ever got duplicates
+        for pnl_id, metrics, rollup in rows:
+            entries.setdefault(pnl_id, (metrics, rollup))
+
+    unaggregated_ids = [pnl_id for pnl_id, (metrics, rollup) in entries.items() if not metrics and not rollup]
+    aggregated = {}
+    for chunk in _chunks(unaggregated_ids):
+        aggregated.update(aggregation.aggregate_pnl_rollups(db, chunk))
+
+    found = {}
+    for pnl_id, (metrics, rollup) in entries.items():
+        if not metrics:
+            values = rollups.rollup_values(rollup) if rollup else aggregated[pnl_id]
+            metrics = defaults.virtual_row(models.PnLMetrics, pnl_id=pnl_id, **values)
+        found[pnl_id] = metrics
+    return schemas.PnLMetricsBatch(
+        items=[found[pnl_id] for pnl_id in pnl_ids if pnl_id in found],
+        missing=[pnl_id for pnl_id in pnl_ids if pnl_id not in found]
+    )
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Auth dependency benchmark for QAlytics
+Compares p50/p99 latency of resolving the current user per request:
+the old path (decode token, then query the users table) against
+get_current_user (claims from the token, verified principal cache)
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+from database import AsyncSessionLocal, async_engine
+from security import create_user_token, decode_token
+from app import get_current_user
+import models
+
+async def user_lookup_dependency(authorization: str, db):
+    """get_current_user as it was: a users-table query on every request"""
+    user_id = decode_token(authorization.split(" ")[1])
+    return await db.scalar(select(models.User).where(models.User.id == user_id))
+
+async def measure(dependency, authorization: str, iterations: int):
+    timings = []
+    for _ in range(iterations):
+        # A fresh session per call, like one request each
+        async with AsyncSessionLocal() as db:
+            started = time.perf_counter()
+            await dependency(authorization=authorization, db=db)
+            timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2], timings[min(int(len(timings) * 0.99), len(timings) - 1)]
+
+async def run(iterations: int):
+    async with AsyncSessionLocal() as db:
+        user = await db.scalar(select(models.User).order_by(models.User.id))
+    if not user:
+        print("❌ No users found, run init_db.py first")
+        return
+
+    authorization = f"Bearer {create_user_token(user)}"
+    # Warm up connections and the principal cache
+    await measure(user_lookup_dependency, authorization, 10)
+    await measure(get_current_user, authorization, 10)
+
+    print(f"Resolving user {user.email} {iterations} times")
+    for name, dependency in (("users-table lookup", user_lookup_dependency), ("token claims + cache", get_current_user)):
+        p50, p99 = await measure(dependency, authorization, iterations)
+        print(f"  {name:<22} p50 {p50 * 1e6:8.1f} µs   p99 {p99 * 1e6:8.1f} µs")
+    await async_engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the auth dependency")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(run(args.iterations))
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Response serialization benchmark for QAlytics
+Compares p50/p99 time to turn a handler's return value into response bytes:
+FastAPI's response_model path (validate, dump to Python objects, json.dumps)
+against FastJSONRoute (validate once, pydantic-core writes the JSON), for
+the /dashboard and /metrics-history?limit=1000 payloads
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import json
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+from database import SessionLocal
+from app import app, build_dashboard
+import models
+import responses
+
+HISTORY_LIMIT = 1000
+
+async def fastapi_path(route, payload) -> bytes:
+    content = await serialize_response(field=route.response_field, response_content=payload)
+    return JSONResponse(content).body
+
+async def fast_path(route, payload) -> bytes:
+    return responses.FastJSONResponse(responses.encode(route.response_adapter, payload)).body
+
+async def measure(serialize, route, payload, iterations: int):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await serialize(route, payload)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2], timings[min(int(len(timings) * 0.99), len(timings) - 1)]
+
+def route_for(path: str):
+    return next(route for route in app.routes if getattr(route, "path", None) == path and "GET" in route.methods)
+
+async def run(iterations: int):
+    with SessionLocal() as db:
+        dashboard = build_dashboard(db)
+        history = db.scalars(
+            select(models.MetricsHistory).options(joinedload(models.MetricsHistory.user))
+            .order_by(models.MetricsHistory.created_at.desc(), models.MetricsHistory.id.desc())
+            .limit(HISTORY_LIMIT)
+        ).all()
+        if not history:
+            print("❌ No metrics history found, run init_db.py first")
+            return
+        if len(history) < HISTORY_LIMIT:
+            print(f"Only {len(history)} history entries stored, repeating them up to {HISTORY_LIMIT}")
+            history = (history * (HISTORY_LIMIT // len(history) + 1))[:HISTORY_LIMIT]
+
+        cases = (
+            ("/dashboard", route_for("/dashboard"), dashboard),
+            (f"/metrics-history?limit={HISTORY_LIMIT}", route_for("/metrics-history"), history),
+        )
+        for name, route, payload in cases:
+            # Both paths must produce the same document
+            assert json.loads(await fastapi_path(route, payload)) == json.loads(await fast_path(route, payload)), name
+            print(f"{name}: {len(await fast_path(route, payload))} bytes, {iterations} iterations")
+            for label, serialize in (("response_model + json", fastapi_path), ("FastJSONRoute", fast_path)):
+                await measure(serialize, route, payload, 10)
+                p50, p99 = await measure(serialize, route, payload, iterations)
+                print(f"  {label:<22} p50 {p50 * 1e3:8.3f} ms   p99 {p99 * 1e3:8.3f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark response serialization")
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(run(args.iterations))
+
+if __name__ == "__main__":
+    main()
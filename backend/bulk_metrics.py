@@ -0,0 +1,149 @@
+import os
+from collections import defaultdict
+from typing import Any, Dict, List, Set, Tuple
+from pydantic import ValidationError
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+import models
+import schemas
+import rollups
+import metrics_history
+import detail_versions
+import derived
+import trends
+
+# Largest accepted POST /metrics/bulk payload
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "1000"))
+
+def _error(index: int, sub_pnl_id, *errors: str) -> dict:
+    return {"index": index, "sub_pnl_id": sub_pnl_id, "status": "error", "errors": list(errors)}
+
+def validate_items(db: Session, payloads: List[Any]) -> Tuple[Dict[int, schemas.BulkMetricsItem], Dict[int, models.SubPnL], List[dict]]:
+    """Validate every payload in one pass.
+
+    Returns the valid items by index, their Sub-PnLs (loaded with one IN
+    query) and an error result for every invalid item.
+    """
+    items, errors = {}, []
+    seen = set()
+    for index, payload in enumerate(payloads):
+        try:
+            item = schemas.BulkMetricsItem.model_validate(payload)
+        except ValidationError as e:
+            sub_pnl_id = payload.get("sub_pnl_id") if isinstance(payload, dict) else None
+            errors.append(_error(index, sub_pnl_id, *(
+                f"{'.'.join(str(part) for part in error['loc']) or 'item'}: {error['msg']}"
+                for error in e.errors()
+            )))
+            continue
+        if item.metrics is None and item.detail_metrics is None:
+            errors.append(_error(index, item.sub_pnl_id, "item: metrics or detail_metrics is required"))
+        elif item.sub_pnl_id in seen:
+            errors.append(_error(index, item.sub_pnl_id, "sub_pnl_id: duplicate in this request"))
+        else:
+            seen.add(item.sub_pnl_id)
+            items[index] = item
+
+    sub_pnls = {}
+    if items:
+        sub_pnls = {
+            sub_pnl.id: sub_pnl for sub_pnl in db.scalars(
+                select(models.SubPnL).where(models.SubPnL.id.in_([item.sub_pnl_id for item in items.values()]))
+            )
+        }
+    for index, item in list(items.items()):
+        if item.sub_pnl_id not in sub_pnls:
+            errors.append(_error(index, item.sub_pnl_id, "sub_pnl_id: Sub PnL not found"))
+            del items[index]
+    return items, sub_pnls, errors
+
+def first_rows_by_sub_pnl(db: Session, model, sub_pnl_ids) -> dict:
+    """First metrics row of each Sub-PnL, loaded with one IN query"""
+    rows = {}
+    if sub_pnl_ids:
+        for row in db.scalars(select(model).where(model.sub_pnl_id.in_(sub_pnl_ids)).order_by(model.id)):
+            rows.setdefault(row.sub_pnl_id, row)
+    return rows
+
+def _upsert(db: Session, model, values_by_sub_pnl: dict, existing: dict,
+            entity_type: str, label: str, user_id: int, sub_pnls: dict) -> Tuple[List[dict], List[Tuple]]:
+    """Multi-row UPDATE/INSERT of one metrics table; returns history rows and rollup changes"""
+    updates, inserts, history_rows, changes = [], [], [], []
+    for sub_pnl_id, values in values_by_sub_pnl.items():
+        row = existing.get(sub_pnl_id)
+        name = sub_pnls[sub_pnl_id].name
+        if row:
+            previous_values = {key: getattr(row, key) for key in values}
+            updates.append({"id": row.id, **derived.with_derived(values)})
+            history_rows.append(metrics_history.history_values(
+                entity_type, sub_pnl_id, values, "update", user_id,
+                f"Bulk updated {label} for {name}", previous_values
+            ))
+        else:
+            previous_values = None
+            inserts.append({"sub_pnl_id": sub_pnl_id, **derived.with_derived(values)})
+            history_rows.append(metrics_history.history_values(
+                entity_type, sub_pnl_id, values, "create", user_id, f"Bulk created {label} for {name}"
+            ))
+        changes.append((sub_pnls[sub_pnl_id].pnl_id, previous_values, values))
+
+    if model is models.SubPnLDetailMetrics:
+        # Detail metrics are versioned: every write appends a new active version
+        detail_versions.append_versions(db, values_by_sub_pnl)
+        return history_rows, changes
+    if updates:
+        db.execute(update(model), updates)
+    if inserts:
+        db.execute(insert(model), inserts)
+    return history_rows, changes
+
+def apply_bulk(db: Session, payloads: List[Any], user_id: int) -> Tuple[dict, Set[int], Set[int]]:
+    """Validate and upsert many Sub-PnL metric payloads; the caller commits.
+
+    Valid items are written with multi-row statements, their history in one
+    INSERT, and each affected PnL rollup gets a single combined delta.
+    Returns the result summary and the PnL ids whose metrics, respectively
+    Sub-PnL detail metrics, changed.
+    """
+    items, sub_pnls, errors = validate_items(db, payloads)
+
+    metrics = {item.sub_pnl_id: item.metrics.model_dump() for item in items.values() if item.metrics}
+    detail_metrics = {item.sub_pnl_id: item.detail_metrics.model_dump() for item in items.values() if item.detail_metrics}
+
+    # Build missing rollups before any Sub-PnL metrics change in this session
+    metrics_pnl_ids = {sub_pnls[sub_pnl_id].pnl_id for sub_pnl_id in metrics}
+    for pnl_id in metrics_pnl_ids:
+        rollups.get_or_build_rollup(db, pnl_id)
+
+    history_rows, changes = _upsert(
+        db, models.SubPnLMetrics, metrics,
+        first_rows_by_sub_pnl(db, models.SubPnLMetrics, list(metrics)),
+        "sub_pnl", "metrics", user_id, sub_pnls
+    )
+    detail_history_rows, _ = _upsert(
+        db, models.SubPnLDetailMetrics, detail_metrics,
+        detail_versions.active_rows(db, list(detail_metrics)),
+        "sub_pnl_detail", "detailed metrics", user_id, sub_pnls
+    )
+    history_rows += detail_history_rows
+    if history_rows:
+        history = models.MetricsHistory
+        metrics_history.set_current_versions(db, db.execute(
+            insert(history).returning(history.entity_type, history.entity_id, history.id), history_rows
+        ).all())
+        trends.record(db, history_rows)
+
+    changes_by_pnl = defaultdict(list)
+    for pnl_id, previous_values, new_values in changes:
+        changes_by_pnl[pnl_id].append((previous_values, new_values))
+    for pnl_id, pnl_changes in changes_by_pnl.items():
+        rollups.apply_sub_pnl_changes(db, pnl_id, pnl_changes)
+
+    results = errors + [
+        {"index": index, "sub_pnl_id": item.sub_pnl_id, "status": "applied", "errors": []}
+        for index, item in items.items()
+    ]
+    results.sort(key=lambda result: result["index"])
+    summary = {"applied": len(items), "failed": len(errors), "results": results}
+    detail_pnl_ids = {sub_pnls[sub_pnl_id].pnl_id for sub_pnl_id in detail_metrics}
+    return summary, metrics_pnl_ids, detail_pnl_ids
\ No newline at end of file
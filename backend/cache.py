@@ -0,0 +1,86 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable
+
+# Response cache settings
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "30"))
+
+class ResponseCache:
+    """Bounded in-process cache with TTL expiry and LRU eviction.
+
+    Keys are tuples of endpoint name and entity id, e.g. ``("pnl_metrics", 3)``.
+    Writers call ``invalidate`` after committing; a value computed while an
+    invalidation happened is not stored, so a read racing a write cannot put
+    stale data back into the cache.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl_seconds: float = CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    async def get_or_set(self, key: Hashable, load: Callable[[], Awaitable]):
+        """Return the cached value for key, or await load() and cache its result"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return value
+                del self._entries[key]
+                self._counters["expirations"] += 1
+            self._counters["misses"] += 1
+            generation = self._generation
+
+        value = await load()
+
+        with self._lock:
+            if generation == self._generation and self.max_entries > 0:
+                self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._counters["evictions"] += 1
+        return value
+
+    def invalidate(self, *keys: Hashable):
+        """Drop the given keys; call after the write that changed them is committed"""
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self._counters["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._counters,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+response_cache = ResponseCache()
+
+def dashboard_key():
+    return ("dashboard",)
+
+def pnl_metrics_key(pnl_id: int):
+    return ("pnl_metrics", pnl_id)
+
+def pnl_sub_pnls_key(pnl_id: int):
+    return ("pnl_sub_pnls", pnl_id)
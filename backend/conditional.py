@@ -0,0 +1,94 @@
+import hashlib
+from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import NamedTuple, Optional
+from fastapi import Request, Response
+from pydantic import BaseModel
+from sqlalchemy import inspect
+from timeutil import as_utc
+
+class Validators(NamedTuple):
+    etag: str
+    last_modified: Optional[datetime]
+
+class Tagged(NamedTuple):
+    """A response payload cached together with its validators"""
+    payload: object
+    validators: Validators
+
+def _fingerprint(obj):
+    if obj is None or isinstance(obj, (str, int, float, bool, datetime)):
+        return obj
+    if isinstance(obj, BaseModel):
+        return _fingerprint(obj.model_dump())
+    if isinstance(obj, dict):
+        return tuple((key, _fingerprint(value)) for key, value in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return tuple(_fingerprint(item) for item in obj)
+    state = inspect(obj, raiseerr=False)
+    if state is not None:
+        return (state.mapper.class_.__name__,) + tuple(
+            (attr.key, getattr(obj, attr.key)) for attr in state.mapper.column_attrs
+        )
+    return str(obj)
+
+def _timestamps(obj):
+    if isinstance(obj, (list, tuple)):
+        for item in obj:
+            yield from _timestamps(item)
+    elif isinstance(obj, dict):
+        for value in obj.values():
+            yield from _timestamps(value)
+    elif isinstance(obj, BaseModel) or inspect(obj, raiseerr=False) is not None:
+        for name in ("updated_at", "created_at"):
+            value = getattr(obj, name, None)
+            if isinstance(value, datetime):
+                yield value
+        if isinstance(obj, BaseModel):
+            for name in type(obj).model_fields:
+                value = getattr(obj, name)
+                if isinstance(value, (BaseModel, list)):
+                    yield from _timestamps(value)
+
+def validators_for(*objs) -> Validators:
+    """Strong ETag and Last-Modified for ORM rows, response models or lists of them.
+
+    The ETag hashes every column value rather than just ``updated_at``, whose
+    one-second resolution would let two quick writes share a tag.
+    """
+    digest = hashlib.sha1(repr(_fingerprint(objs)).encode()).hexdigest()
+    timestamps = [as_utc(value) for value in _timestamps(objs)]
+    return Validators(f'"{digest}"', max(timestamps) if timestamps else None)
+
+def tag(payload) -> Tagged:
+    """Pair a payload with its validators before it goes into the response cache"""
+    return Tagged(payload, validators_for(payload))
+
+def is_not_modified(request: Request, response: Response, validators: Validators) -> bool:
+    """Set ETag/Last-Modified on the response and tell whether the client copy is current"""
+    response.headers["ETag"] = validators.etag
+    response.headers["Cache-Control"] = "no-cache"
+    if validators.last_modified:
+        response.headers["Last-Modified"] = format_datetime(validators.last_modified, usegmt=True)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        client_tags = [client_tag.strip() for client_tag in if_none_match.split(",")]
+        return "*" in client_tags or validators.etag in client_tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and validators.last_modified:
+        try:
+            since = as_utc(parsedate_to_datetime(if_modified_since))
+        except (TypeError, ValueError):
+            return False
+        return validators.last_modified.replace(microsecond=0) <= since
+    return False
+
+def not_modified(response: Response) -> Response:
+    """304 response carrying the validators already set on ``response``"""
+    headers = {
+        key: value for key, value in response.headers.items()
+        if key.lower() in ("etag", "last-modified", "cache-control")
+    }
+    return Response(status_code=304, headers=headers)
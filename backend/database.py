@@ -1,7 +1,9 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,14 +11,93 @@ load_dotenv()
 # Use SQLite for local development if PostgreSQL URL not provided
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./qalytics.db")
 
-# SQLite requires check_same_thread=False for FastAPI
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# Connection pool per engine: persistent connections plus burst overflow
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+# Seconds a request waits for a free connection before failing
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Connections older than this are replaced on checkout, ahead of server-side idle timeouts
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Ping on every checkout; off by default since recycling already retires stale connections
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
+# Postgres statement_timeout / SQLite busy_timeout in milliseconds, 0 disables it
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+# SQLite memory-mapped I/O size in bytes
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+def async_database_url(url: str) -> str:
+    """Same database through its asyncio driver (asyncpg / aiosqlite)"""
+    scheme, separator, rest = url.partition("://")
+    driver = scheme.split("+")[0]
+    if driver in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg{separator}{rest}"
+    if driver == "sqlite":
+        return f"sqlite+aiosqlite{separator}{rest}"
+    return url
+
+# API handlers use the async engine; CLI scripts and migrations keep the sync one
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", async_database_url(DATABASE_URL))
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+pool_options = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+}
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL lets readers run alongside the writer; NORMAL sync is durable enough under WAL"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={DB_STATEMENT_TIMEOUT_MS}")
+    cursor.close()
+
+if IS_SQLITE:
+    # SQLite requires check_same_thread=False for FastAPI
+    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False}, **pool_options)
+    # aiosqlite defaults to NullPool; pool its connections like the other engines
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=AsyncAdaptedQueuePool, **pool_options)
+    event.listen(engine, "connect", set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
 else:
-    engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+    sync_connect_args, async_connect_args = {}, {}
+    if DB_STATEMENT_TIMEOUT_MS:
+        sync_connect_args = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+        async_connect_args = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+    engine = create_engine(DATABASE_URL, connect_args=sync_connect_args, **pool_options)
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, connect_args=async_connect_args, **pool_options)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Keep attributes loaded after commit: async sessions cannot lazy-load them back
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
+def pool_config() -> dict:
+    """Effective connection pool settings, as reported at startup"""
+    return {
+        "database": async_engine.url.render_as_string(hide_password=True),
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "statement_timeout_ms": DB_STATEMENT_TIMEOUT_MS,
+    }
+
+def pool_stats() -> dict:
+    """Live usage of the API connection pool"""
+    pool = async_engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+    }
+
 def get_db():
     db = SessionLocal()
     try:
@@ -24,5 +105,11 @@ def get_db():
     finally:
         db.close()
 
+# Handlers and get_current_user share this dependency, so FastAPI hands them
+# one session (and at most one pooled connection) per request
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 def create_tables():
     Base.metadata.create_all(bind=engine)
\ No newline at end of file
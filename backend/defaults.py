@@ -0,0 +1,69 @@
+from sqlalchemy import exists
+from sqlalchemy.orm import Session
+import models
+import derived
+import aggregation
+import rollups
+
+def column_defaults(model) -> dict:
+    """Scalar column defaults of a model, as they would be applied on INSERT"""
+    return {
+        column.key: column.default.arg
+        for column in model.__table__.columns
+        if column.default is not None and column.default.is_scalar
+    }
+
+def virtual_row(model, **values):
+    """Unsaved model instance with column defaults applied.
+
+    Used by GET endpoints to answer with default metrics without inserting
+    anything; the instance is never added to a session. Metrics tables get
+    their derived metrics calculated from the values.
+    """
+    values = {**column_defaults(model), **values}
+    if model in derived.DERIVED_TABLES:
+        values = derived.with_derived(values)
+    return model(**values)
+
+def virtual_pnl_metrics(db: Session, pnl_id: int) -> models.PnLMetrics:
+    """Virtual PnL metrics from the PnL rollup, or aggregated from Sub-PnLs if there is none"""
+    rollup = db.query(models.PnLRollup).filter(models.PnLRollup.pnl_id == pnl_id).first()
+    values = rollups.rollup_values(rollup) if rollup else aggregation.compute_pnl_rollup(db, pnl_id)
+    return virtual_row(models.PnLMetrics, pnl_id=pnl_id, **values)
+
+def _sub_pnl_ids_without(db: Session, model) -> list:
+    return [
+        sub_pnl_id for (sub_pnl_id,) in db.query(models.SubPnL.id).filter(
+            ~exists().where(model.sub_pnl_id == models.SubPnL.id)
+        )
+    ]
+
+def backfill_missing_rows(db: Session) -> dict:
+    """Create every metrics row that GET endpoints would otherwise serve virtually.
+
+    Missing Sub-PnL metrics and detail metrics get default rows, rollups are
+    recomputed so the new rows are counted, and PnLs without metrics get a row
+    built from their rollup. Returns the number of rows created per table.
+    """
+    created = {}
+    for model in (models.SubPnLMetrics, models.SubPnLDetailMetrics):
+        sub_pnl_ids = _sub_pnl_ids_without(db, model)
+        db.add_all([model(sub_pnl_id=sub_pnl_id) for sub_pnl_id in sub_pnl_ids])
+        created[model.__tablename__] = len(sub_pnl_ids)
+    db.flush()
+
+    pnl_ids = [
+        pnl_id for (pnl_id,) in db.query(models.PnL.id).filter(
+            ~exists().where(models.PnLMetrics.pnl_id == models.PnL.id)
+        )
+    ]
+
+    drift = rollups.recompute_rollups(db, repair=True)
+    created[models.PnLRollup.__tablename__] = len([entry for entry in drift if entry["stored"] is None])
+
+    for pnl_id in pnl_ids:
+        rollups.sync_pnl_metrics(db, rollups.get_or_build_rollup(db, pnl_id))
+    created[models.PnLMetrics.__tablename__] = len(pnl_ids)
+
+    db.commit()
+    return created
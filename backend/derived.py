@@ -0,0 +1,151 @@
+import os
+from decimal import Decimal
+from typing import Dict, List, Sequence
+from sqlalchemy import Numeric, case, func, literal, select, update
+from sqlalchemy.orm import Session
+import models
+
+# Metric columns calculated from the counts, never written by clients
+DERIVED_FIELDS = ("test_coverage_percent", "testcases_per_bug", "bugs_per_100_tests")
+
+# Each derived metric is scale * numerator / sum(denominator fields):
+# - test_coverage_percent: despite the name, a defect detection rate: the share of all bugs that
+#   testing caught before release (escaped bugs were missed). It is the "Bug-Based Coverage" the
+#   Sub-PnL page always showed; the column keeps its name so the API does not change
+# - testcases_per_bug: test cases executed per bug logged
+# - bugs_per_100_tests: bugs logged per 100 test cases executed
+RATIOS = {
+    "test_coverage_percent": ("total_bugs_logged", 100, ("total_bugs_logged", "escaped_bugs")),
+    "testcases_per_bug": ("total_testcases_executed", 1, ("total_bugs_logged",)),
+    "bugs_per_100_tests": ("total_bugs_logged", 100, ("total_testcases_executed",)),
+}
+
+# Metrics tables holding the derived columns
+DERIVED_TABLES = (models.PnLMetrics, models.SubPnLMetrics, models.SubPnLDetailMetrics)
+
+# Largest DECIMAL(5,2) value, in hundredths
+MAX_HUNDREDTHS = 99999
+# Rows compared per round trip by the cross-check
+DERIVED_CHECK_BATCH_SIZE = int(os.getenv("DERIVED_CHECK_BATCH_SIZE", "5000"))
+
+def _count(value) -> int:
+    return int(value or 0)
+
+def _hundredths(numerator: int, scale: int, denominator: int) -> int:
+    # No denominator (no bugs, no test cases) means no rate: 0 rather than a division error
+    if denominator <= 0:
+        return 0
+    # Round half up to hundredths in integer arithmetic, exactly like the SQL version
+    value = (numerator * scale * 200 + denominator) // (2 * denominator)
+    return min(max(value, 0), MAX_HUNDREDTHS)
+
+def _as_decimal(hundredths: int) -> Decimal:
+    return Decimal(hundredths).scaleb(-2)
+
+def derive(values: dict) -> Dict[str, Decimal]:
+    """Derived metrics of one row of metric values"""
+    return {
+        field: _as_decimal(_hundredths(
+            _count(values.get(numerator)), scale, sum(_count(values.get(name)) for name in denominator)
+        ))
+        for field, (numerator, scale, denominator) in RATIOS.items()
+    }
+
+def with_derived(values: dict) -> dict:
+    """Metric values with their derived metrics (re)calculated, ready to be written"""
+    return {**values, **derive(values)}
+
+def derive_columns(columns: Dict[str, Sequence]) -> Dict[str, List[Decimal]]:
+    """Derived metrics of a whole batch at once, from and to one list per column.
+
+    Each input column is converted once, then every derived column is a
+    single pass over the zipped inputs.
+    """
+    counts = {name: [_count(value) for value in column] for name, column in columns.items()}
+    result = {}
+    for field, (numerator, scale, denominator) in RATIOS.items():
+        denominators = [sum(row) for row in zip(*(counts[name] for name in denominator))]
+        result[field] = [
+            _as_decimal(_hundredths(value, scale, total))
+            for value, total in zip(counts[numerator], denominators)
+        ]
+    return result
+
+def input_fields() -> List[str]:
+    """Metric columns the derived metrics are calculated from"""
+    return sorted({
+        name for numerator, _, denominator in RATIOS.values() for name in (numerator, *denominator)
+    })
+
+def sql_hundredths(model) -> dict:
+    """The derived metrics as SQL expressions over a metrics table, in integer hundredths.
+
+    Integer division truncates on SQLite and Postgres alike; with a positive
+    denominator and the result clamped at 0 it matches ``derive`` exactly.
+    """
+    def count(name):
+        # Missing counts are 0, as in derive
+        return func.coalesce(getattr(model, name), 0)
+
+    expressions = {}
+    for field, (numerator, scale, denominator) in RATIOS.items():
+        total = sum((count(name) for name in denominator[1:]), count(denominator[0]))
+        value = (count(numerator) * (scale * 200) + total) // (total * 2)
+        expressions[field] = case(
+            (total <= 0, 0),
+            (value > MAX_HUNDREDTHS, MAX_HUNDREDTHS),
+            (value < 0, 0),
+            else_=value
+        )
+    return expressions
+
+def recompute(db: Session, model) -> int:
+    """Recalculate the derived metrics of every row of a metrics table with one UPDATE; the caller commits"""
+    hundredth = literal(Decimal("0.01"), Numeric(3, 2))
+    result = db.execute(
+        update(model).values({
+            field: expression * hundredth for field, expression in sql_hundredths(model).items()
+        }).execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+def recompute_all(db: Session) -> Dict[str, int]:
+    """recompute for every metrics table; returns the rows updated per table"""
+    return {model.__tablename__: recompute(db, model) for model in DERIVED_TABLES}
+
+def cross_check(db: Session, model) -> List[dict]:
+    """Compare the Python and SQL calculations, and the stored values, on every row of a metrics table.
+
+    Rows are read in id order, a batch at a time; each batch goes through
+    ``derive_columns``. Returns one entry per row and field where the three
+    disagree.
+    """
+    expressions = sql_hundredths(model)
+    fields = input_fields()
+    mismatches = []
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(
+                model.id,
+                *(getattr(model, name) for name in fields),
+                *(getattr(model, field) for field in DERIVED_FIELDS),
+                *(expressions[field].label(f"sql_{field}") for field in DERIVED_FIELDS)
+            ).where(model.id > last_id).order_by(model.id).limit(DERIVED_CHECK_BATCH_SIZE)
+        ).mappings().all()
+        if not rows:
+            return mismatches
+        last_id = rows[-1]["id"]
+
+        python = derive_columns({name: [row[name] for row in rows] for name in fields})
+        for index, row in enumerate(rows):
+            for field in DERIVED_FIELDS:
+                expected = python[field][index]
+                sql = _as_decimal(row[f"sql_{field}"])
+                stored = row[field]
+                stored = None if stored is None else Decimal(str(stored)).quantize(Decimal("0.01"))
+                if expected != sql or expected != stored:
+                    mismatches.append({
+                        "table": model.__tablename__, "id": row["id"], "field": field,
+                        "python": expected, "sql": sql, "stored": stored,
+                    })
@@ -0,0 +1,60 @@
+from typing import Dict, List
+from sqlalchemy import Select, func, insert, select, update
+from sqlalchemy.orm import Session
+import models
+import derived
+
+def active(sub_pnl_id: int) -> Select:
+    """The active detail metrics version of a Sub-PnL.
+
+    ``is_active`` is the bare predicate of the partial unique index, so the
+    lookup is a single seek on that index.
+    """
+    model = models.SubPnLDetailMetrics
+    return select(model).where(model.sub_pnl_id == sub_pnl_id, model.is_active)
+
+def active_rows(db: Session, sub_pnl_ids) -> Dict[int, models.SubPnLDetailMetrics]:
+    """Active detail metrics version of each Sub-PnL, loaded with one IN query"""
+    if not sub_pnl_ids:
+        return {}
+    model = models.SubPnLDetailMetrics
+    return {
+        row.sub_pnl_id: row
+        for row in db.scalars(select(model).where(model.sub_pnl_id.in_(sub_pnl_ids), model.is_active))
+    }
+
+def append_versions(db: Session, values_by_sub_pnl: Dict[int, dict]) -> List[int]:
+    """Store values as the new active detail metrics version of each Sub-PnL.
+
+    Rows are never updated in place: the active version is deactivated and
+    a row with the next version number is inserted, all in the caller's
+    transaction, with the derived metrics calculated from the values.
+    Returns the new row ids in the order of ``values_by_sub_pnl``.
+    """
+    if not values_by_sub_pnl:
+        return []
+    model = models.SubPnLDetailMetrics
+    sub_pnl_ids = list(values_by_sub_pnl)
+    # Concurrent writers of the same Sub-PnL take turns on Postgres; SQLite serializes writes anyway
+    db.execute(
+        select(models.SubPnL.id).where(models.SubPnL.id.in_(sub_pnl_ids)).order_by(models.SubPnL.id).with_for_update()
+    )
+    latest = dict(db.execute(
+        select(model.sub_pnl_id, func.max(model.version))
+        .where(model.sub_pnl_id.in_(sub_pnl_ids))
+        .group_by(model.sub_pnl_id)
+    ).all())
+    # Deactivate first: the partial unique index allows one active row per Sub-PnL at any time
+    db.execute(update(model).where(model.sub_pnl_id.in_(sub_pnl_ids), model.is_active).values(is_active=False))
+    return db.scalars(
+        insert(model).returning(model.id, sort_by_parameter_order=True),
+        [
+            {**derived.with_derived(values), "sub_pnl_id": sub_pnl_id, "version": (latest.get(sub_pnl_id) or 0) + 1, "is_active": True}
+            for sub_pnl_id, values in values_by_sub_pnl.items()
+        ]
+    ).all()
+
+def append_version(db: Session, sub_pnl_id: int, values: dict) -> models.SubPnLDetailMetrics:
+    """append_versions for one Sub-PnL; returns the new active row"""
+    row_id, = append_versions(db, {sub_pnl_id: values})
+    return db.get(models.SubPnLDetailMetrics, row_id)
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import os
+from collections import deque
+from typing import AsyncIterator, Iterable, Optional
+
+# Event stream settings
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "256"))
+EVENTS_REPLAY_SIZE = int(os.getenv("EVENTS_REPLAY_SIZE", "1000"))
+
+def pnl_topic(pnl_id: int) -> str:
+    return f"pnl:{pnl_id}"
+
+def sub_pnl_topic(sub_pnl_id: int) -> str:
+    return f"sub_pnl:{sub_pnl_id}"
+
+class _Subscriber:
+    __slots__ = ("topics", "queue", "dropped")
+
+    def __init__(self, topics: frozenset):
+        self.topics = topics
+        self.queue = asyncio.Queue(EVENTS_QUEUE_SIZE)
+        self.dropped = False
+
+    def wants(self, event_topics: frozenset) -> bool:
+        # No topics: every event
+        return not self.topics or not self.topics.isdisjoint(event_topics)
+
+class EventBus:
+    """In-process pub/sub of metric change events, served as Server-Sent Events.
+
+    Writers call ``publish`` after committing. Publishing never waits: each
+    subscriber has a bounded queue, and one that falls that far behind is
+    dropped; its client reconnects with ``Last-Event-ID`` and catches up from
+    the buffer of recent events. An idle subscriber is a queue and a
+    suspended coroutine, so one worker holds thousands of them. Only
+    subscribers of the same process see an event.
+    """
+
+    def __init__(self, replay_size: int = EVENTS_REPLAY_SIZE):
+        self._subscribers = set()
+        self._recent = deque(maxlen=replay_size)
+        self._last_id = 0
+        self._counters = {"published": 0, "delivered": 0, "dropped_subscribers": 0}
+
+    def publish(self, event_type: str, data: dict, topics: Iterable[str]):
+        """Send an event to the subscribers of any of its topics"""
+        event_topics = frozenset(topics)
+        self._last_id += 1
+        event = (self._last_id, event_type, json.dumps(data, default=str), event_topics)
+        self._recent.append(event)
+        self._counters["published"] += 1
+        for subscriber in list(self._subscribers):
+            if subscriber.dropped or not subscriber.wants(event_topics):
+                continue
+            try:
+                subscriber.queue.put_nowait(event)
+                self._counters["delivered"] += 1
+            except asyncio.QueueFull:
+                subscriber.dropped = True
+                self._counters["dropped_subscribers"] += 1
+
+    async def stream(self, topics: Iterable[str], last_event_id: Optional[int] = None,
+                     heartbeat_seconds: float = EVENTS_HEARTBEAT_SECONDS) -> AsyncIterator[str]:
+        """SSE frames for the events of ``topics`` (all events if empty), with heartbeat comments.
+
+        With ``last_event_id`` the buffered events after it are sent first, or a
+        ``reset`` event when they are no longer buffered. Ends when the
+        subscriber is dropped for falling behind.
+        """
+        subscriber = _Subscriber(frozenset(topics))
+        self._subscribers.add(subscriber)
+        # Decide what to replay before the first yield: events published while
+        # a frame is being sent are queued and must not count as sent
+        last_id, recent = self._last_id, list(self._recent)
+        try:
+            # Ask the browser to wait a little before reconnecting
+            yield "retry: 3000\n\n"
+            sent_id = last_event_id or 0
+            oldest_id = recent[0][0] if recent else last_id + 1
+            if last_event_id is not None and not oldest_id - 1 <= last_event_id <= last_id:
+                # Missed events are gone (or were sent by a previous process): reload everything
+                sent_id = last_id
+                yield "event: reset\ndata: {}\n\n"
+            elif last_event_id is not None:
+                for event in recent:
+                    if event[0] > sent_id and subscriber.wants(event[3]):
+                        sent_id = event[0]
+                        yield self._frame(event)
+            while not subscriber.dropped or not subscriber.queue.empty():
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing the idle connection
+                    yield ": heartbeat\n\n"
+                    continue
+                # Already sent from the buffer
+                if event[0] <= sent_id:
+                    continue
+                yield self._frame(event)
+        finally:
+            self._subscribers.discard(subscriber)
+
+    @staticmethod
+    def _frame(event) -> str:
+        event_id, event_type, data, _ = event
+        return f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n"
+
+    def stats(self) -> dict:
+        return {
+            **self._counters,
+            "subscribers": len(self._subscribers),
+            "buffered": len(self._recent),
+        }
+
+event_bus = EventBus()
@@ -0,0 +1,174 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterable, Iterator, List, Optional
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import JSON, Boolean, DateTime, Float, Integer, Numeric, Select, select
+from database import SessionLocal
+import models
+import metrics_history
+from timeutil import as_utc, naive_utc
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = pq = None
+
+# Rows fetched per round trip, and per Parquet row group
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+def history_statement(entity_type: Optional[str], entity_id: Optional[int],
+                      since: Optional[datetime], until: Optional[datetime]) -> Select:
+    """Metrics history rows matching the filters, oldest first"""
+    history = models.MetricsHistory
+    stmt = select(*history.__table__.columns).order_by(history.id)
+    if entity_type:
+        stmt = stmt.where(history.entity_type == entity_type)
+    if entity_id is not None:
+        stmt = stmt.where(history.entity_id == entity_id)
+    if since is not None:
+        stmt = stmt.where(history.created_at >= naive_utc(since))
+    if until is not None:
+        stmt = stmt.where(history.created_at < naive_utc(until))
+    return stmt
+
+def metrics_statement(entity_type: str, entity_id: Optional[int],
+                      since: Optional[datetime], until: Optional[datetime]) -> Select:
+    """Current metrics rows of one entity type (the active version of detail metrics), filtered by owner id and update time"""
+    model, owner_column = metrics_history.METRICS_TABLES[entity_type]
+    stmt = select(*model.__table__.columns).where(metrics_history.current_rows(model.__table__.c)).order_by(model.id)
+    if entity_id is not None:
+        stmt = stmt.where(getattr(model, owner_column) == entity_id)
+    if since is not None:
+        stmt = stmt.where(model.updated_at >= naive_utc(since))
+    if until is not None:
+        stmt = stmt.where(model.updated_at < naive_utc(until))
+    return stmt
+
+def _text_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+def _json_value(value):
+    # NDJSON keeps metrics_data / previous_values as nested objects
+    return value if isinstance(value, (dict, list)) else _text_value(value)
+
+def _csv_chunks(columns: List[str], types: list, batches: Iterable[list]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode()
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_text_value(value) for value in row] for row in batch)
+        yield buffer.getvalue().encode()
+
+def _ndjson_chunks(columns: List[str], types: list, batches: Iterable[list]) -> Iterator[bytes]:
+    for batch in batches:
+        yield "".join(
+            json.dumps({name: _json_value(value) for name, value in zip(columns, row)}) + "\n"
+            for row in batch
+        ).encode()
+
+def _arrow_type(column_type):
+    if isinstance(column_type, Boolean):
+        return pa.bool_()
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, (Numeric, Float)):
+        return pa.float64()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us", tz="UTC")
+    # Strings, and JSON serialized to text
+    return pa.string()
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands out whatever was written since the last drain"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+def _parquet_value(value, column_type):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(column_type, JSON) and value is not None:
+        return json.dumps(value)
+    if isinstance(value, datetime):
+        return as_utc(value)
+    return value
+
+def _parquet_chunks(columns: List[str], types: list, batches: Iterable[list]) -> Iterator[bytes]:
+    schema = pa.schema([(name, _arrow_type(column_type)) for name, column_type in zip(columns, types)])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        # One row group per batch; each is sent as soon as it is written
+        for batch in batches:
+            writer.write_table(pa.Table.from_pylist([
+                {name: _parquet_value(value, column_type) for name, column_type, value in zip(columns, types, row)}
+                for row in batch
+            ], schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+WRITERS = {"csv": _csv_chunks, "ndjson": _ndjson_chunks, "parquet": _parquet_chunks}
+
+def stream_rows(stmt: Select, data_format: str) -> Iterator[bytes]:
+    """Encoded chunks of every row ``stmt`` selects, fetched EXPORT_BATCH_SIZE at a time.
+
+    Runs on its own session, as the response outlives the request's one.
+    ``yield_per`` makes Postgres use a server-side cursor, so memory use
+    does not grow with the number of rows.
+    """
+    columns = [column.name for column in stmt.selected_columns]
+    types = [column.type for column in stmt.selected_columns]
+    db = SessionLocal()
+    try:
+        result = db.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        yield from WRITERS[data_format](columns, types, result.partitions())
+    finally:
+        db.close()
+
+def export_response(stmt: Select, data_format: str, name: str) -> StreamingResponse:
+    if data_format == "parquet" and pa is None:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Parquet export requires pyarrow")
+    return StreamingResponse(
+        stream_rows(stmt, data_format),
+        media_type=MEDIA_TYPES[data_format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{data_format}"'}
+    )
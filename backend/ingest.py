@@ -0,0 +1,254 @@
+import codecs
+import csv
+import os
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Iterable, Iterator, Optional, Set
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+import models
+import schemas
+import metrics_history
+import detail_versions
+import trends
+from timeutil import as_utc, naive_utc
+
+# Rows validated and written per INSERT/commit
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "1000"))
+# Row errors kept for the report; later ones are only counted
+MAX_REPORTED_ERRORS = 100
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """Split a byte stream into text lines without holding more than one line"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        yield from lines
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+async def aiter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """iter_lines for an async byte stream such as ``Request.stream()``"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+class DetailMetricsIngestion:
+    """Streams detail metric snapshots into MetricsHistory in batches.
+
+    Feed it one NDJSON or CSV line at a time and call ``flush`` whenever
+    ``feed`` reports a full batch, then ``finish``. Each valid row becomes a
+    ``sub_pnl_detail`` history entry dated ``recorded_at``, whose previous
+    values are those of the snapshot before it in time, whatever the order of
+    the file. The newest
+    snapshot of each Sub-PnL also becomes its active detail metrics version, unless
+    the Sub-PnL already has newer history. Memory is bounded by the batch
+    size and the number of Sub-PnLs, never by the number of rows.
+    """
+
+    def __init__(self, data_format: str, user_id: Optional[int] = None, batch_size: int = INGEST_BATCH_SIZE):
+        if data_format not in ("ndjson", "csv"):
+            raise ValueError(f"Unsupported format: {data_format}")
+        self.data_format = data_format
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.header = None
+        self.line_number = 0
+        self.batch = []
+        self.counts = {"rows": 0, "written": 0, "failed": 0, "current_updated": 0}
+        self.errors = []
+        # Per Sub-PnL state: parent PnL, newest history before this ingestion, values
+        # before its first history entry, newest snapshot so far (the active detail
+        # version until a row is ingested) and newest ingested snapshot
+        self.pnl_ids: Dict[int, int] = {}
+        self.unknown_sub_pnls: Set[int] = set()
+        self.existing_latest: Dict[int, Optional[datetime]] = {}
+        self.baseline: Dict[int, Optional[dict]] = {}
+        self.previous: Dict[int, dict] = {}
+        self.previous_at: Dict[int, Optional[datetime]] = {}
+        self.latest: Dict[int, tuple] = {}
+        self.updated_pnl_ids: Set[int] = set()
+
+    def _error(self, line_number: int, message: str):
+        self.counts["failed"] += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"line {line_number}: {message}")
+
+    def _parse(self, line: str) -> Optional[dict]:
+        if self.data_format == "ndjson":
+            return schemas.DetailMetricsSnapshotRow.model_validate_json(line).model_dump()
+        values = next(csv.reader([line]))
+        if self.header is None:
+            self.header = [name.strip() for name in values]
+            return None
+        # Empty cells fall back to the field defaults
+        record = {name: value for name, value in zip(self.header, values) if value != ""}
+        return schemas.DetailMetricsSnapshotRow.model_validate(record).model_dump()
+
+    def feed(self, line: str) -> bool:
+        """Validate one line; True once a full batch is waiting to be flushed"""
+        self.line_number += 1
+        line = line.strip()
+        if not line:
+            return False
+        try:
+            row = self._parse(line)
+        except ValidationError as e:
+            self.counts["rows"] += 1
+            self._error(self.line_number, "; ".join(
+                f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}"
+                for error in e.errors()
+            ))
+            return False
+        except csv.Error as e:
+            self.counts["rows"] += 1
+            self._error(self.line_number, str(e))
+            return False
+        if row is None:
+            return False
+        self.counts["rows"] += 1
+        self.batch.append((self.line_number, row))
+        return len(self.batch) >= self.batch_size
+
+    def _load_sub_pnls(self, db: Session, sub_pnl_ids: Set[int]):
+        new_ids = sub_pnl_ids - self.pnl_ids.keys() - self.unknown_sub_pnls
+        if not new_ids:
+            return
+        for sub_pnl_id, pnl_id in db.execute(
+            select(models.SubPnL.id, models.SubPnL.pnl_id).where(models.SubPnL.id.in_(new_ids))
+        ):
+            self.pnl_ids[sub_pnl_id] = pnl_id
+            self.existing_latest[sub_pnl_id] = None
+        self.unknown_sub_pnls |= new_ids - self.pnl_ids.keys()
+
+        history = models.MetricsHistory
+        for sub_pnl_id, created_at in db.execute(
+            select(history.entity_id, func.max(history.created_at))
+            .where(history.entity_type == "sub_pnl_detail", history.entity_id.in_(new_ids))
+            .group_by(history.entity_id)
+        ):
+            self.existing_latest[sub_pnl_id] = as_utc(created_at) if created_at else None
+            self.previous_at[sub_pnl_id] = self.existing_latest[sub_pnl_id]
+
+        # The first ingested row of a Sub-PnL that already has detail metrics is an update of its active version
+        fields = schemas.SubPnLDetailMetricsBase.model_fields
+        for sub_pnl_id, active in detail_versions.active_rows(db, new_ids & self.pnl_ids.keys()).items():
+            self.previous[sub_pnl_id] = {field: getattr(active, field) for field in fields}
+            self.baseline[sub_pnl_id] = metrics_history.convert_decimals_to_float(self.previous[sub_pnl_id])
+
+        # With history, the values before it are those its first entry replaced
+        first = select(
+            history.entity_id, history.metrics_data, history.previous_values, history.change_type,
+            func.row_number().over(partition_by=history.entity_id, order_by=(history.created_at, history.id)).label("position")
+        ).where(history.entity_type == "sub_pnl_detail", history.entity_id.in_(new_ids)).subquery()
+        for row in db.execute(select(first).where(first.c.position == 1)):
+            self.baseline[row.entity_id] = (
+                None if row.change_type == "create" else {**row.metrics_data, **(row.previous_values or {})}
+            )
+
+    def _rechain(self, db: Session, sub_pnl_id: int, since: datetime):
+        """Point the history of a Sub-PnL from ``since`` on at the snapshot before each entry in time"""
+        history = models.MetricsHistory
+        owned = (history.entity_type == "sub_pnl_detail", history.entity_id == sub_pnl_id)
+        previous = db.scalar(
+            select(history.metrics_data).where(*owned, history.created_at < naive_utc(since))
+            .order_by(history.created_at.desc(), history.id.desc()).limit(1)
+        )
+        if previous is None:
+            previous = self.baseline.get(sub_pnl_id)
+
+        updates = []
+        for entry in db.execute(
+            select(history.id, history.metrics_data, history.previous_values, history.change_type)
+            .where(*owned, history.created_at >= naive_utc(since)).order_by(history.created_at, history.id)
+        ):
+            values = {
+                "previous_values": metrics_history.changed_values(entry.metrics_data, previous),
+                "change_type": "create" if previous is None else "update",
+            }
+            if values != {"previous_values": entry.previous_values, "change_type": entry.change_type}:
+                updates.append({"id": entry.id, **values})
+            previous = entry.metrics_data
+        if updates:
+            db.execute(update(history), updates)
+
+    def flush(self, db: Session):
+        """Write the pending batch with one multi-row INSERT and commit it"""
+        if not self.batch:
+            return
+        self._load_sub_pnls(db, {row["sub_pnl_id"] for _, row in self.batch})
+
+        snapshots = []
+        now = datetime.now(timezone.utc)
+        for line_number, row in self.batch:
+            sub_pnl_id = row.pop("sub_pnl_id")
+            recorded_at = as_utc(row.pop("recorded_at") or now)
+            if sub_pnl_id in self.unknown_sub_pnls:
+                self._error(line_number, f"sub_pnl_id: Sub PnL {sub_pnl_id} not found")
+                continue
+            snapshots.append((sub_pnl_id, recorded_at, row))
+        # Snapshots chain in time order; equal timestamps keep file order
+        snapshots.sort(key=lambda snapshot: snapshot[:2])
+
+        history_rows, rechain = [], {}
+        for sub_pnl_id, recorded_at, row in snapshots:
+            previous_at = self.previous_at.get(sub_pnl_id)
+            if previous_at is not None and recorded_at < previous_at:
+                # Older than history already written: chained once the batch is inserted
+                rechain[sub_pnl_id] = min(recorded_at, rechain.get(sub_pnl_id, recorded_at))
+                previous_values = None
+            else:
+                previous_values = self.previous.get(sub_pnl_id)
+                self.previous[sub_pnl_id], self.previous_at[sub_pnl_id] = row, recorded_at
+            history_rows.append({
+                **metrics_history.history_values(
+                    "sub_pnl_detail", sub_pnl_id, row, "create" if previous_values is None else "update",
+                    self.user_id, "Ingested detailed metrics snapshot", previous_values
+                ),
+                "created_at": recorded_at,
+            })
+
+        if history_rows:
+            history_ids = db.scalars(
+                insert(models.MetricsHistory).returning(models.MetricsHistory.id, sort_by_parameter_order=True),
+                history_rows
+            ).all()
+            for (sub_pnl_id, recorded_at, row), history_id in zip(snapshots, history_ids):
+                latest = self.latest.get(sub_pnl_id)
+                if latest is None or recorded_at >= latest[0]:
+                    self.latest[sub_pnl_id] = (recorded_at, row, history_id)
+            for sub_pnl_id, since in rechain.items():
+                self._rechain(db, sub_pnl_id, since)
+            trends.record(db, history_rows)
+        db.commit()
+        self.counts["written"] += len(history_rows)
+        self.batch = []
+
+    def finish(self, db: Session) -> dict:
+        """Flush the last batch, bring current detail metrics up to date and report"""
+        self.flush(db)
+
+        current = {
+            sub_pnl_id: {**values, "current_history_id": history_id}
+            for sub_pnl_id, (recorded_at, values, history_id) in self.latest.items()
+            if self.existing_latest.get(sub_pnl_id) is None or recorded_at >= self.existing_latest[sub_pnl_id]
+        }
+        detail_versions.append_versions(db, current)
+        db.commit()
+
+        self.counts["current_updated"] = len(current)
+        self.updated_pnl_ids = {self.pnl_ids[sub_pnl_id] for sub_pnl_id in current}
+        return {**self.counts, "errors": self.errors}
+
+    def progress(self) -> str:
+        return f"{self.counts['rows']} row(s) read, {self.counts['written']} written, {self.counts['failed']} failed"
\ No newline at end of file
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Detail metrics ingestion command for QAlytics
+Streams an NDJSON or CSV file of historical Sub-PnL detail metric
+snapshots into the metrics history in batches, reporting progress
+"""
+
+import sys
+import os
+import argparse
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import SessionLocal
+import ingest
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest Sub-PnL detail metric snapshots")
+    parser.add_argument("path", help="NDJSON or CSV file, - for stdin")
+    parser.add_argument("--format", choices=["ndjson", "csv"],
+                        help="file format (default: from the file extension, NDJSON otherwise)")
+    parser.add_argument("--batch-size", type=int, default=ingest.INGEST_BATCH_SIZE)
+    args = parser.parse_args()
+
+    data_format = args.format or ("csv" if args.path.lower().endswith(".csv") else "ndjson")
+    ingestion = ingest.DetailMetricsIngestion(data_format, batch_size=args.batch_size)
+
+    source = sys.stdin.buffer if args.path == "-" else open(args.path, "rb")
+    db = SessionLocal()
+    try:
+        # Read in fixed-size chunks so long lines cannot blow up memory use either
+        for line in ingest.iter_lines(iter(lambda: source.read(64 * 1024), b"")):
+            if ingestion.feed(line):
+                ingestion.flush(db)
+                print(f"📥 {ingestion.progress()}", flush=True)
+        result = ingestion.finish(db)
+    except Exception as e:
+        print(f"❌ Ingestion failed after {ingestion.progress()}: {str(e)}")
+        db.rollback()
+        sys.exit(1)
+    finally:
+        db.close()
+        if source is not sys.stdin.buffer:
+            source.close()
+
+    for error in result["errors"]:
+        print(f"⚠️  {error}")
+    if result["failed"] > len(result["errors"]):
+        print(f"⚠️  ... and {result['failed'] - len(result['errors'])} more error(s)")
+    print(f"✅ Ingested {result['written']} snapshot(s) of {result['rows']} row(s), "
+          f"{result['current_updated']} Sub-PnL(s) brought up to date")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
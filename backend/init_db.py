@@ -12,6 +12,7 @@ from sqlalchemy.orm import Session
 from database import engine, get_db
 import models
 import schemas
+import derived
 from security import hash_password
 from datetime import datetime
 import json
@@ -94,10 +95,7 @@ def create_sample_data():
                 sanity_time_avg_hours=2.5,
                 api_test_time_avg_hours=1.5,
                 automation_coverage_percent=75.0,
-                escaped_bugs=2,
-                test_coverage_percent=85.0,
-                testcases_per_bug=20.0,
-                bugs_per_100_tests=5.0
+                escaped_bugs=2
             )
             db.add(pnl_metrics)
             
@@ -121,10 +119,7 @@ def create_sample_data():
                     regression_bugs_found=2 + i,
                     sanity_time_avg_hours=2.0 + i * 0.5,
                     automation_coverage_percent=60.0 + i * 10,
-                    escaped_bugs=1 + i,
-                    test_coverage_percent=70.0 + i * 5,
-                    testcases_per_bug=12.5 + i * 2.5,
-                    bugs_per_100_tests=8.0 - i
+                    escaped_bugs=1 + i
                 )
                 db.add(sub_pnl_metrics)
                 
@@ -140,14 +135,14 @@ def create_sample_data():
                     api_test_time_avg_hours=1.0 + i * 0.2,
                     automation_coverage_percent=70.0 if sub_pnl_data["name"] == "Logistics" else 50.0 + i * 15,
                     escaped_bugs=2 if sub_pnl_data["name"] == "Logistics" else 1 + i,
-                    test_coverage_percent=80.0 + i * 3,
-                    testcases_per_bug=15.0 + i * 2,
-                    bugs_per_100_tests=6.0 - i * 0.5,
                     version=1,
                     is_active=True
                 )
                 db.add(sub_pnl_detail_metrics)
         
+        # Derived metrics are calculated, not seeded
+        db.flush()
+        derived.recompute_all(db)
         db.commit()
         print("✅ Sample PnLs, Sub-PnLs, and metrics created successfully!")
         print(f"   - Created {len(pnls_data)} PnLs")
@@ -0,0 +1,162 @@
+from collections import defaultdict
+from typing import Iterable, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import bindparam, select, true, tuple_, update
+from sqlalchemy.orm import Session
+import models
+import aggregation
+import defaults
+import derived
+import detail_versions
+import rollups
+import trends
+
+# Metric fields that can appear in a history snapshot
+METRIC_FIELDS = models.HISTORY_METRIC_FIELDS
+
+# Metrics table and its owner column per history entity type
+METRICS_TABLES = {
+    "pnl": (models.PnLMetrics, "pnl_id"),
+    "sub_pnl": (models.SubPnLMetrics, "sub_pnl_id"),
+    "sub_pnl_detail": (models.SubPnLDetailMetrics, "sub_pnl_id"),
+}
+# History entries that can be deleted, restoring the entry before them
+RESTORABLE_TYPES = ("sub_pnl", "sub_pnl_detail")
+
+def current_rows(columns):
+    """Condition for the rows holding current metrics: the active one where a table keeps versions"""
+    return columns.is_active if "is_active" in columns else true()
+
+def convert_decimals_to_float(data):
+    """Convert Decimal values to float for JSON serialization"""
+    if isinstance(data, dict):
+        return {key: convert_decimals_to_float(value) for key, value in data.items()}
+    elif isinstance(data, list):
+        return [convert_decimals_to_float(item) for item in data]
+    elif hasattr(data, '__float__'):  # This includes Decimal
+        return float(data)
+    else:
+        return data
+
+def history_values(entity_type: str, entity_id: int, metrics_data: dict,
+                   change_type: str = "update", user_id: int = None,
+                   description: str = None, previous_values: dict = None) -> dict:
+    """Column values of a MetricsHistory row, ready for the JSON columns"""
+    metrics_data = convert_decimals_to_float(metrics_data)
+    previous_values = convert_decimals_to_float(previous_values) if previous_values else None
+    return {
+        "entity_type": entity_type,
+        "entity_id": entity_id,
+        "metrics_data": metrics_data,
+        "change_type": change_type,
+        "changed_by": user_id,
+        "change_description": description,
+        "previous_values": changed_values(metrics_data, previous_values),
+    }
+
+def changed_values(metrics_data: dict, previous_values: Optional[dict]) -> Optional[dict]:
+    """Previous values of only the fields whose value differs in metrics_data"""
+    if not previous_values:
+        return None
+    changed = {
+        key: value for key, value in previous_values.items()
+        if metrics_data.get(key) != value
+    }
+    return changed or None
+
+def changed_field_filter(dialect_name: str, field: str):
+    """Filter for history rows where ``field`` changed, evaluated in the database.
+
+    ``previous_values`` only holds changed fields, so this is a key-existence
+    test: ``?`` on Postgres (served by the GIN index on previous_values),
+    JSON1 ``json_type`` on SQLite (served by that field's partial index).
+    """
+    if field not in METRIC_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Unknown metric field: {field}")
+
+    previous_values = models.MetricsHistory.previous_values
+    if dialect_name == "postgresql":
+        return previous_values.has_key(field)
+    return models.json_field_type(previous_values, field).isnot(None)
+
+def set_current_versions(db: Session, versions: Iterable[Tuple[str, int, int]]):
+    """Point the metrics rows of ``(entity_type, entity_id, history_id)`` at their history entries"""
+    by_entity_type = defaultdict(list)
+    for entity_type, entity_id, history_id in versions:
+        by_entity_type[entity_type].append({"owner_id": entity_id, "history_id": history_id})
+    for entity_type, params in by_entity_type.items():
+        model, owner_column = METRICS_TABLES[entity_type]
+        table = model.__table__
+        db.execute(
+            update(table).where(table.c[owner_column] == bindparam("owner_id"), current_rows(table.c))
+            .values(current_history_id=bindparam("history_id")),
+            params
+        )
+
+def restore_values(model, metrics_data: Optional[dict]) -> dict:
+    """Metric column values of a history snapshot, defaults for the fields it lacks.
+
+    Derived metrics are calculated again rather than taken from the snapshot.
+    """
+    column_defaults = defaults.column_defaults(model)
+    return derived.with_derived({
+        field: (metrics_data or {}).get(field, column_defaults.get(field))
+        for field in METRIC_FIELDS if field in model.__table__.columns
+    })
+
+def delete_entry(db: Session, entry: models.MetricsHistory) -> bool:
+    """Delete a Sub-PnL history entry; if it is the current version, restore the one before it.
+
+    Metrics rows point at the history entry they were written with, so
+    "is this the latest?" is a single-row check, and the previous version is
+    one seek on the (entity_type, entity_id, created_at, id) index. The
+    restore is a single UPDATE (a new version for detail metrics), the PnL rollup gets the difference, and the
+    caller commits it all in one transaction. Returns whether metrics were
+    restored.
+    """
+    if entry.entity_type not in RESTORABLE_TYPES:
+        raise ValueError(f"{entry.entity_type} history entries cannot be deleted")
+    restored = False
+    model, owner_column = METRICS_TABLES[entry.entity_type]
+    current = db.scalar(select(model).where(
+        getattr(model, owner_column) == entry.entity_id,
+        model.current_history_id == entry.id,
+        current_rows(model.__table__.c)
+    ))
+    if current is not None:
+        history = models.MetricsHistory
+        # Compare against the stored timestamp: SQLite keeps timestamps as text
+        entry_created_at = select(history.created_at).where(history.id == entry.id).scalar_subquery()
+        previous = db.scalar(select(history).where(
+            history.entity_type == entry.entity_type,
+            history.entity_id == entry.entity_id,
+            tuple_(history.created_at, history.id) < tuple_(entry_created_at, entry.id)
+        ).order_by(history.created_at.desc(), history.id.desc()).limit(1))
+
+        values = restore_values(model, previous.metrics_data if previous else None)
+        if entry.entity_type == "sub_pnl":
+            pnl_id = db.scalar(select(models.SubPnL.pnl_id).where(models.SubPnL.id == entry.entity_id))
+            # Build a missing rollup before the Sub-PnL metrics change
+            rollups.get_or_build_rollup(db, pnl_id)
+            previous_values = {field: getattr(current, field) for field in aggregation.ROLLUP_FIELDS}
+
+        current_history_id = previous.id if previous else None
+        if entry.entity_type == "sub_pnl_detail":
+            # Detail metrics are versioned: the restored values become a new version
+            detail_versions.append_versions(db, {entry.entity_id: {**values, "current_history_id": current_history_id}})
+        else:
+            db.execute(
+                update(model).where(model.id == current.id)
+                .values(**values, current_history_id=current_history_id)
+                .execution_options(synchronize_session=False)
+            )
+        if entry.entity_type == "sub_pnl":
+            rollups.apply_sub_pnl_change(
+                db, pnl_id, previous_values, {field: values[field] for field in aggregation.ROLLUP_FIELDS}
+            )
+        restored = True
+
+    db.delete(entry)
+    db.flush()
+    trends.rebuild_buckets(db, entry.entity_type, entry.entity_id, entry.created_at)
+    return restored
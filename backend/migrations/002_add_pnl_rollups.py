@@ -0,0 +1,88 @@
+"""
+Add PnL rollups table migration
+Plain SQL over the tables as they are at this point of the chain: later
+columns of the live models (e.g. current_history_id, migration 007) do
+not exist yet
+"""
+
+from sqlalchemy import (
+    Column, DateTime, DECIMAL, ForeignKey, Integer, MetaData, Table, func, text
+)
+
+# pnl_rollups as this migration creates it
+metadata = MetaData()
+Table(
+    "pnls", metadata,
+    Column("id", Integer, primary_key=True),
+)
+pnl_rollups = Table(
+    "pnl_rollups", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("pnl_id", Integer, ForeignKey("pnls.id", ondelete="CASCADE"), nullable=False, unique=True),
+    Column("features_shipped", Integer, default=0),
+    Column("total_testcases_executed", Integer, default=0),
+    Column("total_bugs_logged", Integer, default=0),
+    Column("regression_bugs_found", Integer, default=0),
+    Column("escaped_bugs", Integer, default=0),
+    Column("sanity_time_hours_sum", DECIMAL(12, 2), default=0.0),
+    Column("automation_coverage_percent_sum", DECIMAL(12, 2), default=0.0),
+    Column("metrics_count", Integer, default=0),
+    Column("updated_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+# Summed Sub-PnL metrics, and the averaged ones with their rollup sum column
+SUM_FIELDS = ("features_shipped", "total_testcases_executed", "total_bugs_logged", "regression_bugs_found", "escaped_bugs")
+AVERAGE_FIELDS = (
+    ("sanity_time_avg_hours", "sanity_time_hours_sum"),
+    ("automation_coverage_percent", "automation_coverage_percent_sum"),
+)
+
+def upgrade(engine):
+    """Create PnL rollups table, backfill it from Sub-PnL metrics and sync PnL metrics"""
+    pnl_rollups.create(bind=engine, checkfirst=True)
+    sums = ", ".join(f"COALESCE(SUM(m.{field}), 0)" for field in SUM_FIELDS)
+    average_sums = ", ".join(f"COALESCE(SUM(m.{field}), 0)" for field, _ in AVERAGE_FIELDS)
+    average_columns = ", ".join(column for _, column in AVERAGE_FIELDS)
+    with engine.connect() as conn:
+        # Only the first metrics row of each Sub-PnL counts, as in aggregation.aggregate_sub_pnl_totals
+        conn.execute(text(f"""
+            INSERT INTO pnl_rollups (pnl_id, {", ".join(SUM_FIELDS)}, {average_columns}, metrics_count, updated_at)
+            SELECT p.id, {sums}, {average_sums}, COUNT(m.id), CURRENT_TIMESTAMP
+            FROM pnls p
+            LEFT JOIN sub_pnls s ON s.pnl_id = p.id
+            LEFT JOIN sub_pnl_metrics m ON m.sub_pnl_id = s.id
+                AND m.id IN (SELECT MIN(id) FROM sub_pnl_metrics GROUP BY sub_pnl_id)
+            WHERE NOT EXISTS (SELECT 1 FROM pnl_rollups r WHERE r.pnl_id = p.id)
+            GROUP BY p.id
+        """))
+
+        # PnL metrics hold the rolled-up values: sums as they are, averages over the Sub-PnLs with metrics
+        values = [f"r.{field}" for field in SUM_FIELDS] + [
+            f"ROUND(r.{column} * 1.0 / CASE WHEN r.metrics_count > 0 THEN r.metrics_count ELSE 1 END, 2)"
+            for _, column in AVERAGE_FIELDS
+        ]
+        fields = list(SUM_FIELDS) + [field for field, _ in AVERAGE_FIELDS]
+        conn.execute(text(f"""
+            UPDATE pnl_metrics SET {", ".join(
+                f"{field} = (SELECT {value} FROM pnl_rollups r WHERE r.pnl_id = pnl_metrics.pnl_id)"
+                for field, value in zip(fields, values)
+            )}
+            WHERE EXISTS (SELECT 1 FROM pnl_rollups r WHERE r.pnl_id = pnl_metrics.pnl_id)
+        """))
+        conn.execute(text(f"""
+            INSERT INTO pnl_metrics (pnl_id, {", ".join(fields)}, testcase_peer_review, api_test_time_avg_hours,
+                                     test_coverage_percent, testcases_per_bug, bugs_per_100_tests, updated_at)
+            SELECT r.pnl_id, {", ".join(values)}, 0, 0, 0, 0, 0, CURRENT_TIMESTAMP
+            FROM pnl_rollups r
+            WHERE NOT EXISTS (SELECT 1 FROM pnl_metrics pm WHERE pm.pnl_id = r.pnl_id)
+        """))
+        conn.commit()
+
+def downgrade(engine):
+    """Drop PnL rollups table"""
+    pnl_rollups.drop(bind=engine, checkfirst=True)
+
+if __name__ == "__main__":
+    from database import engine
+    upgrade(engine)
+    print("PnL rollups table created successfully!")
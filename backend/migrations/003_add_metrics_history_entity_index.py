@@ -0,0 +1,26 @@
+"""
+Add composite metrics history index migration
+Backs keyset pagination of /metrics-history and /sub-pnls/{id}/metrics-history
+"""
+
+from sqlalchemy import text
+
+def upgrade(engine):
+    """Create (entity_type, entity_id, created_at DESC, id DESC) index on metrics history"""
+    with engine.connect() as conn:
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_metrics_history_entity_created
+            ON metrics_history (entity_type, entity_id, created_at DESC, id DESC)
+        """))
+        conn.commit()
+
+def downgrade(engine):
+    """Drop the composite metrics history index"""
+    with engine.connect() as conn:
+        conn.execute(text("DROP INDEX IF EXISTS ix_metrics_history_entity_created"))
+        conn.commit()
+
+if __name__ == "__main__":
+    from database import engine
+    upgrade(engine)
+    print("Metrics history index created successfully!")
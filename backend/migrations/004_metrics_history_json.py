@@ -0,0 +1,77 @@
+"""
+Store metrics history snapshots as native JSON migration
+Text-encoded json.dumps columns become JSONB on PostgreSQL; SQLite keeps
+its JSON1-compatible text storage. previous_values is trimmed to the
+changed fields only, which the "changed field" indexes rely on: a GIN
+index on Postgres, one partial index per metric on SQLite.
+"""
+
+import json
+from sqlalchemy import text
+
+# Metric fields that can appear in a history snapshot, one SQLite index each
+METRIC_FIELDS = (
+    "features_shipped", "total_testcases_executed", "total_bugs_logged", "testcase_peer_review",
+    "regression_bugs_found", "sanity_time_avg_hours", "api_test_time_avg_hours",
+    "automation_coverage_percent", "escaped_bugs", "test_coverage_percent",
+    "testcases_per_bug", "bugs_per_100_tests",
+)
+
+def _load(value):
+    if value is None or isinstance(value, dict):
+        return value
+    return json.loads(value)
+
+def upgrade(engine):
+    """Convert metrics_data/previous_values to JSON and trim unchanged previous values"""
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            conn.execute(text("""
+                ALTER TABLE metrics_history
+                ALTER COLUMN metrics_data TYPE JSONB USING metrics_data::jsonb,
+                ALTER COLUMN previous_values TYPE JSONB USING previous_values::jsonb
+            """))
+
+        rows = conn.execute(text("SELECT id, metrics_data, previous_values FROM metrics_history WHERE previous_values IS NOT NULL"))
+        for row_id, metrics_data, previous_values in rows.fetchall():
+            metrics_data, previous_values = _load(metrics_data), _load(previous_values)
+            changed = {key: value for key, value in previous_values.items() if metrics_data.get(key) != value}
+            conn.execute(
+                text("UPDATE metrics_history SET previous_values = :previous_values WHERE id = :id"),
+                {"previous_values": json.dumps(changed) if changed else None, "id": row_id}
+            )
+
+        if engine.dialect.name == "postgresql":
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_metrics_history_previous_values
+                ON metrics_history USING gin (previous_values)
+            """))
+        else:
+            # json_type(...) IS NOT NULL is the exact term the changed-field filter uses
+            for field in METRIC_FIELDS:
+                conn.execute(text(f"""
+                    CREATE INDEX IF NOT EXISTS ix_metrics_history_changed_{field}
+                    ON metrics_history (created_at DESC, id DESC)
+                    WHERE json_type(previous_values, '$.{field}') IS NOT NULL
+                """))
+        conn.commit()
+
+def downgrade(engine):
+    """Convert metrics_data/previous_values back to text (trimmed previous values are kept)"""
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            conn.execute(text("DROP INDEX IF EXISTS ix_metrics_history_previous_values"))
+            conn.execute(text("""
+                ALTER TABLE metrics_history
+                ALTER COLUMN metrics_data TYPE TEXT USING metrics_data::text,
+                ALTER COLUMN previous_values TYPE TEXT USING previous_values::text
+            """))
+        else:
+            for field in METRIC_FIELDS:
+                conn.execute(text(f"DROP INDEX IF EXISTS ix_metrics_history_changed_{field}"))
+        conn.commit()
+
+if __name__ == "__main__":
+    from database import engine
+    upgrade(engine)
+    print("Metrics history JSON columns migrated successfully!")
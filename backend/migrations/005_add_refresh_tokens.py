@@ -0,0 +1,36 @@
+"""
+Add refresh tokens table migration
+"""
+
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, MetaData, String, Table, func
+
+# refresh_tokens as this migration creates it
+metadata = MetaData()
+Table(
+    "users", metadata,
+    Column("id", Integer, primary_key=True),
+)
+refresh_tokens = Table(
+    "refresh_tokens", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True),
+    Column("token_hash", String(64), unique=True, nullable=False),
+    Column("family_id", String(32), nullable=False, index=True),
+    Column("expires_at", DateTime(timezone=True), nullable=False),
+    Column("used_at", DateTime(timezone=True), nullable=True),
+    Column("revoked_at", DateTime(timezone=True), nullable=True),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+def upgrade(engine):
+    """Create refresh tokens table"""
+    refresh_tokens.create(bind=engine, checkfirst=True)
+
+def downgrade(engine):
+    """Drop refresh tokens table"""
+    refresh_tokens.drop(bind=engine, checkfirst=True)
+
+if __name__ == "__main__":
+    from database import engine
+    upgrade(engine)
+    print("Refresh tokens table created successfully!")
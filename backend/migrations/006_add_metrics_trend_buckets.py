@@ -0,0 +1,53 @@
+"""
+Add metrics trend buckets table migration
+Both tables are defined as they are at this point of the chain, not taken
+from the live models
+"""
+
+from sqlalchemy import Column, DateTime, Float, Index, Integer, JSON, MetaData, String, Table
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Session
+import trends
+
+metadata = MetaData()
+# metrics_history as migration 004 leaves it; only the columns the backfill reads
+metrics_history = Table(
+    "metrics_history", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("entity_type", String(50), nullable=False),
+    Column("entity_id", Integer, nullable=False),
+    Column("metrics_data", JSON().with_variant(JSONB(), "postgresql"), nullable=False),
+    Column("created_at", DateTime(timezone=True)),
+)
+# metrics_trend_buckets as this migration creates it
+metrics_trend_buckets = Table(
+    "metrics_trend_buckets", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("entity_type", String(50), nullable=False),
+    Column("entity_id", Integer, nullable=False),
+    Column("bucket", String(10), nullable=False),
+    Column("bucket_start", DateTime(timezone=True), nullable=False),
+    Column("metric", String(50), nullable=False),
+    Column("last_value", Float, nullable=False),
+    Column("last_at", DateTime(timezone=True), nullable=False),
+    Column("min_value", Float, nullable=False),
+    Column("max_value", Float, nullable=False),
+    Column("sum_value", Float, nullable=False),
+    Column("sample_count", Integer, nullable=False),
+    Index("ix_metrics_trend_buckets_key", "entity_type", "entity_id", "bucket", "metric", "bucket_start", unique=True),
+)
+
+def upgrade(engine):
+    """Create metrics trend buckets table and backfill it from metrics history"""
+    metrics_trend_buckets.create(bind=engine, checkfirst=True)
+    with Session(bind=engine) as db:
+        trends.rebuild(db, metrics_history, metrics_trend_buckets)
+
+def downgrade(engine):
+    """Drop metrics trend buckets table"""
+    metrics_trend_buckets.drop(bind=engine, checkfirst=True)
+
+if __name__ == "__main__":
+    from database import engine
+    upgrade(engine)
+    print("Metrics trend buckets table created successfully!")
@@ -0,0 +1,43 @@
+"""
+Add current metrics history pointers migration
+Every metrics row points at the history entry holding its values, so
+deleting history can tell in O(1) whether it has to restore
+"""
+
+from sqlalchemy import text
+
+# Metrics table, its owner column and history entity type
+TABLES = (
+    ("pnl_metrics", "pnl_id", "pnl"),
+    ("sub_pnl_metrics", "sub_pnl_id", "sub_pnl"),
+    ("sub_pnl_detail_metrics", "sub_pnl_id", "sub_pnl_detail"),
+)
+
+def upgrade(engine):
+    """Add current_history_id to the metrics tables, pointing at each entity's newest history entry"""
+    with engine.connect() as conn:
+        for table, owner_column, entity_type in TABLES:
+            columns = [column["name"] for column in engine.dialect.get_columns(conn, table)]
+            if "current_history_id" not in columns:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN current_history_id INTEGER"))
+            conn.execute(text(f"""
+                UPDATE {table} SET current_history_id = (
+                    SELECT h.id FROM metrics_history h
+                    WHERE h.entity_type = :entity_type AND h.entity_id = {table}.{owner_column}
+                    ORDER BY h.created_at DESC, h.id DESC
+                    LIMIT 1
+                )
+            """), {"entity_type": entity_type})
+        conn.commit()
+
+def downgrade(engine):
+    """Drop current_history_id from the metrics tables"""
+    with engine.connect() as conn:
+        for table, _, _ in TABLES:
+            conn.execute(text(f"ALTER TABLE {table} DROP COLUMN current_history_id"))
+        conn.commit()
+
+if __name__ == "__main__":
+    from database import engine
+    upgrade(engine)
+    print("Current metrics history pointers added successfully!")
@@ -0,0 +1,51 @@
+"""
+Version Sub-PnL detail metrics migration
+Detail metrics rows become append-only versions: numbers them per Sub-PnL,
+keeps only the row that was being read active, and adds the partial
+unique index allowing one active row per Sub-PnL
+"""
+
+from sqlalchemy import text
+
+def upgrade(engine):
+    """Renumber existing detail metrics rows as versions and add the version indexes"""
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT id, sub_pnl_id FROM sub_pnl_detail_metrics ORDER BY sub_pnl_id, id"
+        )).all()
+        # Reads used the first row of each Sub-PnL: it stays active as the newest version,
+        # any later duplicates become the older, inactive ones
+        by_sub_pnl = {}
+        for row_id, sub_pnl_id in rows:
+            by_sub_pnl.setdefault(sub_pnl_id, []).append(row_id)
+        params = []
+        for row_ids in by_sub_pnl.values():
+            active_id, *duplicates = row_ids
+            params += [{"id": row_id, "version": version, "is_active": False} for version, row_id in enumerate(duplicates, 1)]
+            params.append({"id": active_id, "version": len(row_ids), "is_active": True})
+        if params:
+            conn.execute(text(
+                "UPDATE sub_pnl_detail_metrics SET version = :version, is_active = :is_active WHERE id = :id"
+            ), params)
+
+        conn.execute(text("""
+            CREATE UNIQUE INDEX IF NOT EXISTS uq_sub_pnl_detail_metrics_active
+            ON sub_pnl_detail_metrics (sub_pnl_id) WHERE is_active
+        """))
+        conn.execute(text("""
+            CREATE UNIQUE INDEX IF NOT EXISTS uq_sub_pnl_detail_metrics_version
+            ON sub_pnl_detail_metrics (sub_pnl_id, version)
+        """))
+        conn.commit()
+
+def downgrade(engine):
+    """Drop the version indexes; rows keep their version numbers"""
+    with engine.connect() as conn:
+        conn.execute(text("DROP INDEX IF EXISTS uq_sub_pnl_detail_metrics_version"))
+        conn.execute(text("DROP INDEX IF EXISTS uq_sub_pnl_detail_metrics_active"))
+        conn.commit()
+
+if __name__ == "__main__":
+    from database import engine
+    upgrade(engine)
+    print("Sub-PnL detail metrics versioning added successfully!")
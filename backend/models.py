@@ -1,11 +1,15 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, DECIMAL, ForeignKey
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, DECIMAL, Float, ForeignKey, Index, JSON
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func, literal_column
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from database import Base
 
+# The live schema, after every migration: migrations define the tables they
+# touch as they are at their point of the chain instead of importing these
+
 # Ensure proper imports for relationships
-__all__ = ['User', 'PnL', 'PnLMetrics', 'SubPnL', 'SubPnLMetrics', 'SubPnLDetailMetrics', 'MetricsHistory']
+__all__ = ['User', 'PnL', 'PnLMetrics', 'PnLRollup', 'SubPnL', 'SubPnLMetrics', 'SubPnLDetailMetrics', 'MetricsHistory', 'MetricsTrendBucket', 'RefreshToken']
 
 class User(Base):
     __tablename__ = "users"
@@ -50,11 +54,33 @@ class PnLMetrics(Base):
     testcases_per_bug = Column(DECIMAL(5,2), default=0.0)
     bugs_per_100_tests = Column(DECIMAL(5,2), default=0.0)
     
+    # History entry these values were written with; restored from when it is deleted
+    current_history_id = Column(Integer, nullable=True)
+    
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relationships
     pnl = relationship("PnL", back_populates="pnl_metrics")
 
+# Running Sub-PnL totals per PnL, maintained incrementally on Sub-PnL metric writes
+class PnLRollup(Base):
+    __tablename__ = "pnl_rollups"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    pnl_id = Column(Integer, ForeignKey("pnls.id", ondelete="CASCADE"), nullable=False, unique=True)
+    features_shipped = Column(Integer, default=0)
+    total_testcases_executed = Column(Integer, default=0)
+    total_bugs_logged = Column(Integer, default=0)
+    regression_bugs_found = Column(Integer, default=0)
+    escaped_bugs = Column(Integer, default=0)
+    
+    # Running sums and count behind the averaged PnL metrics
+    sanity_time_hours_sum = Column(DECIMAL(12,2), default=0.0)
+    automation_coverage_percent_sum = Column(DECIMAL(12,2), default=0.0)
+    metrics_count = Column(Integer, default=0)
+    
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 class SubPnL(Base):
     __tablename__ = "sub_pnls"
     
@@ -69,6 +95,11 @@ class SubPnL(Base):
     pnl = relationship("PnL", back_populates="sub_pnls")
     sub_pnl_metrics = relationship("SubPnLMetrics", back_populates="sub_pnl", cascade="all, delete-orphan")
     sub_pnl_detail_metrics = relationship("SubPnLDetailMetrics", back_populates="sub_pnl", cascade="all, delete-orphan")
+    # The active version of the detail metrics
+    active_detail_metrics = relationship(
+        "SubPnLDetailMetrics", uselist=False, viewonly=True,
+        primaryjoin="and_(SubPnL.id == SubPnLDetailMetrics.sub_pnl_id, SubPnLDetailMetrics.is_active)"
+    )
 
 
 # Sub-PnL level metrics (Sub-PnL page level)
@@ -87,6 +118,9 @@ class SubPnLMetrics(Base):
     test_coverage_percent = Column(DECIMAL(5,2), default=0.0)
     testcases_per_bug = Column(DECIMAL(5,2), default=0.0)
     bugs_per_100_tests = Column(DECIMAL(5,2), default=0.0)
+    # History entry these values were written with; restored from when it is deleted
+    current_history_id = Column(Integer, nullable=True)
+    
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relationships
@@ -117,12 +151,51 @@ class SubPnLDetailMetrics(Base):
     version = Column(Integer, default=1)
     description = Column(String(500), nullable=True)
     is_active = Column(Boolean, default=True)
+    # History entry these values were written with; restored from when it is deleted
+    current_history_id = Column(Integer, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relationships
     sub_pnl = relationship("SubPnL", back_populates="sub_pnl_detail_metrics")
 
+    __table_args__ = (
+        # Rows are append-only versions; exactly one of them per Sub-PnL is active
+        Index("uq_sub_pnl_detail_metrics_active", sub_pnl_id, unique=True,
+              postgresql_where=is_active, sqlite_where=is_active),
+        # Serves the next version number and keyset pages of the version list
+        Index("uq_sub_pnl_detail_metrics_version", sub_pnl_id, version, unique=True),
+    )
+
+# Metric fields that can appear in a history snapshot
+HISTORY_METRIC_FIELDS = (
+    "features_shipped",
+    "total_testcases_executed",
+    "total_bugs_logged",
+    "testcase_peer_review",
+    "regression_bugs_found",
+    "sanity_time_avg_hours",
+    "api_test_time_avg_hours",
+    "automation_coverage_percent",
+    "escaped_bugs",
+    "test_coverage_percent",
+    "testcases_per_bug",
+    "bugs_per_100_tests",
+)
+
+def json_field_type(column, field: str):
+    """SQLite ``json_type(column, '$.field')``; the path is inlined so it can match an index"""
+    return func.json_type(column, literal_column(f"'$.{field}'"))
+
+def _changed_field_indexes(previous_values, created_at, id) -> list:
+    return [
+        Index(
+            f"ix_metrics_history_changed_{field}", created_at.desc(), id.desc(),
+            sqlite_where=json_field_type(previous_values, field).isnot(None)
+        ).ddl_if(dialect="sqlite")
+        for field in HISTORY_METRIC_FIELDS
+    ]
+
 # Metrics History Table - tracks historical changes to all metrics
 class MetricsHistory(Base):
     __tablename__ = "metrics_history"
@@ -134,7 +207,7 @@ class MetricsHistory(Base):
     entity_id = Column(Integer, nullable=False)  # References the specific entity
     
     # Snapshot of metrics at time of change
-    metrics_data = Column(Text, nullable=False)  # JSON string of all metrics
+    metrics_data = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=False)  # All metrics
     
     # Change tracking
     change_type = Column(String(20), nullable=False)  # 'create', 'update', 'delete'
@@ -142,10 +215,58 @@ class MetricsHistory(Base):
     change_description = Column(String(500), nullable=True)
     
     # Previous values for comparison
-    previous_values = Column(Text, nullable=True)  # JSON string of changed fields only
+    previous_values = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True)  # Changed fields only
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
-    user = relationship("User")
\ No newline at end of file
+    user = relationship("User")
+    
+    # Backs keyset pagination of an entity's history, newest first
+    __table_args__ = (
+        Index("ix_metrics_history_entity_created", entity_type, entity_id, created_at.desc(), id.desc()),
+        # Answers "history where <metric> changed" (previous_values ? 'metric') on Postgres
+        Index("ix_metrics_history_previous_values", previous_values, postgresql_using="gin").ddl_if(dialect="postgresql"),
+        # The same on SQLite: one partial index per metric, in keyset order
+        *_changed_field_indexes(previous_values, created_at, id),
+    )
+
+# Per-metric day/week/month statistics of metrics history, maintained as history is written
+class MetricsTrendBucket(Base):
+    __tablename__ = "metrics_trend_buckets"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    entity_type = Column(String(50), nullable=False)  # Same as MetricsHistory.entity_type
+    entity_id = Column(Integer, nullable=False)
+    bucket = Column(String(10), nullable=False)  # 'day', 'week', 'month'
+    bucket_start = Column(DateTime(timezone=True), nullable=False)  # UTC; weeks start on Monday
+    metric = Column(String(50), nullable=False)
+    
+    last_value = Column(Float, nullable=False)
+    last_at = Column(DateTime(timezone=True), nullable=False)  # When last_value was recorded
+    min_value = Column(Float, nullable=False)
+    max_value = Column(Float, nullable=False)
+    sum_value = Column(Float, nullable=False)  # avg = sum_value / sample_count
+    sample_count = Column(Integer, nullable=False)
+    
+    # Upsert target, and range scans of one entity's series in bucket_start order
+    __table_args__ = (
+        Index("ix_metrics_trend_buckets_key", entity_type, entity_id, bucket, metric, bucket_start, unique=True),
+    )
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    
+    # HMAC of the opaque token; the token itself is never stored
+    token_hash = Column(String(64), unique=True, nullable=False)
+    # Every token rotated from the same login shares a family
+    family_id = Column(String(32), nullable=False, index=True)
+    
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    used_at = Column(DateTime(timezone=True), nullable=True)  # Set once rotated
+    revoked_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
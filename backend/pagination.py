@@ -0,0 +1,79 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import Select, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+import models
+
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Opaque cursor for the position after a ``(created_at, id)`` row"""
+    raw = json.dumps([created_at.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def history_page_statement(stmt: Select, cursor: Optional[str], limit: int) -> Select:
+    """Restrict a MetricsHistory select to one keyset page, newest first.
+
+    Ordered by ``(created_at DESC, id DESC)`` to match the composite history
+    index, so every page is an index range scan no matter how deep it is.
+    One extra row is selected to tell whether another page follows.
+    """
+    history = models.MetricsHistory
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        # Compare against the stored timestamp of the cursor row: SQLite keeps
+        # timestamps as text, so a re-bound datetime may not compare equal
+        anchor = aliased(history)
+        anchor_created_at = func.coalesce(
+            select(anchor.created_at).where(anchor.id == row_id).scalar_subquery(),
+            created_at
+        )
+        stmt = stmt.where(tuple_(history.created_at, history.id) < tuple_(anchor_created_at, row_id))
+    return stmt.order_by(history.created_at.desc(), history.id.desc()).limit(limit + 1)
+
+def split_history_page(rows: list, limit: int):
+    """The rows of a page selected by history_page_statement and the cursor of the next page (None on the last page)"""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
+
+async def history_page(db: AsyncSession, stmt: Select, cursor: Optional[str], limit: int):
+    """Keyset page of a MetricsHistory select, newest first; returns the rows and the next cursor"""
+    rows = (await db.scalars(history_page_statement(stmt, cursor, limit))).all()
+    return split_history_page(rows, limit)
+
+async def detail_versions_page(db: AsyncSession, sub_pnl_id: int, cursor: Optional[str], limit: int):
+    """Keyset page of a Sub-PnL's detail metrics versions, newest first.
+
+    The cursor is the last version number returned, so every page is a range
+    scan of the (sub_pnl_id, version) index. Returns the rows and the cursor
+    of the next page (None on the last page).
+    """
+    model = models.SubPnLDetailMetrics
+    stmt = select(model).where(model.sub_pnl_id == sub_pnl_id)
+    if cursor:
+        try:
+            stmt = stmt.where(model.version < int(cursor))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    rows = (await db.scalars(stmt.order_by(model.version.desc()).limit(limit + 1))).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = str(rows[-1].version)
+    return rows, next_cursor
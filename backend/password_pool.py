@@ -0,0 +1,106 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
+from security import hash_password, verify_password
+
+# bcrypt releases the GIL, so a thread pool hashes in parallel
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(os.cpu_count() or 2)))
+# Jobs allowed to wait for a worker before new ones are rejected with 429
+PASSWORD_QUEUE_SIZE = int(os.getenv("PASSWORD_QUEUE_SIZE", "32"))
+
+class PasswordPool:
+    """Size-limited worker pool for bcrypt with backpressure.
+
+    At most ``workers`` hashes run at once and ``queue_size`` more may wait;
+    beyond that requests are rejected with 429 instead of piling up behind
+    the event loop. Keeps queue depth and latency counters for ``/stats``.
+    """
+
+    def __init__(self, workers: int = PASSWORD_WORKERS, queue_size: int = PASSWORD_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        # completed: the job returned; failed: it raised or was cancelled before it started
+        self._counters = {"completed": 0, "failed": 0, "rejected": 0}
+        # Recent (queue wait, hash time) samples in seconds
+        self._samples = deque(maxlen=1024)
+
+    def _timed(self, fn, args, submitted_at: float):
+        started = time.perf_counter()
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args)
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self._running -= 1
+                self._samples.append((started - submitted_at, finished - started))
+
+    def _done(self, future):
+        # Runs when the worker is done with the job, not when the awaiting request gives up:
+        # a cancelled request keeps its slot until bcrypt actually finishes
+        with self._lock:
+            self._pending -= 1
+            failed = future.cancelled() or future.exception() is not None
+            self._counters["failed" if failed else "completed"] += 1
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.workers + self.queue_size:
+                self._counters["rejected"] += 1
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many concurrent sign-ins, retry shortly",
+                    headers={"Retry-After": "1"},
+                )
+            self._pending += 1
+        try:
+            future = self._executor.submit(self._timed, fn, args, time.perf_counter())
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+        future.add_done_callback(self._done)
+        return await asyncio.wrap_future(future)
+
+    async def hash(self, password: str) -> str:
+        return await self.run(hash_password, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self.run(verify_password, password, hashed_password)
+
+    def stats(self) -> dict:
+        with self._lock:
+            samples = list(self._samples)
+            running, pending = self._running, self._pending
+            counters = dict(self._counters)
+
+        def percentile(values, fraction):
+            if not values:
+                return None
+            values = sorted(values)
+            return round(values[min(int(len(values) * fraction), len(values) - 1)] * 1000, 2)
+
+        waits = [wait for wait, _ in samples]
+        hashes = [elapsed for _, elapsed in samples]
+        return {
+            **counters,
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "running": running,
+            "queue_depth": pending - running,
+            "wait_ms_p50": percentile(waits, 0.5),
+            "wait_ms_p99": percentile(waits, 0.99),
+            "hash_ms_p50": percentile(hashes, 0.5),
+            "hash_ms_p99": percentile(hashes, 0.99),
+        }
+
+password_pool = PasswordPool()
\ No newline at end of file
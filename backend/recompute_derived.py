@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Derived metrics recompute command for QAlytics
+Recalculates test_coverage_percent, testcases_per_bug and bugs_per_100_tests
+of every metrics row with one SQL UPDATE per table, then cross-checks the
+SQL calculation against the Python one row by row
+"""
+
+import sys
+import os
+import argparse
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import SessionLocal
+import derived
+
+def main():
+    parser = argparse.ArgumentParser(description="Recalculate and cross-check derived metrics")
+    parser.add_argument("--check", action="store_true",
+                        help="only compare, without recalculating first")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if not args.check:
+            for table, count in derived.recompute_all(db).items():
+                print(f"🔄 {table}: recalculated {count} row(s)")
+            db.commit()
+        mismatches = [entry for model in derived.DERIVED_TABLES for entry in derived.cross_check(db, model)]
+    finally:
+        db.close()
+
+    disagreements = [entry for entry in mismatches if entry["python"] != entry["sql"]]
+    for entry in disagreements:
+        print(f"❌ {entry['table']} {entry['id']}: {entry['field']} is {entry['python']} in Python but {entry['sql']} in SQL")
+    stale = [entry for entry in mismatches if entry["python"] == entry["sql"]]
+    for entry in stale:
+        print(f"⚠️  {entry['table']} {entry['id']}: {entry['field']} stored {entry['stored']}, expected {entry['python']}")
+
+    if disagreements:
+        print(f"❌ Python and SQL calculations disagree on {len(disagreements)} value(s)")
+        sys.exit(1)
+    if stale:
+        print(f"❌ {len(stale)} stored value(s) out of date")
+        sys.exit(1)
+    print("✅ Stored derived metrics match the Python and SQL calculations")
+
+if __name__ == "__main__":
+    main()
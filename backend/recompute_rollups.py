@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+PnL rollup recompute command for QAlytics
+Checks the incrementally maintained PnL rollups against a full
+recomputation from Sub-PnL metrics and repairs any drift
+"""
+
+import sys
+import os
+import argparse
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import SessionLocal
+import rollups
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and repair PnL rollup drift")
+    parser.add_argument("--check", action="store_true",
+                        help="only report drift, exit with status 1 if any is found")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        drift = rollups.recompute_rollups(db, repair=not args.check)
+    finally:
+        db.close()
+
+    for entry in drift:
+        if entry["stored"] is None:
+            print(f"⚠️  PnL {entry['pnl_id']}: rollup missing")
+            continue
+        changed = {
+            field: (entry["stored"][field], value)
+            for field, value in entry["expected"].items()
+            if entry["stored"][field] != value
+        }
+        print(f"⚠️  PnL {entry['pnl_id']}: drift in {', '.join(f'{field} {stored} -> {expected}' for field, (stored, expected) in changed.items())}")
+
+    if not drift:
+        print("✅ All PnL rollups match a full recomputation")
+    elif args.check:
+        print(f"❌ {len(drift)} PnL rollup(s) drifted")
+        sys.exit(1)
+    else:
+        print(f"✅ Repaired {len(drift)} PnL rollup(s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import hashlib
+import hmac
+import os
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+from security import SECRET_KEY
+from timeutil import as_utc
+
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+
+def token_digest(token: str) -> str:
+    """HMAC of a refresh token, the only form in which it is stored"""
+    return hmac.new(SECRET_KEY.encode(), token.encode(), hashlib.sha256).hexdigest()
+
+def _invalid_refresh_token() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+
+async def issue(db: AsyncSession, user_id: int, family_id: Optional[str] = None) -> str:
+    """New refresh token for a user, added to the session; the caller commits"""
+    now = datetime.now(timezone.utc)
+    # Expired tokens are no longer needed for reuse detection; keep the store compact
+    await db.execute(delete(models.RefreshToken).where(
+        models.RefreshToken.user_id == user_id,
+        models.RefreshToken.expires_at < now
+    ).execution_options(synchronize_session=False))
+    token = secrets.token_urlsafe(32)
+    db.add(models.RefreshToken(
+        user_id=user_id,
+        token_hash=token_digest(token),
+        family_id=family_id or secrets.token_hex(16),
+        expires_at=now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    ))
+    return token
+
+async def revoke_family(db: AsyncSession, family_id: str):
+    await db.execute(update(models.RefreshToken).where(
+        models.RefreshToken.family_id == family_id,
+        models.RefreshToken.revoked_at.is_(None)
+    ).values(revoked_at=datetime.now(timezone.utc)).execution_options(synchronize_session=False))
+
+async def rotate(db: AsyncSession, token: str) -> Tuple[models.User, str]:
+    """Exchange a refresh token for its user and a new refresh token, and commit.
+
+    Each token can be used once. Presenting an already rotated token means it
+    leaked, so every token of that login is revoked.
+    """
+    row = (await db.execute(
+        select(models.RefreshToken, models.User)
+        .join(models.User, models.User.id == models.RefreshToken.user_id)
+        .where(models.RefreshToken.token_hash == token_digest(token))
+    )).first()
+    if not row:
+        raise _invalid_refresh_token()
+
+    record, user = row
+    now = datetime.now(timezone.utc)
+    if record.revoked_at is not None or as_utc(record.expires_at) <= now:
+        raise _invalid_refresh_token()
+
+    # Claim the token atomically, so two concurrent refreshes cannot both rotate it
+    claimed = await db.execute(update(models.RefreshToken).where(
+        models.RefreshToken.id == record.id,
+        models.RefreshToken.used_at.is_(None)
+    ).values(used_at=now).execution_options(synchronize_session=False))
+    if claimed.rowcount != 1:
+        await revoke_family(db, record.family_id)
+        await db.commit()
+        raise _invalid_refresh_token()
+
+    new_token = await issue(db, user.id, record.family_id)
+    await db.commit()
+    return user, new_token
+
+async def revoke(db: AsyncSession, token: str):
+    """Revoke the login a refresh token belongs to, and commit"""
+    family_id = await db.scalar(select(models.RefreshToken.family_id).where(
+        models.RefreshToken.token_hash == token_digest(token)
+    ))
+    if family_id:
+        await revoke_family(db, family_id)
+        await db.commit()
\ No newline at end of file
@@ -0,0 +1,121 @@
+import functools
+import inspect
+from decimal import Decimal
+from typing import Any, Callable, Coroutine
+import orjson
+from fastapi import Request, Response
+from fastapi.dependencies.utils import get_dependant, get_parameterless_sub_dependant
+from fastapi.exceptions import ResponseValidationError
+from fastapi.routing import APIRoute, get_request_handler
+from starlette.routing import request_response
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+def _default(obj):
+    # Types orjson does not encode by itself
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+class FastJSONResponse(Response):
+    """JSON response encoded with orjson; bytes are sent as they are, already encoded"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+def encode(adapter: TypeAdapter, content: Any) -> bytes:
+    """Validate content against a response model once and encode it straight to JSON bytes.
+
+    ORM rows are read through ``from_attributes``; instances of the response
+    schemas are taken as they are, without validating them again.
+    """
+    return adapter.dump_json(adapter.validate_python(content, from_attributes=True), by_alias=True)
+
+class FastJSONRoute(APIRoute):
+    """Route whose response model is applied in one pass, straight to JSON bytes.
+
+    FastAPI validates the endpoint's return value, dumps it to Python objects
+    and then encodes those with ``json.dumps``; here pydantic-core validates
+    and writes the JSON itself. Headers and the status code set on the
+    injected ``Response`` are kept. Routes without a response model, or with
+    ``response_model_include``/``exclude`` options, keep FastAPI's handling,
+    through the default FastJSONResponse class.
+    """
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs):
+        super().__init__(path, endpoint, **kwargs)
+        self.response_adapter = None
+        if self.response_model is None or any((
+            self.response_model_include, self.response_model_exclude, self.response_model_exclude_unset,
+            self.response_model_exclude_defaults, self.response_model_exclude_none,
+        )):
+            return
+        self.response_adapter = TypeAdapter(self.response_model)
+        # Same dependencies as APIRoute builds, for the endpoint that encodes its own result
+        self.dependant = get_dependant(path=self.path_format, call=self._encoding_endpoint(endpoint))
+        for depends in self.dependencies[::-1]:
+            self.dependant.dependencies.insert(
+                0, get_parameterless_sub_dependant(depends=depends, path=self.path_format)
+            )
+        self.app = request_response(self.get_route_handler())
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        if not getattr(self, "response_adapter", None):
+            return super().get_route_handler()
+        # The endpoint already returns a Response: nothing left for FastAPI to serialize
+        return get_request_handler(
+            dependant=self.dependant,
+            body_field=self.body_field,
+            status_code=self.status_code,
+            response_class=self.response_class,
+            dependency_overrides_provider=self.dependency_overrides_provider,
+        )
+
+    def _encoding_endpoint(self, endpoint: Callable[..., Any]) -> Callable[..., Any]:
+        adapter, status_code = self.response_adapter, self.status_code
+
+        def respond(content: Any, response: Response) -> Response:
+            if isinstance(content, Response):
+                return content
+            try:
+                body = encode(adapter, content)
+            except ValidationError as e:
+                raise ResponseValidationError(errors=e.errors(), body=content)
+            encoded = FastJSONResponse(body, status_code=response.status_code or status_code or 200)
+            encoded.headers.raw.extend(response.headers.raw)
+            return encoded
+
+        # FastAPI injects the Response into a single parameter: reuse the endpoint's own one
+        signature = inspect.signature(endpoint)
+        name = next((
+            parameter.name for parameter in signature.parameters.values()
+            if inspect.isclass(parameter.annotation) and issubclass(parameter.annotation, Response)
+        ), None)
+        own = name is not None
+        if not own:
+            name = "_response"
+            signature = signature.replace(parameters=[
+                *signature.parameters.values(),
+                inspect.Parameter(name, inspect.Parameter.KEYWORD_ONLY, annotation=Response),
+            ])
+
+        def call_args(kwargs):
+            return kwargs[name] if own else kwargs.pop(name)
+
+        if inspect.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def encoding_endpoint(**kwargs):
+                response = call_args(kwargs)
+                return respond(await endpoint(**kwargs), response)
+        else:
+            @functools.wraps(endpoint)
+            def encoding_endpoint(**kwargs):
+                response = call_args(kwargs)
+                return respond(endpoint(**kwargs), response)
+
+        encoding_endpoint.__signature__ = signature
+        return encoding_endpoint
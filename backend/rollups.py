@@ -0,0 +1,151 @@
+from decimal import Decimal
+from typing import List, Optional, Tuple
+from sqlalchemy.orm import Session
+import models
+import aggregation
+import derived
+
+# Rollup column holding the running total of each aggregated Sub-PnL field
+TOTAL_COLUMNS = {
+    "features_shipped": "features_shipped",
+    "total_testcases_executed": "total_testcases_executed",
+    "total_bugs_logged": "total_bugs_logged",
+    "regression_bugs_found": "regression_bugs_found",
+    "escaped_bugs": "escaped_bugs",
+    "sanity_time_avg_hours": "sanity_time_hours_sum",
+    "automation_coverage_percent": "automation_coverage_percent_sum",
+    "metrics_count": "metrics_count",
+}
+
+def _columns_from_totals(totals: dict) -> dict:
+    return {column: totals[field] for field, column in TOTAL_COLUMNS.items()}
+
+def _totals_from_rollup(rollup: models.PnLRollup) -> dict:
+    return {field: getattr(rollup, column) or 0 for field, column in TOTAL_COLUMNS.items()}
+
+def _difference(new_value, old_value):
+    if isinstance(new_value, int) and isinstance(old_value, (int, type(None))):
+        return new_value - (old_value or 0)
+    return Decimal(str(new_value or 0)) - Decimal(str(old_value or 0))
+
+def get_or_build_rollup(db: Session, pnl_id: int) -> models.PnLRollup:
+    """Get the rollup row of a PnL, building it from Sub-PnL metrics if missing.
+
+    Call this before modifying any Sub-PnL metrics in the session, so a freshly
+    built rollup reflects the state the following delta is applied to.
+    """
+    rollup = db.query(models.PnLRollup).filter(models.PnLRollup.pnl_id == pnl_id).first()
+    if not rollup:
+        totals = aggregation.aggregate_sub_pnl_totals(db, [pnl_id])[pnl_id]
+        rollup = models.PnLRollup(pnl_id=pnl_id, **_columns_from_totals(totals))
+        db.add(rollup)
+        db.flush()
+    return rollup
+
+def rollup_values(rollup: models.PnLRollup) -> dict:
+    """PnL metric values (sums and averages) held by a rollup row"""
+    return aggregation.rollup_from_totals(_totals_from_rollup(rollup))
+
+def sync_pnl_metrics(db: Session, rollup: models.PnLRollup) -> models.PnLMetrics:
+    """Write the aggregated values of a rollup, and the metrics derived from them, into the PnL metrics row"""
+    values = derived.with_derived(rollup_values(rollup))
+
+    pnl_metrics = db.query(models.PnLMetrics).filter(
+        models.PnLMetrics.pnl_id == rollup.pnl_id
+    ).first()
+
+    if pnl_metrics:
+        for key, value in values.items():
+            setattr(pnl_metrics, key, value)
+    else:
+        pnl_metrics = models.PnLMetrics(pnl_id=rollup.pnl_id, **values)
+        db.add(pnl_metrics)
+    return pnl_metrics
+
+def apply_sub_pnl_change(db: Session, pnl_id: int, previous_values: Optional[dict],
+                         new_values: dict) -> models.PnLMetrics:
+    """Apply one Sub-PnL metrics write to its PnL rollup and PnL metrics.
+
+    ``previous_values`` is None when the Sub-PnL metrics row is being created.
+    The rollup is changed with a single ``col = col + delta`` UPDATE, which
+    also row-locks it until the caller commits, so concurrent writers to the
+    same PnL serialize instead of losing updates.
+    """
+    return apply_sub_pnl_changes(db, pnl_id, [(previous_values, new_values)])
+
+def apply_sub_pnl_changes(db: Session, pnl_id: int,
+                          changes: List[Tuple[Optional[dict], dict]]) -> models.PnLMetrics:
+    """Apply many ``(previous_values, new_values)`` Sub-PnL writes of one PnL in one UPDATE"""
+    rollup = get_or_build_rollup(db, pnl_id)
+
+    deltas = {}
+    created = 0
+    for previous_values, new_values in changes:
+        if not previous_values:
+            created += 1
+        previous_values = previous_values or {}
+        for field in aggregation.ROLLUP_FIELDS:
+            delta = _difference(new_values.get(field), previous_values.get(field))
+            if delta:
+                deltas[field] = deltas.get(field, 0) + delta
+
+    updates = {
+        TOTAL_COLUMNS[field]: getattr(models.PnLRollup, TOTAL_COLUMNS[field]) + delta
+        for field, delta in deltas.items() if delta
+    }
+    if created:
+        updates["metrics_count"] = models.PnLRollup.metrics_count + created
+
+    if updates:
+        db.query(models.PnLRollup).filter(
+            models.PnLRollup.id == rollup.id
+        ).update(updates, synchronize_session=False)
+        db.refresh(rollup)
+
+    return sync_pnl_metrics(db, rollup)
+
+def count_new_metrics(db: Session, pnl_id: int, created: int = 1) -> models.PnLRollup:
+    """Count freshly created, all-default Sub-PnL metrics rows in the PnL rollup.
+
+    Their values are all zero, so only ``metrics_count`` changes. PnL metrics
+    are left as they are: creating a Sub-PnL must not create or overwrite
+    them. Call it before the new rows are flushed.
+    """
+    rollup = get_or_build_rollup(db, pnl_id)
+    db.query(models.PnLRollup).filter(
+        models.PnLRollup.id == rollup.id
+    ).update({"metrics_count": models.PnLRollup.metrics_count + created}, synchronize_session=False)
+    return rollup
+
+def recompute_rollups(db: Session, repair: bool = True) -> List[dict]:
+    """Compare every rollup with a full recomputation and optionally repair drift.
+
+    Returns one entry per drifted (or missing) rollup with the stored and the
+    expected totals. Repaired PnLs also get their PnL metrics re-synced.
+    """
+    expected_totals = aggregation.aggregate_sub_pnl_totals(db)
+    rollups = {rollup.pnl_id: rollup for rollup in db.query(models.PnLRollup).all()}
+
+    drift = []
+    for pnl_id, expected in expected_totals.items():
+        rollup = rollups.get(pnl_id)
+        stored = _totals_from_rollup(rollup) if rollup else None
+        if stored is not None and all(
+            Decimal(str(stored[field])).quantize(Decimal("0.01")) == Decimal(str(expected[field])).quantize(Decimal("0.01"))
+            for field in TOTAL_COLUMNS
+        ):
+            continue
+
+        drift.append({"pnl_id": pnl_id, "stored": stored, "expected": expected})
+        if repair:
+            if rollup:
+                for column, value in _columns_from_totals(expected).items():
+                    setattr(rollup, column, value)
+            else:
+                rollup = models.PnLRollup(pnl_id=pnl_id, **_columns_from_totals(expected))
+                db.add(rollup)
+            sync_pnl_metrics(db, rollup)
+
+    if repair:
+        db.commit()
+    return drift
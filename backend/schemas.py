@@ -1,8 +1,14 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from decimal import Decimal
 
+# test_coverage_percent is named for code coverage but measures defect detection (see derived.py)
+TEST_COVERAGE_DESCRIPTION = (
+    "Defect detection rate: total_bugs_logged / (total_bugs_logged + escaped_bugs) * 100, "
+    "not code coverage. Calculated on every write; 0 when there are no bugs"
+)
+
 # User schemas
 class UserBase(BaseModel):
     email: EmailStr
@@ -16,6 +22,7 @@ class UserLogin(BaseModel):
     password: str
 
 class UserOut(UserBase):
+    email: str  # Validated on signup; rows are trusted, so not checked again on every response
     id: int
     created_at: datetime
     
@@ -25,8 +32,12 @@ class UserOut(UserBase):
 class TokenOut(BaseModel):
     access_token: str
     token_type: str = "bearer"
+    refresh_token: Optional[str] = None
     user: UserOut
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 # PnL schemas
 class PnLBase(BaseModel):
     name: str
@@ -80,9 +91,13 @@ class PnLMetricsUpdate(PnLMetricsBase):
     pass
 
 class PnLMetricsOut(PnLMetricsBase):
-    id: int
+    id: Optional[int] = None  # None for virtual metrics that are not stored yet
     pnl_id: int
-    updated_at: datetime
+    updated_at: Optional[datetime] = None
+    # Calculated from the counts on every write (see derived.py)
+    test_coverage_percent: float = Field(0.0, description=TEST_COVERAGE_DESCRIPTION)
+    testcases_per_bug: float = 0.0
+    bugs_per_100_tests: float = 0.0
     
     class Config:
         from_attributes = True
@@ -104,9 +119,13 @@ class SubPnLMetricsUpdate(SubPnLMetricsBase):
     pass
 
 class SubPnLMetricsOut(SubPnLMetricsBase):
-    id: int
+    id: Optional[int] = None  # None for virtual default metrics that are not stored yet
     sub_pnl_id: int
-    updated_at: datetime
+    updated_at: Optional[datetime] = None
+    # Calculated from the counts on every write (see derived.py)
+    test_coverage_percent: float = Field(0.0, description=TEST_COVERAGE_DESCRIPTION)
+    testcases_per_bug: float = 0.0
+    bugs_per_100_tests: float = 0.0
     
     class Config:
         from_attributes = True
@@ -130,13 +149,25 @@ class SubPnLDetailMetricsUpdate(SubPnLDetailMetricsBase):
     pass
 
 class SubPnLDetailMetricsOut(SubPnLDetailMetricsBase):
-    id: int
+    id: Optional[int] = None  # None for virtual default metrics that are not stored yet
     sub_pnl_id: int
-    updated_at: datetime
+    updated_at: Optional[datetime] = None
+    # Calculated from the counts on every write (see derived.py)
+    test_coverage_percent: float = Field(0.0, description=TEST_COVERAGE_DESCRIPTION)
+    testcases_per_bug: float = 0.0
+    bugs_per_100_tests: float = 0.0
     
     class Config:
         from_attributes = True
 
+class SubPnLDetailMetricsVersionOut(SubPnLDetailMetricsOut):
+    id: int
+    version: int
+    is_active: bool
+    description: Optional[str] = None
+    current_history_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+
 # Dashboard response schemas
 class PnLWithSubPnLs(BaseModel):
     id: int
@@ -189,10 +220,10 @@ class SubPnLWithDetailMetrics(BaseModel):
 class MetricsHistoryBase(BaseModel):
     entity_type: str
     entity_id: int
-    metrics_data: str
+    metrics_data: Dict[str, Any]
     change_type: str
     change_description: Optional[str] = None
-    previous_values: Optional[str] = None
+    previous_values: Optional[Dict[str, Any]] = None
 
 class MetricsHistoryCreate(MetricsHistoryBase):
     changed_by: Optional[int] = None
@@ -204,4 +235,74 @@ class MetricsHistoryOut(MetricsHistoryBase):
     user: Optional[UserOut] = None
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# Ingestion schemas
+class DetailMetricsSnapshotRow(SubPnLDetailMetricsBase):
+    sub_pnl_id: int
+    recorded_at: Optional[datetime] = None  # When the snapshot was taken; defaults to now
+
+class IngestResult(BaseModel):
+    rows: int
+    written: int
+    failed: int
+    current_updated: int
+    errors: List[str] = []
+
+# Bulk metrics schemas
+class BulkMetricsItem(BaseModel):
+    sub_pnl_id: int
+    metrics: Optional[SubPnLMetricsUpdate] = None
+    detail_metrics: Optional[SubPnLDetailMetricsUpdate] = None
+
+class BulkMetricsItemResult(BaseModel):
+    index: int
+    sub_pnl_id: Optional[int] = None
+    status: str  # 'applied', 'error'
+    errors: List[str] = []
+
+class BulkMetricsResult(BaseModel):
+    applied: int
+    failed: int
+    results: List[BulkMetricsItemResult]
+
+# Batch read schemas
+class PnLMetricsBatch(BaseModel):
+    items: List[PnLMetricsOut]  # In the order the ids were requested
+    missing: List[int] = []  # Requested ids without a PnL
+
+class DetailMetricsBatch(BaseModel):
+    items: List[SubPnLDetailMetricsOut]  # In the order the ids were requested
+    missing: List[int] = []  # Requested ids without a Sub-PnL
+
+# Trend schemas
+class TrendPoint(BaseModel):
+    bucket_start: datetime
+    last: float
+    min: float
+    max: float
+    avg: float
+    count: int
+
+class TrendsOut(BaseModel):
+    sub_pnl_id: int
+    entity_type: str
+    bucket: str  # 'day', 'week', 'month'
+    series: Dict[str, List[TrendPoint]]  # Points per metric, oldest first
+
+# Page view schemas: everything a page shows, in one response
+class SubPnLView(BaseModel):
+    sub_pnl: SubPnLOut
+    pnl: PnLOut
+    metrics: SubPnLMetricsOut
+    detail_metrics: SubPnLDetailMetricsOut
+    history: List[MetricsHistoryOut] = []  # Newest first
+    history_next_cursor: Optional[str] = None  # Next page via /sub-pnls/{id}/metrics-history?cursor=
+    siblings: List[SubPnLWithDetailMetrics] = []  # Other Sub-PnLs of the same PnL
+
+class PnLView(BaseModel):
+    pnl: PnLOut
+    metrics: PnLMetricsOut
+    history: List[MetricsHistoryOut] = []  # Newest first
+    history_next_cursor: Optional[str] = None  # Next page via /metrics-history?entity_type=pnl&cursor=
+    sub_pnls: List[SubPnLWithDetailMetrics] = []
@@ -0,0 +1,75 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+# The app reads its settings at import time: point it at a throwaway SQLite
+# database (and cheap bcrypt) before anything imports database.py
+TEST_DB_DIR = tempfile.mkdtemp(prefix="qalytics-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{TEST_DB_DIR}/qalytics.db"
+os.environ["BCRYPT_ROUNDS"] = "4"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+import auth
+import database
+import init_db
+from app import app
+from cache import response_cache
+
+ADMIN_EMAIL = "test@qalytics.com"
+ADMIN_PASSWORD = "password123"
+
+@pytest.fixture(autouse=True)
+def sample_db():
+    """Fresh schema and sample data (3 PnLs, 10 Sub-PnLs) for every test"""
+    init_db.create_tables()
+    init_db.create_sample_data()
+    response_cache.clear()
+    auth.principal_cache.clear()
+    yield
+    # Pooled aiosqlite connections belong to the test client's event loop
+    asyncio.run(database.async_engine.dispose())
+    database.engine.dispose()
+
+@pytest.fixture
+def db():
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def tokens(client):
+    response = client.post("/auth/login", json={"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD})
+    assert response.status_code == 200
+    return response.json()
+
+@pytest.fixture
+def headers(tokens):
+    return {"Authorization": f"Bearer {tokens['access_token']}"}
+
+@pytest.fixture
+def statements():
+    """SQL statements run on the sync and async engines during the test"""
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+    engines = (database.engine, database.async_engine.sync_engine)
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", record)
+    yield executed
+    for engine in engines:
+        event.remove(engine, "before_cursor_execute", record)
+
+def writes(statements):
+    return [statement for statement in statements if statement.lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE"))]
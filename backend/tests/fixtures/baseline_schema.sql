@@ -0,0 +1,115 @@
+-- Schema of the original release (before migration 001), as SQLite DDL
+
+CREATE TABLE pnls (
+	id INTEGER NOT NULL, 
+	name VARCHAR(255) NOT NULL, 
+	description TEXT, 
+	created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), 
+	updated_at DATETIME DEFAULT (CURRENT_TIMESTAMP), 
+	PRIMARY KEY (id)
+);
+
+CREATE INDEX ix_pnls_id ON pnls (id);
+CREATE TABLE users (
+	id INTEGER NOT NULL, 
+	email VARCHAR(255) NOT NULL, 
+	password_hash TEXT NOT NULL, 
+	role VARCHAR(50) NOT NULL, 
+	created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), 
+	PRIMARY KEY (id)
+);
+
+CREATE INDEX ix_users_id ON users (id);
+CREATE UNIQUE INDEX ix_users_email ON users (email);
+CREATE TABLE metrics_history (
+	id INTEGER NOT NULL, 
+	entity_type VARCHAR(50) NOT NULL, 
+	entity_id INTEGER NOT NULL, 
+	metrics_data TEXT NOT NULL, 
+	change_type VARCHAR(20) NOT NULL, 
+	changed_by INTEGER, 
+	change_description VARCHAR(500), 
+	previous_values TEXT, 
+	created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(changed_by) REFERENCES users (id)
+);
+
+CREATE INDEX ix_metrics_history_id ON metrics_history (id);
+CREATE TABLE pnl_metrics (
+	id INTEGER NOT NULL, 
+	pnl_id INTEGER NOT NULL, 
+	features_shipped INTEGER, 
+	total_testcases_executed INTEGER, 
+	total_bugs_logged INTEGER, 
+	testcase_peer_review INTEGER, 
+	regression_bugs_found INTEGER, 
+	sanity_time_avg_hours DECIMAL(5, 2), 
+	api_test_time_avg_hours DECIMAL(5, 2), 
+	automation_coverage_percent DECIMAL(5, 2), 
+	escaped_bugs INTEGER, 
+	test_coverage_percent DECIMAL(5, 2), 
+	testcases_per_bug DECIMAL(5, 2), 
+	bugs_per_100_tests DECIMAL(5, 2), 
+	updated_at DATETIME DEFAULT (CURRENT_TIMESTAMP), 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(pnl_id) REFERENCES pnls (id) ON DELETE CASCADE
+);
+
+CREATE INDEX ix_pnl_metrics_id ON pnl_metrics (id);
+CREATE TABLE sub_pnls (
+	id INTEGER NOT NULL, 
+	pnl_id INTEGER NOT NULL, 
+	name VARCHAR(255) NOT NULL, 
+	description TEXT, 
+	created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), 
+	updated_at DATETIME DEFAULT (CURRENT_TIMESTAMP), 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(pnl_id) REFERENCES pnls (id) ON DELETE CASCADE
+);
+
+CREATE INDEX ix_sub_pnls_id ON sub_pnls (id);
+CREATE TABLE sub_pnl_detail_metrics (
+	id INTEGER NOT NULL, 
+	sub_pnl_id INTEGER NOT NULL, 
+	features_shipped INTEGER, 
+	total_testcases_executed INTEGER, 
+	total_bugs_logged INTEGER, 
+	testcase_peer_review INTEGER, 
+	regression_bugs_found INTEGER, 
+	sanity_time_avg_hours DECIMAL(5, 2), 
+	api_test_time_avg_hours DECIMAL(5, 2), 
+	automation_coverage_percent DECIMAL(5, 2), 
+	escaped_bugs INTEGER, 
+	test_coverage_percent DECIMAL(5, 2), 
+	testcases_per_bug DECIMAL(5, 2), 
+	bugs_per_100_tests DECIMAL(5, 2), 
+	version INTEGER, 
+	description VARCHAR(500), 
+	is_active BOOLEAN, 
+	created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), 
+	updated_at DATETIME DEFAULT (CURRENT_TIMESTAMP), 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(sub_pnl_id) REFERENCES sub_pnls (id) ON DELETE CASCADE
+);
+
+CREATE INDEX ix_sub_pnl_detail_metrics_id ON sub_pnl_detail_metrics (id);
+CREATE TABLE sub_pnl_metrics (
+	id INTEGER NOT NULL, 
+	sub_pnl_id INTEGER NOT NULL, 
+	features_shipped INTEGER, 
+	total_testcases_executed INTEGER, 
+	total_bugs_logged INTEGER, 
+	regression_bugs_found INTEGER, 
+	sanity_time_avg_hours DECIMAL(5, 2), 
+	automation_coverage_percent DECIMAL(5, 2), 
+	escaped_bugs INTEGER, 
+	test_coverage_percent DECIMAL(5, 2), 
+	testcases_per_bug DECIMAL(5, 2), 
+	bugs_per_100_tests DECIMAL(5, 2), 
+	updated_at DATETIME DEFAULT (CURRENT_TIMESTAMP), 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(sub_pnl_id) REFERENCES sub_pnls (id) ON DELETE CASCADE
+);
+
+CREATE INDEX ix_sub_pnl_metrics_id ON sub_pnl_metrics (id);
@@ -0,0 +1,48 @@
+import pytest
+from sqlalchemy import delete, select
+import aggregation
+import models
+
+def python_rollups(db):
+    """The original Python rollup: first metrics row per Sub-PnL, sums and averages per PnL"""
+    result = {}
+    for pnl in db.scalars(select(models.PnL)):
+        rows = [
+            min(sub_pnl.sub_pnl_metrics, key=lambda row: row.id)
+            for sub_pnl in pnl.sub_pnls if sub_pnl.sub_pnl_metrics
+        ]
+        values = {field: sum(getattr(row, field) for row in rows) for field in aggregation.SUM_FIELDS}
+        for field in aggregation.AVERAGE_FIELDS:
+            values[field] = sum(getattr(row, field) for row in rows) / max(len(rows), 1)
+        result[pnl.id] = values
+    return result
+
+def assert_matches_python(db):
+    expected = python_rollups(db)
+    actual = aggregation.aggregate_pnl_rollups(db)
+    assert set(actual) == set(expected)
+    for pnl_id, values in expected.items():
+        for field, value in values.items():
+            assert actual[pnl_id][field] == pytest.approx(value), (pnl_id, field)
+
+def test_matches_python_rollup_on_sample_data(db):
+    assert_matches_python(db)
+
+def test_edge_cases_match_python_rollup(db):
+    # A second metrics row is ignored, a Sub-PnL without metrics is left out of averages
+    db.add(models.SubPnLMetrics(sub_pnl_id=1, features_shipped=1000, sanity_time_avg_hours=99))
+    db.execute(delete(models.SubPnLMetrics).where(models.SubPnLMetrics.sub_pnl_id == 2))
+    db.add(models.PnL(name="Empty"))
+    db.commit()
+    assert_matches_python(db)
+
+    empty_id = db.scalar(select(models.PnL.id).where(models.PnL.name == "Empty"))
+    totals = aggregation.aggregate_sub_pnl_totals(db, [empty_id])[empty_id]
+    assert totals == {field: 0 for field in aggregation.ROLLUP_FIELDS} | {"metrics_count": 0}
+
+def test_filters_and_single_pnl(db, statements):
+    assert set(aggregation.aggregate_pnl_rollups(db, [1, 3])) == {1, 3}
+    assert len(statements) == 1
+    assert aggregation.aggregate_pnl_rollups(db, []) == {}
+    assert aggregation.compute_pnl_rollup(db, 2) == aggregation.aggregate_pnl_rollups(db, [2])[2]
+    assert aggregation.compute_pnl_rollup(db, 999) == {field: 0 for field in aggregation.ROLLUP_FIELDS}
@@ -0,0 +1,70 @@
+from datetime import datetime, timezone
+import pytest
+from sqlalchemy import func, select, update
+import models
+
+CREATED = datetime(2023, 1, 1, tzinfo=timezone.utc)
+FIRST = datetime(2024, 1, 1, tzinfo=timezone.utc)
+MANUAL = datetime(2024, 2, 1, tzinfo=timezone.utc)
+SECOND = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+def metrics(**values):
+    return {
+        "features_shipped": 0, "total_testcases_executed": 0, "total_bugs_logged": 0,
+        "regression_bugs_found": 0, "sanity_time_avg_hours": 0, "automation_coverage_percent": 0,
+        "escaped_bugs": 0, **values,
+    }
+
+def detail(**values):
+    return {**metrics(testcase_peer_review=0, api_test_time_avg_hours=0), **values}
+
+def at(year, month, day=15):
+    return {"as_of": datetime(year, month, day, tzinfo=timezone.utc).isoformat()}
+
+def put_at(client, db, headers, url, body, when):
+    """Write through the API, then move the new history entry to ``when``"""
+    assert client.put(url, json=body, headers=headers).status_code == 200
+    history = models.MetricsHistory
+    db.execute(update(history).where(history.id == select(func.max(history.id)).scalar_subquery()).values(created_at=when))
+    db.commit()
+
+@pytest.fixture
+def seeded(client, db, headers):
+    db.execute(update(models.PnL).values(created_at=CREATED))
+    db.execute(update(models.SubPnL).values(created_at=CREATED))
+    db.commit()
+    put_at(client, db, headers, "/sub-pnls/1/metrics", metrics(features_shipped=3), FIRST)
+    put_at(client, db, headers, "/pnls/1/metrics", metrics(features_shipped=50), MANUAL)
+    put_at(client, db, headers, "/sub-pnls/1/metrics", metrics(features_shipped=8), SECOND)
+    put_at(client, db, headers, "/sub-pnls/1/detail-metrics", detail(total_testcases_executed=30), FIRST)
+    put_at(client, db, headers, "/sub-pnls/1/detail-metrics", detail(total_testcases_executed=80), SECOND)
+
+def test_detail_metrics_as_of(client, seeded):
+    assert client.get("/sub-pnls/1/detail-metrics", params=at(2023, 6)).json()["total_testcases_executed"] == 180
+    assert client.get("/sub-pnls/1/detail-metrics", params=at(2024, 2)).json()["total_testcases_executed"] == 30
+    assert client.get("/sub-pnls/1/detail-metrics", params=at(2024, 4)).json()["total_testcases_executed"] == 80
+    assert client.get("/sub-pnls/1/detail-metrics").json()["total_testcases_executed"] == 80
+    # Without history the current version is the state at any time
+    assert client.get("/sub-pnls/2/detail-metrics", params=at(2023, 6)).json() == client.get("/sub-pnls/2/detail-metrics").json()
+
+def test_pnl_metrics_as_of(client, seeded):
+    first = client.get("/pnls/1/metrics", params=at(2024, 1)).json()
+    manual = client.get("/pnls/1/metrics", params=at(2024, 2)).json()
+    second = client.get("/pnls/1/metrics", params=at(2024, 4)).json()
+    # Manually set metrics hold until a Sub-PnL changes; then the rollup replaces them
+    assert manual["features_shipped"] == 50
+    assert manual["updated_at"].startswith("2024-02-01")
+    assert second["features_shipped"] - first["features_shipped"] == 5
+    assert second["updated_at"].startswith("2024-03-01")
+    assert second["features_shipped"] == client.get("/pnls/1/metrics").json()["features_shipped"]
+
+def test_dashboard_as_of(client, seeded):
+    assert client.get("/dashboard", params=at(2022, 6)).json() == []
+    dashboard = client.get("/dashboard", params=at(2024, 2)).json()
+    assert [pnl["id"] for pnl in dashboard] == [1, 2, 3]
+    assert dashboard[0]["metrics"] == client.get("/pnls/1/metrics", params=at(2024, 2)).json()
+    assert dashboard[0]["sub_pnls_count"] == client.get("/dashboard").json()[0]["sub_pnls_count"]
+
+def test_as_of_errors(client):
+    assert client.get("/pnls/999/metrics", params=at(2024, 2)).status_code == 404
+    assert client.get("/dashboard", params={"as_of": "yesterday"}).status_code == 422
@@ -0,0 +1,45 @@
+from sqlalchemy import delete
+import batch_reads
+import models
+
+def test_pnl_batch_follows_requested_order(client):
+    response = client.get("/pnls/metrics", params={"ids": "3, 1,999,3"})
+    assert response.status_code == 200
+    body = response.json()
+    assert [item["pnl_id"] for item in body["items"]] == [3, 1]
+    assert body["missing"] == [999]
+    assert body["items"] == [client.get(f"/pnls/{pnl_id}/metrics").json() for pnl_id in (3, 1)]
+
+def test_pnl_batch_aggregates_pnls_without_metrics(client, db):
+    db.execute(delete(models.PnLMetrics).where(models.PnLMetrics.pnl_id == 2))
+    db.execute(delete(models.PnLRollup).where(models.PnLRollup.pnl_id == 2))
+    db.commit()
+    item, = client.get("/pnls/metrics", params={"ids": "2"}).json()["items"]
+    assert item["id"] is None
+    assert item == client.get("/pnls/2/metrics").json()
+
+def test_detail_batch_follows_requested_order(client, db):
+    db.execute(delete(models.SubPnLDetailMetrics).where(models.SubPnLDetailMetrics.sub_pnl_id == 2))
+    db.commit()
+    body = client.get("/sub-pnls/metrics", params={"ids": "2,1,999"}).json()
+    assert [item["sub_pnl_id"] for item in body["items"]] == [2, 1]
+    assert body["missing"] == [999]
+    assert body["items"][0]["id"] is None
+    assert body["items"] == [client.get(f"/sub-pnls/{sub_pnl_id}/detail-metrics").json() for sub_pnl_id in (2, 1)]
+
+def test_ids_are_read_in_chunks(client, statements, monkeypatch):
+    monkeypatch.setattr(batch_reads, "BATCH_READ_CHUNK_SIZE", 4)
+    ids = ",".join(str(sub_pnl_id) for sub_pnl_id in range(1, 11))
+    body = client.get("/sub-pnls/metrics", params={"ids": ids}).json()
+    assert [item["sub_pnl_id"] for item in body["items"]] == list(range(1, 11))
+    assert len([statement for statement in statements if "sub_pnl_detail_metrics" in statement]) == 3
+
+def test_batch_errors(client, monkeypatch):
+    for path in ("/pnls/metrics", "/sub-pnls/metrics"):
+        assert client.get(path, params={"ids": "1,x"}).status_code == 400
+        assert client.get(path, params={"ids": " , "}).status_code == 400
+        assert client.get(path).status_code == 422
+    monkeypatch.setattr(batch_reads, "BATCH_READ_MAX_IDS", 2)
+    assert client.get("/pnls/metrics", params={"ids": "1,2,3"}).status_code == 413
+    # Repeats count once
+    assert client.get("/pnls/metrics", params={"ids": "1,2,2"}).status_code == 200
@@ -0,0 +1,96 @@
+from sqlalchemy import delete, func, select
+import bulk_metrics
+import detail_versions
+import models
+
+METRICS = {
+    "features_shipped": 6, "total_testcases_executed": 321, "total_bugs_logged": 9,
+    "regression_bugs_found": 2, "sanity_time_avg_hours": 1.5, "automation_coverage_percent": 75,
+    "escaped_bugs": 1,
+}
+DETAIL = {**METRICS, "testcase_peer_review": 4, "api_test_time_avg_hours": 0.5}
+
+def history(db, entity_type, entity_id):
+    db.rollback()
+    model = models.MetricsHistory
+    return db.scalars(
+        select(model).where(model.entity_type == entity_type, model.entity_id == entity_id).order_by(model.id)
+    ).all()
+
+def stored_metrics(db, sub_pnl_id):
+    db.rollback()
+    return db.scalars(select(models.SubPnLMetrics).where(models.SubPnLMetrics.sub_pnl_id == sub_pnl_id)).all()
+
+def test_bulk_updates_metrics_and_detail_metrics(client, db, headers):
+    response = client.post("/metrics/bulk", headers=headers, json=[
+        {"sub_pnl_id": 1, "metrics": METRICS, "detail_metrics": DETAIL},
+        {"sub_pnl_id": 2, "detail_metrics": DETAIL},
+    ])
+    assert response.status_code == 200
+    assert response.json() == {"applied": 2, "failed": 0, "results": [
+        {"index": 0, "sub_pnl_id": 1, "status": "applied", "errors": []},
+        {"index": 1, "sub_pnl_id": 2, "status": "applied", "errors": []},
+    ]}
+
+    row, = stored_metrics(db, 1)
+    assert (row.total_testcases_executed, row.test_coverage_percent) == (321, 90.0)
+    entry, = history(db, "sub_pnl", 1)
+    assert entry.change_type == "update"
+    assert entry.previous_values["total_testcases_executed"] == 100
+    assert entry.metrics_data == METRICS
+
+    assert history(db, "sub_pnl", 2) == []
+    for sub_pnl_id in (1, 2):
+        assert detail_versions.active_rows(db, [sub_pnl_id])[sub_pnl_id].version == 2
+        entry, = history(db, "sub_pnl_detail", sub_pnl_id)
+        assert entry.change_type == "update"
+    assert client.get("/sub-pnls/2/detail-metrics").json()["total_testcases_executed"] == 321
+
+    trend = models.MetricsTrendBucket
+    assert db.scalar(select(func.count(trend.id)).where(trend.entity_type == "sub_pnl", trend.entity_id == 1)) > 0
+
+def test_bulk_inserts_metrics_for_sub_pnl_without_a_row(client, db, headers):
+    db.execute(delete(models.SubPnLMetrics).where(models.SubPnLMetrics.sub_pnl_id == 2))
+    db.commit()
+
+    response = client.post("/metrics/bulk", headers=headers, json=[{"sub_pnl_id": 2, "metrics": METRICS}])
+    assert response.json()["applied"] == 1
+
+    row, = stored_metrics(db, 2)
+    assert row.features_shipped == 6
+    entry, = history(db, "sub_pnl", 2)
+    assert entry.change_type == "create"
+    assert entry.previous_values is None
+    assert client.get("/sub-pnls/2/metrics").json()["total_testcases_executed"] == 321
+
+def test_invalid_items_are_reported_and_skipped(client, db, headers):
+    response = client.post("/metrics/bulk", headers=headers, json=[
+        {"sub_pnl_id": 1, "metrics": METRICS},
+        {"sub_pnl_id": 1, "metrics": METRICS},
+        {"sub_pnl_id": 999, "metrics": METRICS},
+        {"sub_pnl_id": 3, "metrics": {**METRICS, "features_shipped": "many"}},
+        {"sub_pnl_id": 4},
+        "not an item",
+    ])
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["applied"], body["failed"]) == (1, 5)
+    assert [(result["index"], result["sub_pnl_id"], result["status"]) for result in body["results"]] == [
+        (0, 1, "applied"), (1, 1, "error"), (2, 999, "error"), (3, 3, "error"), (4, 4, "error"), (5, None, "error"),
+    ]
+    errors = [result["errors"] for result in body["results"]]
+    assert errors[1] == ["sub_pnl_id: duplicate in this request"]
+    assert errors[2] == ["sub_pnl_id: Sub PnL not found"]
+    assert errors[3][0].startswith("metrics.features_shipped: ")
+    assert errors[4] == ["item: metrics or detail_metrics is required"]
+
+    assert stored_metrics(db, 1)[0].total_testcases_executed == 321
+    assert history(db, "sub_pnl", 3) == []
+
+def test_bulk_limits_and_auth(client, headers, monkeypatch):
+    monkeypatch.setattr(bulk_metrics, "BULK_MAX_ITEMS", 2)
+    items = [{"sub_pnl_id": sub_pnl_id, "metrics": METRICS} for sub_pnl_id in (1, 2, 3)]
+    assert client.post("/metrics/bulk", headers=headers, json=items).status_code == 413
+    assert client.post("/metrics/bulk", headers=headers, json=items[:2]).status_code == 200
+    assert client.post("/metrics/bulk", json=items[:2]).status_code == 401
+    assert client.post("/metrics/bulk", headers=headers, json={"sub_pnl_id": 1}).status_code == 422
@@ -0,0 +1,83 @@
+import asyncio
+from sqlalchemy import delete
+import cache
+import models
+from cache import ResponseCache
+
+def loader(values):
+    """load() returning the next value on each call"""
+    calls = iter(values)
+
+    async def load():
+        return next(calls)
+    return load
+
+def get(response_cache, key, load):
+    return asyncio.run(response_cache.get_or_set(key, load))
+
+def test_hits_and_misses():
+    response_cache = ResponseCache(max_entries=10, ttl_seconds=60)
+    load = loader([1, 2])
+    assert get(response_cache, "a", load) == 1
+    assert get(response_cache, "a", load) == 1
+    stats = response_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+
+def test_invalidate_drops_keys():
+    response_cache = ResponseCache(max_entries=10, ttl_seconds=60)
+    load = loader([1, 2])
+    get(response_cache, "a", load)
+    response_cache.invalidate("a", "missing")
+    assert get(response_cache, "a", load) == 2
+    assert response_cache.stats()["invalidations"] == 1
+
+def test_value_loaded_across_an_invalidation_is_not_stored():
+    response_cache = ResponseCache(max_entries=10, ttl_seconds=60)
+
+    async def racing_load():
+        # A write commits and invalidates while this read is still loading
+        response_cache.invalidate("other")
+        return "stale"
+    assert get(response_cache, "a", racing_load) == "stale"
+    assert get(response_cache, "a", loader(["fresh"])) == "fresh"
+    assert get(response_cache, "a", loader(["unused"])) == "fresh"
+
+def test_ttl_expiry(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    response_cache = ResponseCache(max_entries=10, ttl_seconds=30)
+    load = loader([1, 2])
+    get(response_cache, "a", load)
+    now[0] += 29
+    assert get(response_cache, "a", load) == 1
+    now[0] += 1
+    assert get(response_cache, "a", load) == 2
+    assert response_cache.stats()["expirations"] == 1
+
+def test_lru_eviction():
+    response_cache = ResponseCache(max_entries=2, ttl_seconds=60)
+    for key in ("a", "b"):
+        get(response_cache, key, loader([key]))
+    get(response_cache, "a", loader(["unused"]))  # "a" becomes the most recently used
+    get(response_cache, "c", loader(["c"]))
+    assert get(response_cache, "a", loader(["reloaded"])) == "a"
+    assert get(response_cache, "b", loader(["reloaded"])) == "reloaded"
+    assert response_cache.stats()["evictions"] >= 1
+
+def test_disabled_cache_stores_nothing():
+    response_cache = ResponseCache(max_entries=0, ttl_seconds=60)
+    load = loader([1, 2])
+    get(response_cache, "a", load)
+    assert get(response_cache, "a", load) == 2
+
+def test_writes_invalidate_cached_reads(client, db):
+    db.execute(delete(models.PnLMetrics).where(models.PnLMetrics.pnl_id == 3))
+    db.commit()
+    before = client.get("/pnls/3/metrics").json()["features_shipped"]
+    assert client.get("/dashboard").json()[2]["metrics"]["features_shipped"] == before
+    current = client.get("/sub-pnls/8/metrics").json()
+
+    values = {**current, "features_shipped": current["features_shipped"] + 10}
+    assert client.put("/sub-pnls/8/metrics", json=values).status_code == 200
+    assert client.get("/pnls/3/metrics").json()["features_shipped"] == before + 10
+    assert client.get("/dashboard").json()[2]["metrics"]["features_shipped"] == before + 10
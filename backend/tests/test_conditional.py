@@ -0,0 +1,37 @@
+import pytest
+
+READS = ["/dashboard", "/pnls", "/pnls/1", "/pnls/1/metrics", "/pnls/1/sub-pnls", "/sub-pnls/1",
+         "/sub-pnls/1/metrics", "/sub-pnls/1/detail-metrics", "/metrics-history"]
+
+@pytest.mark.parametrize("path", READS)
+def test_if_none_match(client, path):
+    response = client.get(path)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "no-cache"
+
+    cached = client.get(path, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["ETag"] == etag
+    assert client.get(path, headers={"If-None-Match": '"other", ' + etag}).status_code == 304
+    assert client.get(path, headers={"If-None-Match": '"other"'}).status_code == 200
+
+def test_etag_changes_with_the_data(client):
+    etag = client.get("/sub-pnls/1/metrics").headers["ETag"]
+    assert client.put("/sub-pnls/1/metrics", json={"features_shipped": 99}).status_code == 200
+    response = client.get("/sub-pnls/1/metrics", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+def test_if_modified_since(client):
+    last_modified = client.get("/pnls/1").headers["Last-Modified"]
+    assert client.get("/pnls/1", headers={"If-Modified-Since": last_modified}).status_code == 304
+    assert client.get("/pnls/1", headers={"If-Modified-Since": "Mon, 01 Jan 2001 00:00:00 GMT"}).status_code == 200
+    assert client.get("/pnls/1", headers={"If-Modified-Since": "yesterday"}).status_code == 200
+    # If-None-Match takes precedence
+    headers = {"If-Modified-Since": last_modified, "If-None-Match": '"other"'}
+    assert client.get("/pnls/1", headers=headers).status_code == 200
+
+def test_unknown_entity_is_still_404(client):
+    assert client.get("/pnls/999", headers={"If-None-Match": "*"}).status_code == 404
@@ -0,0 +1,27 @@
+from sqlalchemy import delete, func, select
+import aggregation
+import models
+from conftest import writes
+
+def test_dashboard(client, statements):
+    response = client.get("/dashboard")
+    assert response.status_code == 200
+    dashboard = response.json()
+    assert [(pnl["id"], pnl["sub_pnls_count"]) for pnl in dashboard] == [(1, 4), (2, 3), (3, 3)]
+    # Hand-entered PnL metrics are shown as they are
+    assert all(pnl["metrics"]["features_shipped"] == 15 for pnl in dashboard)
+    assert writes(statements) == []
+
+def test_dashboard_without_pnl_metrics_is_read_only(client, db, statements):
+    db.execute(delete(models.PnLMetrics).where(models.PnLMetrics.pnl_id == 2))
+    db.commit()
+    expected = aggregation.aggregate_pnl_rollups(db, [2])[2]
+    statements.clear()
+
+    pnl = client.get("/dashboard").json()[1]
+    assert pnl["metrics"]["id"] is None
+    assert pnl["metrics"]["features_shipped"] == expected["features_shipped"]
+    assert pnl["metrics"]["sanity_time_avg_hours"] == float(expected["sanity_time_avg_hours"])
+    assert writes(statements) == []
+    db.rollback()
+    assert db.scalar(select(func.count(models.PnLMetrics.id))) == 2
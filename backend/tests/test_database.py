@@ -0,0 +1,47 @@
+import pytest
+from sqlalchemy import event, text
+import database
+
+@pytest.mark.parametrize("url, expected", [
+    ("postgresql://user:secret@db/qalytics", "postgresql+asyncpg://user:secret@db/qalytics"),
+    ("postgres://db/qalytics", "postgresql+asyncpg://db/qalytics"),
+    ("postgresql+psycopg2://db/qalytics", "postgresql+asyncpg://db/qalytics"),
+    ("sqlite:///./qalytics.db", "sqlite+aiosqlite:///./qalytics.db"),
+    ("mysql://db/qalytics", "mysql://db/qalytics"),
+])
+def test_async_database_url(url, expected):
+    assert database.async_database_url(url) == expected
+
+def test_sqlite_pragmas(db):
+    assert db.scalar(text("PRAGMA journal_mode")) == "wal"
+    assert db.scalar(text("PRAGMA busy_timeout")) == database.DB_STATEMENT_TIMEOUT_MS
+
+def test_one_connection_per_request(client, headers):
+    held, peak = [0], [0]
+
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        held[0] += 1
+        peak[0] = max(peak[0], held[0])
+
+    def checkin(dbapi_connection, connection_record):
+        held[0] -= 1
+    pool_events = {"checkout": checkout, "checkin": checkin}
+    for name, listener in pool_events.items():
+        event.listen(database.async_engine.sync_engine, name, listener)
+    try:
+        # Authentication and the handler share the request's session
+        response = client.put("/sub-pnls/1/detail-metrics", json={"escaped_bugs": 1}, headers=headers)
+    finally:
+        for name, listener in pool_events.items():
+            event.remove(database.async_engine.sync_engine, name, listener)
+    assert response.status_code == 200
+    assert (peak[0], held[0]) == (1, 0)
+
+def test_stats(client):
+    client.get("/dashboard")
+    stats = client.get("/stats").json()
+    assert set(stats) == {"response_cache", "events", "auth_cache", "database_pool", "password_hashing"}
+    # Connections go back to the pool when the request ends
+    assert stats["database_pool"]["checked_out"] == 0
+    assert stats["database_pool"]["size"] == database.DB_POOL_SIZE
+    assert stats["response_cache"]["misses"] >= 1
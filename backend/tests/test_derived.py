@@ -0,0 +1,61 @@
+from decimal import Decimal
+import pytest
+from sqlalchemy import insert, select
+import derived
+import models
+
+COUNTS = ("total_testcases_executed", "total_bugs_logged", "escaped_bugs")
+
+# (executed, bugs logged, escaped bugs) -> (test_coverage_percent, testcases_per_bug, bugs_per_100_tests)
+CASES = [
+    ((None, None, None), ("0.00", "0.00", "0.00")),
+    ((0, 0, 0), ("0.00", "0.00", "0.00")),
+    ((50, 0, 3), ("0.00", "0.00", "0.00")),
+    ((0, 4, 0), ("100.00", "0.00", "0.00")),
+    ((None, 2, 1), ("66.67", "0.00", "0.00")),
+    # Clamped to the largest DECIMAL(5,2)
+    ((1000000, 1, 0), ("100.00", "999.99", "0.00")),
+    ((1, 5000, 0), ("100.00", "0.00", "999.99")),
+    # Exactly half a hundredth rounds up
+    ((1, 200, 0), ("100.00", "0.01", "999.99")),
+    ((201, 200, 0), ("100.00", "1.01", "99.50")),
+    ((20000, 1, 19999), ("0.01", "999.99", "0.01")),
+    ((3, 2, 1), ("66.67", "1.50", "66.67")),
+    # Negative counts never give a negative rate
+    ((-10, 5, -5), ("0.00", "0.00", "0.00")),
+]
+
+def values_of(counts):
+    return dict(zip(COUNTS, counts))
+
+def expected_of(rates):
+    return dict(zip(("test_coverage_percent", "testcases_per_bug", "bugs_per_100_tests"), map(Decimal, rates)))
+
+@pytest.mark.parametrize("counts, rates", CASES)
+def test_derive(counts, rates):
+    assert derived.derive(values_of(counts)) == expected_of(rates)
+
+def test_derive_columns_matches_derive():
+    columns = {name: [counts[index] for counts, _ in CASES] for index, name in enumerate(COUNTS)}
+    result = derived.derive_columns(columns)
+    for index, (counts, _) in enumerate(CASES):
+        assert {field: result[field][index] for field in derived.DERIVED_FIELDS} == derived.derive(values_of(counts))
+
+def test_sql_matches_derive(db):
+    model = models.SubPnLDetailMetrics
+    row_ids = db.scalars(insert(model).returning(model.id, sort_by_parameter_order=True), [
+        {**values_of(counts), "sub_pnl_id": 1, "version": 100 + index, "is_active": False}
+        for index, (counts, _) in enumerate(CASES)
+    ]).all()
+    expressions = derived.sql_hundredths(model)
+
+    for row_id, (counts, _) in zip(row_ids, CASES):
+        sql = db.execute(select(*expressions.values()).where(model.id == row_id)).one()
+        assert dict(zip(expressions, map(derived._as_decimal, sql))) == derived.derive(values_of(counts)), counts
+    db.rollback()
+
+def test_cross_check_after_recompute(db):
+    for model in derived.DERIVED_TABLES:
+        derived.recompute(db, model)
+    db.commit()
+    assert all(derived.cross_check(db, model) == [] for model in derived.DERIVED_TABLES)
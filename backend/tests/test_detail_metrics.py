@@ -0,0 +1,73 @@
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+import detail_versions
+import metrics_history
+import models
+
+DETAIL = {
+    "features_shipped": 9, "total_testcases_executed": 240, "total_bugs_logged": 12,
+    "testcase_peer_review": 4, "regression_bugs_found": 3, "sanity_time_avg_hours": 1.5,
+    "api_test_time_avg_hours": 0.5, "automation_coverage_percent": 80, "escaped_bugs": 1,
+}
+
+def detail_history(db, sub_pnl_id):
+    db.rollback()
+    history = models.MetricsHistory
+    return db.scalars(
+        select(history).where(history.entity_type == "sub_pnl_detail", history.entity_id == sub_pnl_id)
+        .order_by(history.id)
+    ).all()
+
+def version_count(db, sub_pnl_id):
+    db.rollback()
+    model = models.SubPnLDetailMetrics
+    return db.scalar(select(func.count(model.id)).where(model.sub_pnl_id == sub_pnl_id))
+
+def active_version(db, sub_pnl_id):
+    db.rollback()
+    return detail_versions.active_rows(db, [sub_pnl_id])[sub_pnl_id].version
+
+def test_update_writes_version_and_history(client, db, headers):
+    response = client.put("/sub-pnls/1/detail-metrics", json=DETAIL, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["total_testcases_executed"] == 240
+    assert active_version(db, 1) == 2
+
+    entry, = detail_history(db, 1)
+    assert entry.change_type == "update"
+    assert entry.previous_values["total_testcases_executed"] == 180
+    assert client.get("/sub-pnls/1/detail-metrics").json()["total_testcases_executed"] == 240
+
+def test_first_detail_metrics_are_a_create(client, db, headers):
+    db.execute(models.SubPnLDetailMetrics.__table__.delete().where(models.SubPnLDetailMetrics.sub_pnl_id == 2))
+    db.commit()
+
+    response = client.put("/sub-pnls/2/detail-metrics", json=DETAIL, headers=headers)
+    assert response.status_code == 200
+    assert active_version(db, 2) == 1
+    entry, = detail_history(db, 2)
+    assert entry.change_type == "create"
+    assert entry.previous_values is None
+
+def test_update_errors(client, headers):
+    assert client.put("/sub-pnls/999/detail-metrics", json=DETAIL, headers=headers).status_code == 404
+    assert client.put("/sub-pnls/1/detail-metrics", json=DETAIL).status_code == 401
+    assert client.put("/sub-pnls/1/detail-metrics", json={**DETAIL, "features_shipped": "many"}, headers=headers).status_code == 422
+
+def test_failed_history_write_surfaces_and_writes_nothing(client, db, headers, monkeypatch):
+    history_values = metrics_history.history_values
+
+    def without_entity_type(*args, **kwargs):
+        # entity_type is NOT NULL: the history INSERT fails at flush
+        return {**history_values(*args, **kwargs), "entity_type": None}
+    monkeypatch.setattr(metrics_history, "history_values", without_entity_type)
+    versions = version_count(db, 1)
+
+    with pytest.raises(IntegrityError):
+        client.put("/sub-pnls/1/detail-metrics", json=DETAIL, headers=headers)
+
+    assert version_count(db, 1) == versions
+    assert active_version(db, 1) == 1
+    assert detail_history(db, 1) == []
+    assert client.get("/sub-pnls/1/detail-metrics").json()["total_testcases_executed"] == 180
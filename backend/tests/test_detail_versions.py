@@ -0,0 +1,66 @@
+import json
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql
+import detail_versions
+import models
+
+def write(client, headers, sub_pnl_id, executed):
+    values = {"total_testcases_executed": executed}
+    assert client.put(f"/sub-pnls/{sub_pnl_id}/detail-metrics", json=values, headers=headers).status_code == 200
+
+def test_versions_are_paged_newest_first(client, headers):
+    for executed in (200, 300, 400):
+        write(client, headers, 1, executed)
+
+    first = client.get("/sub-pnls/1/detail-metrics/versions?limit=3")
+    assert first.status_code == 200
+    assert [(row["version"], row["is_active"]) for row in first.json()] == [(4, True), (3, False), (2, False)]
+    assert first.json()[0]["total_testcases_executed"] == 400
+
+    cursor = first.headers["X-Next-Cursor"]
+    last = client.get(f"/sub-pnls/1/detail-metrics/versions?limit=3&cursor={cursor}")
+    assert [row["version"] for row in last.json()] == [1]
+    assert "X-Next-Cursor" not in last.headers
+
+def test_versions_errors(client):
+    assert client.get("/sub-pnls/999/detail-metrics/versions").status_code == 404
+    assert client.get("/sub-pnls/1/detail-metrics/versions?cursor=latest").status_code == 400
+    assert client.get("/sub-pnls/1/detail-metrics/versions?limit=0").status_code == 422
+
+def test_export_has_only_active_versions(client, headers):
+    write(client, headers, 1, 200)
+    rows = [
+        json.loads(line)
+        for line in client.get("/export/metrics?format=ndjson&entity_type=sub_pnl_detail").text.splitlines()
+    ]
+    assert len(rows) == 10
+    assert all(row["is_active"] for row in rows)
+    assert [row["total_testcases_executed"] for row in rows if row["sub_pnl_id"] == 1] == [200]
+
+def test_append_versions(db):
+    db.execute(models.SubPnLDetailMetrics.__table__.delete().where(models.SubPnLDetailMetrics.sub_pnl_id == 2))
+    statements = []
+    execute = db.execute
+
+    def recording_execute(statement, *args, **kwargs):
+        statements.append(statement)
+        return execute(statement, *args, **kwargs)
+    db.execute = recording_execute
+
+    row_ids = detail_versions.append_versions(db, {
+        3: {"total_testcases_executed": 30, "total_bugs_logged": 3},
+        1: {"total_testcases_executed": 10, "total_bugs_logged": 0},
+        2: {"total_testcases_executed": 20, "total_bugs_logged": 4},
+    })
+    db.commit()
+
+    # Writers of the same Sub-PnLs serialize on their rows
+    assert "FOR UPDATE" in str(statements[0].compile(dialect=postgresql.dialect()))
+    model = models.SubPnLDetailMetrics
+    rows = [db.get(model, row_id) for row_id in row_ids]
+    assert [(row.sub_pnl_id, row.version, row.is_active) for row in rows] == [(3, 2, True), (1, 2, True), (2, 1, True)]
+    # Derived metrics are calculated from the values
+    assert float(rows[0].testcases_per_bug) == 10.0
+    assert db.scalar(select(func.count(model.id)).where(model.is_active)) == 10
+    assert detail_versions.active_rows(db, [1, 2, 3]) == {row.sub_pnl_id: row for row in rows}
+    assert detail_versions.append_versions(db, {}) == []
@@ -0,0 +1,87 @@
+import asyncio
+import json
+import events
+from events import EventBus
+
+async def take(stream, count):
+    frames = [await stream.__anext__() for _ in range(count)]
+    await stream.aclose()
+    return frames
+
+def frames_after_publishing(bus, topics, publish, count, last_event_id=None, heartbeat_seconds=60):
+    """Subscribe, run ``publish(bus)``, and collect ``count`` frames after the retry hint"""
+    async def run():
+        stream = bus.stream(topics, last_event_id, heartbeat_seconds)
+        assert await stream.__anext__() == "retry: 3000\n\n"
+        publish(bus)
+        return await take(stream, count)
+    return asyncio.run(run())
+
+def test_subscribers_get_events_of_their_topics():
+    def publish(bus):
+        bus.publish("metrics", {"entity_id": 2}, ["pnl:2"])
+        bus.publish("metrics", {"entity_id": 1}, ["pnl:1", "sub_pnl:4"])
+    bus = EventBus()
+    frame, = frames_after_publishing(bus, ["sub_pnl:4"], publish, 1)
+    assert frame == 'id: 2\nevent: metrics\ndata: {"entity_id": 1}\n\n'
+    assert len(frames_after_publishing(EventBus(), [], publish, 2)) == 2
+    assert bus.stats() == {"published": 2, "delivered": 1, "dropped_subscribers": 0, "subscribers": 0, "buffered": 2}
+
+def test_reconnect_replays_buffered_events():
+    bus = EventBus()
+    for pnl_id in (1, 2, 1):
+        bus.publish("refresh", {"pnl_ids": [pnl_id]}, [events.pnl_topic(pnl_id)])
+    frames = frames_after_publishing(bus, ["pnl:1"], lambda bus: bus.publish("refresh", {}, ["pnl:1"]), 2, last_event_id=1)
+    assert [frame.split("\n")[0] for frame in frames] == ["id: 3", "id: 4"]
+
+def test_reconnect_after_buffer_loss_resets():
+    bus = EventBus(replay_size=2)
+    for _ in range(5):
+        bus.publish("refresh", {}, ["pnl:1"])
+    frames = frames_after_publishing(bus, ["pnl:1"], lambda bus: bus.publish("refresh", {}, ["pnl:1"]), 2, last_event_id=1)
+    assert frames[0] == "event: reset\ndata: {}\n\n"
+    assert frames[1].startswith("id: 6\n")
+    # An id from a previous process is unknown too
+    frames = frames_after_publishing(EventBus(), [], lambda bus: None, 1, last_event_id=50)
+    assert frames == ["event: reset\ndata: {}\n\n"]
+
+def test_idle_stream_sends_heartbeats():
+    frames = frames_after_publishing(EventBus(), [], lambda bus: None, 2, heartbeat_seconds=0.01)
+    assert frames == [": heartbeat\n\n"] * 2
+
+def test_slow_subscriber_is_dropped_after_draining(monkeypatch):
+    monkeypatch.setattr(events, "EVENTS_QUEUE_SIZE", 2)
+    bus = EventBus()
+
+    async def run():
+        stream = bus.stream([])
+        await stream.__anext__()
+        for _ in range(4):
+            bus.publish("refresh", {}, ["pnl:1"])
+        return [frame async for frame in stream]
+    frames = asyncio.run(run())
+    assert [frame.split("\n")[0] for frame in frames] == ["id: 1", "id: 2"]
+    stats = bus.stats()
+    assert (stats["delivered"], stats["dropped_subscribers"], stats["subscribers"]) == (2, 1, 0)
+
+def test_writes_publish_events(client, headers):
+    bus = events.event_bus
+    published = bus.stats()["published"]
+    body = {
+        "features_shipped": 6, "total_testcases_executed": 321, "total_bugs_logged": 9,
+        "regression_bugs_found": 2, "sanity_time_avg_hours": 1.5, "automation_coverage_percent": 75,
+        "escaped_bugs": 1,
+    }
+    assert client.put("/sub-pnls/1/metrics", json=body).status_code == 200
+    assert client.post("/metrics/bulk", headers=headers, json=[{"sub_pnl_id": 2, "metrics": body}]).status_code == 200
+
+    new_events = list(bus._recent)[published - bus.stats()["published"]:]
+    by_type = {}
+    for _, event_type, data, topics in new_events:
+        by_type.setdefault(event_type, []).append((json.loads(data), topics))
+    sub_pnl_event = next(data for data, topics in by_type["metrics"] if data["entity_type"] == "sub_pnl")
+    assert (sub_pnl_event["entity_id"], sub_pnl_event["metrics"]["total_testcases_executed"]) == (1, 321)
+    (refresh, topics), = by_type["refresh"]
+    assert refresh == {"pnl_ids": [1], "sub_pnl_ids": [2]}
+    assert topics == {"pnl:1", "sub_pnl:2"}
+    assert client.get("/stats").json()["events"]["published"] == bus.stats()["published"]
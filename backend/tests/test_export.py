@@ -0,0 +1,72 @@
+import csv
+import io
+import json
+import pytest
+from sqlalchemy import select
+import export
+import models
+
+def write_history(client, count=7):
+    for features in range(1, count + 1):
+        sub_pnl_id = 1 + features % 2
+        values = {"features_shipped": features, "total_testcases_executed": 10 * features}
+        assert client.put(f"/sub-pnls/{sub_pnl_id}/metrics", json=values).status_code == 200
+
+def stored_history(db, **filters):
+    db.rollback()
+    history = models.MetricsHistory
+    stmt = select(history).order_by(history.id)
+    for name, value in filters.items():
+        stmt = stmt.where(getattr(history, name) == value)
+    return [(entry.id, entry.entity_id, entry.metrics_data) for entry in db.scalars(stmt)]
+
+def test_csv_round_trip(client, db):
+    write_history(client)
+    response = client.get("/export/metrics-history?format=csv")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert 'filename="metrics-history.csv"' in response.headers["content-disposition"]
+
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [(int(row["id"]), int(row["entity_id"]), json.loads(row["metrics_data"])) for row in rows] == stored_history(db)
+
+def test_ndjson_round_trip_and_filters(client, db):
+    write_history(client)
+    response = client.get("/export/metrics-history?format=ndjson&entity_type=sub_pnl&entity_id=2")
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [(row["id"], row["entity_id"], row["metrics_data"]) for row in rows] == stored_history(db, entity_id=2)
+    assert len(rows) == 4
+
+def test_parquet_round_trip_one_row_group_per_batch(client, db, monkeypatch):
+    pq = pytest.importorskip("pyarrow.parquet")  # Parquet export is optional
+    monkeypatch.setattr(export, "EXPORT_BATCH_SIZE", 3)
+    write_history(client)
+    response = client.get("/export/metrics-history?format=parquet")
+    assert response.status_code == 200
+
+    parquet = pq.ParquetFile(io.BytesIO(response.content))
+    assert [parquet.metadata.row_group(index).num_rows for index in range(parquet.num_row_groups)] == [3, 3, 1]
+    rows = parquet.read().to_pylist()
+    assert [(row["id"], row["entity_id"], json.loads(row["metrics_data"])) for row in rows] == stored_history(db)
+    assert rows[0]["created_at"].tzinfo is not None
+
+def test_zero_entity_id_filters(client):
+    write_history(client)
+    assert client.get("/export/metrics-history?format=ndjson&entity_id=0").text == ""
+    assert client.get("/export/metrics?format=ndjson&entity_id=0").text == ""
+
+def test_current_metrics_export(client):
+    rows = [json.loads(line) for line in client.get("/export/metrics?format=ndjson&entity_type=pnl").text.splitlines()]
+    assert [row["pnl_id"] for row in rows] == [1, 2, 3]
+    rows = list(csv.DictReader(io.StringIO(client.get("/export/metrics?entity_id=4").text)))
+    assert [row["sub_pnl_id"] for row in rows] == ["4"]
+
+@pytest.mark.parametrize("query", ["format=xml", "entity_type=user"])
+def test_export_bad_parameters(client, query):
+    assert client.get(f"/export/metrics?{query}").status_code == 422
+
+def test_parquet_without_pyarrow(client, monkeypatch):
+    monkeypatch.setattr(export, "pa", None)
+    assert client.get("/export/metrics-history?format=parquet").status_code == 501
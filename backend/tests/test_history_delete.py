@@ -0,0 +1,82 @@
+from sqlalchemy import func, select
+import detail_versions
+import models
+
+def history_ids(db, entity_type, entity_id):
+    db.rollback()
+    history = models.MetricsHistory
+    return db.scalars(
+        select(history.id).where(history.entity_type == entity_type, history.entity_id == entity_id)
+        .order_by(history.created_at, history.id)
+    ).all()
+
+def sub_pnl_features(db, sub_pnl_id):
+    db.rollback()
+    return db.scalar(select(models.SubPnLMetrics.features_shipped).where(models.SubPnLMetrics.sub_pnl_id == sub_pnl_id))
+
+def detail_executed(db, sub_pnl_id):
+    db.rollback()
+    return detail_versions.active_rows(db, [sub_pnl_id])[sub_pnl_id].total_testcases_executed
+
+def delete(client, history_id):
+    response = client.delete(f"/metrics-history/{history_id}")
+    assert response.status_code == 200
+    return response.json()["restored_latest"]
+
+def test_sub_pnl_delete_latest_then_only_entry(client, db):
+    for features in (21, 34):
+        assert client.put("/sub-pnls/2/metrics", json={"features_shipped": features}).status_code == 200
+    first, latest = history_ids(db, "sub_pnl", 2)
+
+    assert delete(client, latest) is True
+    assert sub_pnl_features(db, 2) == 21
+    assert delete(client, first) is True
+    assert sub_pnl_features(db, 2) == 0
+    assert history_ids(db, "sub_pnl", 2) == []
+
+def test_sub_pnl_delete_older_entry_keeps_current_metrics(client, db):
+    for features in (21, 34):
+        assert client.put("/sub-pnls/2/metrics", json={"features_shipped": features}).status_code == 200
+    first, latest = history_ids(db, "sub_pnl", 2)
+
+    assert delete(client, first) is False
+    assert sub_pnl_features(db, 2) == 34
+    assert history_ids(db, "sub_pnl", 2) == [latest]
+
+def test_detail_delete_latest_then_only_entry(client, db, headers):
+    for executed in (240, 360):
+        values = {"total_testcases_executed": executed}
+        assert client.put("/sub-pnls/3/detail-metrics", json=values, headers=headers).status_code == 200
+    first, latest = history_ids(db, "sub_pnl_detail", 3)
+
+    # Each restore is a new version; exactly one stays active
+    assert delete(client, latest) is True
+    assert detail_executed(db, 3) == 240
+    assert delete(client, first) is True
+    assert detail_executed(db, 3) == 0
+    db.rollback()
+    model = models.SubPnLDetailMetrics
+    assert db.scalar(select(func.count(model.id)).where(model.sub_pnl_id == 3)) == 5
+    assert db.scalar(select(func.count(model.id)).where(model.sub_pnl_id == 3, model.is_active)) == 1
+
+def test_detail_delete_older_entry_keeps_current_version(client, db, headers):
+    for executed in (240, 360):
+        values = {"total_testcases_executed": executed}
+        assert client.put("/sub-pnls/3/detail-metrics", json=values, headers=headers).status_code == 200
+    first, _ = history_ids(db, "sub_pnl_detail", 3)
+
+    assert delete(client, first) is False
+    assert detail_executed(db, 3) == 360
+
+def test_pnl_entries_cannot_be_deleted(client, db, headers):
+    assert client.put("/pnls/1/metrics", json={"features_shipped": 40}, headers=headers).status_code == 200
+    entry, = history_ids(db, "pnl", 1)
+
+    response = client.delete(f"/metrics-history/{entry}")
+    assert response.status_code == 400
+    assert history_ids(db, "pnl", 1) == [entry]
+    db.rollback()
+    assert db.scalar(select(models.PnLMetrics.features_shipped).where(models.PnLMetrics.pnl_id == 1)) == 40
+
+def test_delete_unknown_entry(client):
+    assert client.delete("/metrics-history/999999").status_code == 404
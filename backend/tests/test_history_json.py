@@ -0,0 +1,40 @@
+from sqlalchemy import select, text
+from sqlalchemy.dialects import sqlite
+import metrics_history
+import models
+
+def change(client, sub_pnl_id, field, delta):
+    """Update one field of a Sub-PnL's metrics, keeping the others"""
+    current = client.get(f"/sub-pnls/{sub_pnl_id}/metrics").json()
+    response = client.put(f"/sub-pnls/{sub_pnl_id}/metrics", json={**current, field: current[field] + delta})
+    assert response.status_code == 200
+    return current[field]
+
+def test_snapshots_are_stored_and_served_as_json(client, db):
+    before = change(client, 1, "sanity_time_avg_hours", 0.25)
+    entry, = client.get("/metrics-history", params={"entity_type": "sub_pnl", "entity_id": 1}).json()
+    assert entry["metrics_data"]["sanity_time_avg_hours"] == before + 0.25
+    # Only the changed fields, with the values they replaced
+    assert entry["previous_values"] == {"sanity_time_avg_hours": before}
+    assert db.scalar(text("SELECT json_type(metrics_data) FROM metrics_history")) == "object"
+
+def test_changed_field_filter(client):
+    change(client, 1, "features_shipped", 1)
+    change(client, 1, "escaped_bugs", 1)
+    first, second = sorted(entry["id"] for entry in client.get("/metrics-history").json())
+
+    def changed(field):
+        response = client.get("/metrics-history", params={"changed_field": field})
+        assert response.status_code == 200
+        return [entry["id"] for entry in response.json()]
+    assert changed("features_shipped") == [first]
+    assert changed("escaped_bugs") == [second]
+    assert changed("api_test_time_avg_hours") == []
+    assert client.get("/metrics-history", params={"changed_field": "password"}).status_code == 400
+
+def test_changed_field_filter_uses_the_partial_index(db):
+    history = models.MetricsHistory
+    stmt = select(history.id).where(metrics_history.changed_field_filter("sqlite", "escaped_bugs"))
+    compiled = stmt.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True})
+    plan = " ".join(row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+    assert "ix_metrics_history_changed_escaped_bugs" in plan
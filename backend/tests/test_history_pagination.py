@@ -0,0 +1,53 @@
+from datetime import datetime
+from sqlalchemy import select, text
+from sqlalchemy.dialects import sqlite
+import models
+import pagination
+
+def write_history(client, count):
+    for features in range(1, count + 1):
+        assert client.put(f"/sub-pnls/{1 + features % 2}/metrics", json={"features_shipped": features}).status_code == 200
+
+def all_pages(client, path, limit):
+    ids, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get(path, params=params)
+        assert response.status_code == 200
+        ids += [entry["id"] for entry in response.json()]
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return ids, pages
+
+def test_pages_cover_every_entry_once_newest_first(client):
+    # Several entries share a created_at second: the id breaks the tie
+    write_history(client, 7)
+    ids, pages = all_pages(client, "/metrics-history", 3)
+    assert ids == sorted(ids, reverse=True)
+    assert len(ids) == 7
+    assert pages == 3
+
+def test_sub_pnl_history_pages(client, headers):
+    write_history(client, 6)
+    assert client.put("/sub-pnls/1/detail-metrics", json={"escaped_bugs": 4}, headers=headers).status_code == 200
+    ids, _ = all_pages(client, "/sub-pnls/1/metrics-history", 2)
+    assert len(ids) == 4
+
+def test_pagination_errors(client):
+    assert client.get("/metrics-history", params={"cursor": "not-a-cursor"}).status_code == 400
+    assert client.get("/metrics-history", params={"limit": 0}).status_code == 422
+    assert client.get("/metrics-history", params={"limit": pagination.MAX_PAGE_SIZE + 1}).status_code == 422
+    assert client.get("/sub-pnls/999/metrics-history").status_code == 404
+    assert client.get("/metrics-history/999999").status_code == 404
+
+def test_entity_page_uses_the_composite_index(db):
+    history = models.MetricsHistory
+    stmt = pagination.history_page_statement(
+        select(history).where(history.entity_type == "sub_pnl", history.entity_id == 1),
+        pagination.encode_cursor(datetime(2025, 1, 1), 10), 50
+    )
+    compiled = stmt.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True})
+    plan = " ".join(row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+    assert "ix_metrics_history_entity_created" in plan
+    assert "TEMP B-TREE" not in plan
@@ -0,0 +1,105 @@
+import json
+from sqlalchemy import select
+import detail_versions
+import ingest
+import models
+
+def snapshot(day, executed, bugs, sub_pnl_id=1):
+    return {
+        "sub_pnl_id": sub_pnl_id, "recorded_at": f"2024-01-{day:02d}T09:00:00Z",
+        "total_testcases_executed": executed, "total_bugs_logged": bugs,
+    }
+
+def csv_lines(snapshots):
+    fields = list(snapshots[0])
+    return [",".join(fields)] + [",".join(str(row[field]) for field in fields) for row in snapshots]
+
+def chain(db, sub_pnl_id=1):
+    """(executed, previously executed, change type) of a Sub-PnL's detail history, oldest first"""
+    db.rollback()
+    history = models.MetricsHistory
+    return [
+        (
+            entry.metrics_data["total_testcases_executed"],
+            (entry.previous_values or {}).get("total_testcases_executed"),
+            entry.change_type,
+        )
+        for entry in db.scalars(
+            select(history).where(history.entity_type == "sub_pnl_detail", history.entity_id == sub_pnl_id)
+            .order_by(history.created_at, history.id)
+        )
+    ]
+
+def active_executed(db, sub_pnl_id=1):
+    db.rollback()
+    return detail_versions.active_rows(db, [sub_pnl_id])[sub_pnl_id].total_testcases_executed
+
+def ingest_rows(db, data_format, lines, batch_size):
+    ingestion = ingest.DetailMetricsIngestion(data_format, batch_size=batch_size)
+    for line in lines:
+        if ingestion.feed(line):
+            ingestion.flush(db)
+    return ingestion.finish(db)
+
+def test_ndjson_out_of_order_chains_by_recorded_at(client, db, headers):
+    rows = [snapshot(3, 300, 30), snapshot(1, 100, 10), snapshot(2, 200, 20), snapshot(1, 50, 5, sub_pnl_id=2)]
+    response = client.post(
+        "/ingest/detail-metrics?format=ndjson", headers=headers,
+        content="\n".join(json.dumps(row) for row in rows)
+    )
+    assert response.status_code == 200
+    assert response.json() == {"rows": 4, "written": 4, "failed": 0, "current_updated": 2, "errors": []}
+
+    assert chain(db) == [
+        (100, 180, "update"),
+        (200, 100, "update"),
+        (300, 200, "update"),
+    ]
+    assert active_executed(db) == 300
+
+def test_csv_out_of_order_across_batches(db):
+    lines = csv_lines([snapshot(2, 200, 20), snapshot(4, 400, 40), snapshot(1, 100, 10), snapshot(3, 300, 30)])
+    result = ingest_rows(db, "csv", lines, batch_size=2)
+    assert (result["written"], result["current_updated"]) == (4, 1)
+
+    assert chain(db) == [
+        (100, 180, "update"),
+        (200, 100, "update"),
+        (300, 200, "update"),
+        (400, 300, "update"),
+    ]
+    assert active_executed(db) == 400
+
+def test_back_dated_snapshot_before_existing_history(client, db, headers):
+    current = {"total_testcases_executed": 240, "total_bugs_logged": 12}
+    assert client.put("/sub-pnls/1/detail-metrics", json=current, headers=headers).status_code == 200
+
+    response = client.post(
+        "/ingest/detail-metrics?format=ndjson", headers=headers, content=json.dumps(snapshot(1, 100, 10))
+    )
+    assert response.json()["current_updated"] == 0
+
+    # The later entry now records what it replaced in time: the back-dated snapshot
+    assert chain(db) == [(100, 180, "update"), (240, 100, "update")]
+    assert active_executed(db) == 240
+
+def test_first_snapshot_of_sub_pnl_without_metrics_is_a_create(db):
+    db.execute(models.SubPnLDetailMetrics.__table__.delete().where(models.SubPnLDetailMetrics.sub_pnl_id == 1))
+    db.commit()
+    lines = [json.dumps(row) for row in (snapshot(2, 200, 20), snapshot(1, 100, 10))]
+    ingest_rows(db, "ndjson", lines, batch_size=1)
+
+    assert chain(db) == [
+        (100, None, "create"),
+        (200, 100, "update"),
+    ]
+
+def test_ingest_errors(client, headers):
+    lines = [json.dumps(snapshot(1, 100, 10, sub_pnl_id=999)), "{not json", json.dumps(snapshot(1, 100, 10))]
+    result = client.post("/ingest/detail-metrics?format=ndjson", headers=headers, content="\n".join(lines)).json()
+    assert (result["rows"], result["written"], result["failed"]) == (3, 1, 2)
+    assert result["errors"][0].startswith("line 2:")
+    assert "Sub PnL 999 not found" in result["errors"][1]
+
+    assert client.post("/ingest/detail-metrics?format=xml", headers=headers, content="").status_code == 422
+    assert client.post("/ingest/detail-metrics", content="").status_code == 401
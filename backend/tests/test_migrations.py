@@ -0,0 +1,91 @@
+import importlib.util
+import json
+import sqlite3
+from pathlib import Path
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+import rollups
+
+MIGRATIONS = sorted((Path(__file__).parents[1] / "migrations").glob("0*.py"))
+BASELINE_SCHEMA = Path(__file__).parent / "fixtures" / "baseline_schema.sql"
+
+def load_migration(path):
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def seed(conn):
+    """Baseline data: 3 PnLs (one with hand-entered metrics), 4 Sub-PnLs, one duplicate metrics row, text history"""
+    conn.execute("INSERT INTO users (id, email, password_hash, role) VALUES (1, 'admin@example.com', 'x', 'admin')")
+    conn.executemany("INSERT INTO pnls (id, name) VALUES (?, ?)", [(1, "P1"), (2, "P2"), (3, "P3")])
+    conn.execute("INSERT INTO pnl_metrics (pnl_id, features_shipped, total_testcases_executed) VALUES (1, 99, 99)")
+    for sub_pnl_id, pnl_id in ((1, 1), (2, 1), (3, 2), (4, 2)):
+        conn.execute("INSERT INTO sub_pnls (id, pnl_id, name) VALUES (?, ?, ?)", (sub_pnl_id, pnl_id, f"S{sub_pnl_id}"))
+        conn.execute(
+            "INSERT INTO sub_pnl_metrics (sub_pnl_id, features_shipped, total_testcases_executed, total_bugs_logged,"
+            " regression_bugs_found, escaped_bugs, sanity_time_avg_hours, automation_coverage_percent)"
+            " VALUES (?, ?, ?, ?, 1, 1, 2.5, ?)",
+            (sub_pnl_id, sub_pnl_id, 100 * sub_pnl_id, 5 * sub_pnl_id, 50 + sub_pnl_id)
+        )
+        conn.execute(
+            "INSERT INTO sub_pnl_detail_metrics (sub_pnl_id, total_testcases_executed, version, is_active) VALUES (?, ?, 1, 1)",
+            (sub_pnl_id, 10 * sub_pnl_id)
+        )
+    # Reads only ever used the first metrics row of a Sub-PnL
+    conn.execute("INSERT INTO sub_pnl_metrics (sub_pnl_id, features_shipped, total_testcases_executed) VALUES (1, 1000, 1000)")
+    conn.execute("INSERT INTO sub_pnl_detail_metrics (sub_pnl_id, total_testcases_executed, version, is_active) VALUES (1, 1000, 1, 1)")
+    for month, (entity_type, entity_id) in enumerate((("sub_pnl", 1), ("sub_pnl_detail", 1), ("sub_pnl_detail", 2), ("sub_pnl", 1)), 1):
+        conn.execute(
+            "INSERT INTO metrics_history (entity_type, entity_id, metrics_data, change_type, changed_by, previous_values, created_at)"
+            " VALUES (?, ?, ?, 'update', 1, ?, ?)",
+            (entity_type, entity_id, json.dumps({"total_testcases_executed": 100 + month, "sanity_time_avg_hours": 2.5}),
+             json.dumps({"total_testcases_executed": 90}), f"2025-0{month}-10 12:00:00")
+        )
+
+@pytest.fixture
+def baseline_engine(tmp_path):
+    path = tmp_path / "baseline.db"
+    with sqlite3.connect(path) as conn:
+        conn.executescript(BASELINE_SCHEMA.read_text())
+        seed(conn)
+    engine = create_engine(f"sqlite:///{path}")
+    yield engine
+    engine.dispose()
+
+def test_migrations_upgrade_a_baseline_database(baseline_engine):
+    for path in MIGRATIONS:
+        load_migration(path).upgrade(baseline_engine)
+    assert [path.stem[:3] for path in MIGRATIONS] == [f"{number:03d}" for number in range(1, 9)]
+
+    with baseline_engine.connect() as conn:
+        assert conn.execute(text(
+            "SELECT pnl_id, features_shipped, total_testcases_executed, total_bugs_logged, metrics_count"
+            " FROM pnl_rollups ORDER BY pnl_id"
+        )).all() == [(1, 3, 300, 15, 2), (2, 7, 700, 35, 2), (3, 0, 0, 0, 0)]
+
+        assert conn.execute(text(
+            "SELECT count(DISTINCT entity_type || entity_id || bucket) FROM metrics_trend_buckets"
+        )).scalar() == 9
+
+        # Metrics rows point at the newest history entry they were written with
+        assert conn.execute(text(
+            "SELECT current_history_id FROM sub_pnl_metrics WHERE sub_pnl_id = 1 ORDER BY id LIMIT 1"
+        )).scalar() == 4
+        # The row reads used becomes the active, newest version
+        assert conn.execute(text(
+            "SELECT sub_pnl_id, version, is_active, total_testcases_executed, current_history_id"
+            " FROM sub_pnl_detail_metrics WHERE sub_pnl_id IN (1, 2) ORDER BY sub_pnl_id, version"
+        )).all() == [(1, 1, 0, 1000, 2), (1, 2, 1, 10, 2), (2, 1, 1, 20, 3)]
+
+        indexes = set(conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars())
+    assert {
+        "ix_metrics_history_entity_created", "ix_metrics_history_changed_features_shipped",
+        "ix_metrics_trend_buckets_key", "ix_refresh_tokens_family_id",
+        "uq_sub_pnl_detail_metrics_active", "uq_sub_pnl_detail_metrics_version",
+    } <= indexes
+
+    # The live models work on the migrated schema
+    with Session(baseline_engine) as db:
+        assert rollups.recompute_rollups(db, repair=False) == []
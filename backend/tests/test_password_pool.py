@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import pytest
+from fastapi import HTTPException
+import app as app_module
+from password_pool import PasswordPool
+
+def blocked_pool(workers, queue_size):
+    """A pool, an event that releases it and a job that holds a worker until then"""
+    release = threading.Event()
+    return PasswordPool(workers=workers, queue_size=queue_size), release, lambda: release.wait(5)
+
+def test_slot_released_when_the_job_fails():
+    pool = PasswordPool(workers=1, queue_size=0)
+
+    def fail():
+        raise ValueError("bad hash")
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            await pool.run(fail)
+        # The single slot is free again
+        assert await pool.run(lambda: "ok") == "ok"
+    asyncio.run(scenario())
+    stats = pool.stats()
+    assert (stats["failed"], stats["completed"], stats["running"], stats["queue_depth"]) == (1, 1, 0, 0)
+
+def test_full_pool_rejects_with_429():
+    pool, release, blocking = blocked_pool(workers=1, queue_size=1)
+
+    async def scenario():
+        running = asyncio.ensure_future(pool.run(blocking))
+        queued = asyncio.ensure_future(pool.run(lambda: "queued"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(HTTPException) as rejected:
+            await pool.run(lambda: "rejected")
+        assert rejected.value.status_code == 429
+        assert rejected.value.headers == {"Retry-After": "1"}
+        release.set()
+        assert await running is True
+        assert await queued == "queued"
+        assert await pool.run(lambda: "after") == "after"
+    asyncio.run(scenario())
+    assert pool.stats()["rejected"] == 1
+
+def test_cancelled_request_keeps_its_slot_until_the_hash_finishes():
+    pool, release, blocking = blocked_pool(workers=1, queue_size=0)
+
+    async def scenario():
+        request = asyncio.ensure_future(pool.run(blocking))
+        await asyncio.sleep(0.05)
+        request.cancel()
+        await asyncio.sleep(0)
+        # bcrypt is still running for the cancelled request
+        with pytest.raises(HTTPException):
+            await pool.run(lambda: "too soon")
+        release.set()
+        for _ in range(100):
+            if pool.stats()["running"] == 0 and pool.stats()["completed"] == 1:
+                break
+            await asyncio.sleep(0.01)
+        assert await pool.run(lambda: "ok") == "ok"
+    asyncio.run(scenario())
+
+def test_signup_and_login(client):
+    user = {"email": "new@qalytics.com", "password": "secret123", "role": "viewer"}
+    assert client.post("/auth/signup", json=user).status_code == 200
+    assert client.post("/auth/signup", json=user).status_code == 400
+    login = {"email": user["email"], "password": user["password"]}
+    assert client.post("/auth/login", json=login).status_code == 200
+    assert client.post("/auth/login", json={**login, "password": "wrong"}).status_code == 400
+    assert client.get("/stats").json()["password_hashing"]["completed"] >= 3
+
+def test_login_under_backpressure(client, monkeypatch):
+    pool = PasswordPool(workers=1, queue_size=0)
+    pool._pending = 1  # Every slot taken
+    monkeypatch.setattr(app_module, "password_pool", pool)
+    response = client.post("/auth/login", json={"email": "test@qalytics.com", "password": "password123"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
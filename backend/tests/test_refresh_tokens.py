@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, update
+import models
+import refresh_tokens
+from timeutil import as_utc, naive_utc
+
+def refresh(client, token):
+    return client.post("/auth/refresh", json={"refresh_token": token})
+
+def family_tokens(db, token):
+    db.rollback()
+    token_model = models.RefreshToken
+    family_id = select(token_model.family_id).where(token_model.token_hash == refresh_tokens.token_digest(token))
+    return db.scalars(select(token_model).where(token_model.family_id == family_id.scalar_subquery())).all()
+
+def authorized(client, access_token):
+    # Logging out without a refresh token only needs a valid access token
+    return client.post("/auth/logout", headers={"Authorization": f"Bearer {access_token}"}).status_code == 200
+
+def test_as_utc():
+    naive = datetime(2024, 3, 1, 12, 30)
+    plus_two = datetime(2024, 3, 1, 14, 30, tzinfo=timezone(timedelta(hours=2)))
+    assert as_utc(naive) == datetime(2024, 3, 1, 12, 30, tzinfo=timezone.utc)
+    assert as_utc(plus_two).tzinfo == timezone.utc
+    assert as_utc(plus_two) == as_utc(naive)
+    assert naive_utc(plus_two) == naive
+    assert naive_utc(None) is None
+
+def test_rotate_once(client, tokens):
+    response = refresh(client, tokens["refresh_token"])
+    assert response.status_code == 200
+    rotated = response.json()
+    assert rotated["refresh_token"] != tokens["refresh_token"]
+    assert authorized(client, rotated["access_token"])
+
+    # The new token rotates in turn
+    assert refresh(client, rotated["refresh_token"]).status_code == 200
+
+def test_replaying_a_rotated_token_revokes_the_login(client, db, tokens):
+    rotated = refresh(client, tokens["refresh_token"]).json()["refresh_token"]
+
+    assert refresh(client, tokens["refresh_token"]).status_code == 401
+    family = family_tokens(db, rotated)
+    assert len(family) == 2
+    assert all(token.revoked_at is not None for token in family)
+    # The token issued after the leaked one is no longer good either
+    assert refresh(client, rotated).status_code == 401
+
+def test_expired_token(client, db, tokens):
+    db.execute(update(models.RefreshToken).values(expires_at=naive_utc(datetime.now(timezone.utc) - timedelta(minutes=1))))
+    db.commit()
+    assert refresh(client, tokens["refresh_token"]).status_code == 401
+
+def test_unknown_token(client):
+    assert refresh(client, "not-a-token").status_code == 401
+
+def test_logout_revokes_both_tokens(client, tokens, headers):
+    assert client.post("/auth/logout", json={"refresh_token": tokens["refresh_token"]}, headers=headers).status_code == 200
+    assert refresh(client, tokens["refresh_token"]).status_code == 401
+    assert not authorized(client, tokens["access_token"])
@@ -0,0 +1,94 @@
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import List, Optional
+import pytest
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Response
+from fastapi.exceptions import ResponseValidationError
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+import responses
+import schemas
+
+class Item(BaseModel):
+    id: int
+    name: str
+    price: float
+    note: Optional[str] = None
+    created_at: datetime
+
+ROW = SimpleNamespace(id=1, name="a", price=Decimal("2.50"), note=None, created_at=datetime(2024, 5, 1, 12), extra="x")
+
+def forbid():
+    raise HTTPException(status_code=403, detail="Forbidden")
+
+def build(route_class, **app_options):
+    app = FastAPI(**app_options)
+    router = APIRouter(route_class=route_class)
+
+    @router.get("/items", response_model=List[Item])
+    async def items():
+        return [ROW]
+
+    @router.get("/sync", response_model=Item)
+    def sync_item():
+        return ROW
+
+    @router.get("/headers", response_model=Item, status_code=201)
+    async def with_headers(response: Response):
+        response.headers["X-Test"] = "1"
+        return ROW
+
+    @router.get("/not-modified", response_model=Item)
+    async def not_modified():
+        return Response(status_code=304)
+
+    @router.get("/invalid", response_model=Item)
+    async def invalid():
+        return {"id": "not a number"}
+
+    @router.get("/without-none", response_model=Item, response_model_exclude_none=True)
+    async def without_none():
+        return ROW
+
+    @router.get("/guarded", response_model=Item, dependencies=[Depends(forbid)])
+    async def guarded():
+        return ROW
+
+    app.include_router(router)
+    return TestClient(app)
+
+@pytest.fixture
+def fast():
+    return build(responses.FastJSONRoute, default_response_class=responses.FastJSONResponse)
+
+@pytest.fixture
+def stock():
+    return build(APIRoute)
+
+@pytest.mark.parametrize("path", ["/items", "/sync", "/headers", "/without-none"])
+def test_same_json_as_fastapi(fast, stock, path):
+    expected = stock.get(path)
+    response = fast.get(path)
+    assert response.status_code == expected.status_code
+    assert response.json() == expected.json()
+    assert response.headers["content-type"] == "application/json"
+
+def test_response_headers_and_status_are_kept(fast):
+    response = fast.get("/headers")
+    assert (response.status_code, response.headers["X-Test"]) == (201, "1")
+    assert fast.get("/not-modified").status_code == 304
+
+def test_route_dependencies_still_run(fast):
+    assert fast.get("/guarded").status_code == 403
+
+def test_invalid_response_raises(fast):
+    with pytest.raises(ResponseValidationError):
+        fast.get("/invalid")
+
+def test_app_responses_match_their_models(client):
+    response = client.get("/dashboard")
+    assert response.headers["content-type"] == "application/json"
+    dashboard = [schemas.PnLWithMetrics.model_validate(item) for item in response.json()]
+    assert response.json() == [item.model_dump(mode="json") for item in dashboard]
@@ -0,0 +1,110 @@
+from decimal import Decimal
+import pytest
+from sqlalchemy import func, select
+import aggregation
+import models
+import rollups
+
+CENT = Decimal("0.01")
+
+def _cents(value) -> Decimal:
+    return Decimal(str(value or 0)).quantize(CENT)
+
+def assert_rollups_match(db):
+    """Every stored rollup equals rollup_from_totals over a full re-aggregation"""
+    db.rollback()
+    expected = aggregation.aggregate_pnl_rollups(db)
+    stored_rollups = db.scalars(select(models.PnLRollup)).all()
+    assert stored_rollups
+    for rollup in stored_rollups:
+        stored = rollups.rollup_values(rollup)
+        for field in aggregation.ROLLUP_FIELDS:
+            assert _cents(stored[field]) == _cents(expected[rollup.pnl_id][field]), (rollup.pnl_id, field)
+    # Raw totals and counts too; rollups not built yet are not drift here
+    assert [drift for drift in rollups.recompute_rollups(db, repair=False) if drift["stored"] is not None] == []
+
+def metrics(**values):
+    return {
+        "features_shipped": 0, "total_testcases_executed": 0, "total_bugs_logged": 0,
+        "regression_bugs_found": 0, "sanity_time_avg_hours": 0, "automation_coverage_percent": 0,
+        "escaped_bugs": 0, **values,
+    }
+
+def history_ids(db, entity_type, entity_id):
+    db.rollback()
+    history = models.MetricsHistory
+    return db.scalars(
+        select(history.id).where(history.entity_type == entity_type, history.entity_id == entity_id)
+        .order_by(history.created_at, history.id)
+    ).all()
+
+def test_create_sub_pnl_counts_it_without_touching_pnl_metrics(client, db):
+    before = db.scalar(select(models.PnLMetrics).where(models.PnLMetrics.pnl_id == 1))
+    manual = {field: getattr(before, field) for field in aggregation.ROLLUP_FIELDS}
+    db.execute(models.PnLMetrics.__table__.delete().where(models.PnLMetrics.pnl_id == 2))
+    db.commit()
+
+    for pnl_id in (1, 2):
+        response = client.post(f"/pnls/{pnl_id}/sub-pnls", json={"name": "New", "description": "Created in a test"})
+        assert response.status_code == 200
+
+    assert_rollups_match(db)
+    rollup = db.scalar(select(models.PnLRollup).where(models.PnLRollup.pnl_id == 1))
+    assert rollup.metrics_count == 5
+    after = db.scalar(select(models.PnLMetrics).where(models.PnLMetrics.pnl_id == 1))
+    assert {field: getattr(after, field) for field in aggregation.ROLLUP_FIELDS} == manual
+    assert db.scalar(select(models.PnLMetrics).where(models.PnLMetrics.pnl_id == 2)) is None
+
+def test_create_sub_pnl_is_one_transaction(client, db, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("rollup update failed")
+    monkeypatch.setattr(rollups, "count_new_metrics", fail)
+    count = db.scalar(select(func.count(models.SubPnL.id)))
+
+    with pytest.raises(RuntimeError):
+        client.post("/pnls/1/sub-pnls", json={"name": "Orphan"})
+
+    db.rollback()
+    assert db.scalar(select(func.count(models.SubPnL.id))) == count
+
+def test_create_sub_pnl_unknown_pnl(client):
+    assert client.post("/pnls/999/sub-pnls", json={"name": "Nowhere"}).status_code == 404
+
+def test_metric_updates_keep_rollups_exact(client, db, headers):
+    writes = [
+        (1, metrics(features_shipped=3, total_testcases_executed=120, sanity_time_avg_hours=1.25)),
+        (2, metrics(total_bugs_logged=7, automation_coverage_percent=33.33)),
+        (1, metrics(features_shipped=9, escaped_bugs=2, sanity_time_avg_hours=4.1)),
+        (5, metrics(regression_bugs_found=4, automation_coverage_percent=99.99)),
+    ]
+    for sub_pnl_id, values in writes:
+        assert client.put(f"/sub-pnls/{sub_pnl_id}/metrics", json=values).status_code == 200
+        assert_rollups_match(db)
+
+    response = client.post("/metrics/bulk", headers=headers, json=[
+        {"sub_pnl_id": 3, "metrics": metrics(features_shipped=11, sanity_time_avg_hours=0.5)},
+        {"sub_pnl_id": 6, "metrics": metrics(total_testcases_executed=999)},
+    ])
+    assert response.json()["applied"] == 2
+    assert_rollups_match(db)
+
+def test_new_sub_pnl_then_metrics_keep_rollups_exact(client, db):
+    sub_pnl_id = client.post("/pnls/3/sub-pnls", json={"name": "New"}).json()["id"]
+    assert_rollups_match(db)
+    assert client.put(f"/sub-pnls/{sub_pnl_id}/metrics", json=metrics(features_shipped=4, sanity_time_avg_hours=3)).status_code == 200
+    assert_rollups_match(db)
+
+def test_history_delete_keeps_rollups_exact(client, db):
+    for features in (21, 34):
+        assert client.put("/sub-pnls/4/metrics", json=metrics(features_shipped=features, sanity_time_avg_hours=features / 10)).status_code == 200
+    first, latest = history_ids(db, "sub_pnl", 4)
+
+    # Latest entry: the Sub-PnL goes back to the first update
+    assert client.delete(f"/metrics-history/{latest}").json()["restored_latest"] is True
+    assert_rollups_match(db)
+    assert db.scalar(select(models.SubPnLMetrics.features_shipped).where(models.SubPnLMetrics.sub_pnl_id == 4)) == 21
+
+    # Only entry left: back to column defaults
+    assert client.delete(f"/metrics-history/{first}").json()["restored_latest"] is True
+    assert_rollups_match(db)
+    assert db.scalar(select(models.SubPnLMetrics.features_shipped).where(models.SubPnLMetrics.sub_pnl_id == 4)) == 0
@@ -0,0 +1,48 @@
+from datetime import timedelta
+import jwt
+import pytest
+from sqlalchemy import delete
+import models
+import security
+
+def authorized(client, token):
+    """Status of an authenticated request that touches no data"""
+    return client.post("/metrics/bulk", json=[], headers={"Authorization": f"Bearer {token}"}).status_code
+
+def user_lookups(statements):
+    return [statement for statement in statements if "FROM users" in statement]
+
+def test_claims_authorize_without_a_user_lookup(client, tokens, statements):
+    assert authorized(client, tokens["access_token"]) == 200
+    assert user_lookups(statements) == []
+
+def test_tokens_without_claims_look_the_user_up_once(client, statements):
+    legacy = security.create_token({"sub": 1})
+    assert authorized(client, legacy) == 200
+    assert authorized(client, legacy) == 200
+    assert len(user_lookups(statements)) == 1
+
+def test_token_without_claims_of_a_deleted_user(client, db):
+    legacy = security.create_token({"sub": 1})
+    db.execute(delete(models.User).where(models.User.id == 1))
+    db.commit()
+    assert authorized(client, legacy) == 401
+
+@pytest.mark.parametrize("token", [
+    security.create_token({"sub": 1, "email": "test@qalytics.com", "role": "admin"}, timedelta(seconds=-1)),
+    jwt.encode({"sub": 1, "email": "x", "role": "admin", "exp": 4102444800}, "another-secret", algorithm="HS256"),
+    jwt.encode({"email": "x", "role": "admin", "exp": 4102444800}, security.SECRET_KEY, algorithm="HS256"),
+    jwt.encode({"sub": 1, "email": "x", "role": "admin"}, security.SECRET_KEY, algorithm="HS256"),
+    "not-a-token",
+])
+def test_invalid_tokens(client, token):
+    assert authorized(client, token) == 401
+
+def test_missing_or_malformed_header(client):
+    assert client.post("/metrics/bulk", json=[]).status_code == 401
+    assert client.post("/metrics/bulk", json=[], headers={"Authorization": "Basic abc"}).status_code == 401
+
+def test_logout_revokes_a_cached_token(client, tokens, headers):
+    assert authorized(client, tokens["access_token"]) == 200
+    assert client.post("/auth/logout", headers=headers).status_code == 200
+    assert authorized(client, tokens["access_token"]) == 401
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select
+import models
+import trends
+
+AT = datetime(2024, 5, 15, 10, 30, tzinfo=timezone.utc)  # A Wednesday
+
+def metrics(**values):
+    return {
+        "features_shipped": 0, "total_testcases_executed": 0, "total_bugs_logged": 0,
+        "regression_bugs_found": 0, "sanity_time_avg_hours": 0, "automation_coverage_percent": 0,
+        "escaped_bugs": 0, **values,
+    }
+
+def snapshot(value, at):
+    return {"entity_type": "sub_pnl", "entity_id": 9, "metrics_data": {"features_shipped": value, "note": "x"}, "created_at": at}
+
+def stored(db, bucket):
+    db.rollback()
+    trend = models.MetricsTrendBucket
+    return db.scalars(select(trend).where(
+        trend.entity_type == "sub_pnl", trend.entity_id == 9, trend.bucket == bucket
+    )).all()
+
+def test_bucket_starts():
+    assert trends.bucket_start("day", AT) == datetime(2024, 5, 15, tzinfo=timezone.utc)
+    assert trends.bucket_start("week", AT) == datetime(2024, 5, 13, tzinfo=timezone.utc)
+    assert trends.bucket_start("month", AT) == datetime(2024, 5, 1, tzinfo=timezone.utc)
+    assert trends.bucket_end("month", datetime(2024, 12, 1)) == datetime(2025, 1, 1)
+
+def test_record_merges_into_existing_buckets(db):
+    trends.record(db, [snapshot(4, AT), snapshot(10, AT + timedelta(hours=1))])
+    db.commit()
+    # An older snapshot recorded later joins the stats but is not the last value
+    trends.record(db, [snapshot(1, AT - timedelta(hours=1))])
+    db.commit()
+
+    for bucket in trends.BUCKETS:
+        row, = stored(db, bucket)
+        assert row.metric == "features_shipped"  # Non-numeric values are skipped
+        assert (row.last_value, row.min_value, row.max_value, row.sum_value, row.sample_count) == (10, 1, 10, 15, 3)
+
+    trends.record(db, [snapshot(7, AT + timedelta(days=1))])
+    db.commit()
+    assert len(stored(db, "day")) == 2
+    week, = stored(db, "week")
+    assert (week.last_value, week.sample_count) == (7, 4)
+
+def test_endpoint_returns_series_per_metric(client):
+    for features in (3, 8):
+        assert client.put("/sub-pnls/1/metrics", json=metrics(features_shipped=features)).status_code == 200
+
+    response = client.get("/sub-pnls/1/trends", params={"bucket": "day", "metric": "features_shipped"})
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["sub_pnl_id"], body["entity_type"], body["bucket"]) == (1, "sub_pnl", "day")
+    point, = body["series"]["features_shipped"]
+    assert (point["last"], point["min"], point["max"], point["avg"], point["count"]) == (8, 3, 8, 5.5, 2)
+
+    assert set(client.get("/sub-pnls/1/trends").json()["series"]) >= {"features_shipped", "escaped_bugs"}
+    assert client.get("/sub-pnls/1/trends", params={"entity_type": "sub_pnl_detail"}).json()["series"] == {}
+    tomorrow = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+    assert client.get("/sub-pnls/1/trends", params={"bucket": "day", "from": tomorrow}).json()["series"] == {}
+
+def test_endpoint_errors(client):
+    assert client.get("/sub-pnls/999/trends").status_code == 404
+    assert client.get("/sub-pnls/1/trends", params={"metric": "nope"}).status_code == 400
+    assert client.get("/sub-pnls/1/trends", params={"bucket": "year"}).status_code == 422
+    assert client.get("/sub-pnls/1/trends", params={"entity_type": "pnl"}).status_code == 422
+
+def test_history_delete_rebuilds_buckets(client, db):
+    for features in (3, 8):
+        assert client.put("/sub-pnls/1/metrics", json=metrics(features_shipped=features)).status_code == 200
+    history = models.MetricsHistory
+    latest = db.scalar(select(history.id).where(history.entity_type == "sub_pnl", history.entity_id == 1).order_by(history.id.desc()))
+    assert client.delete(f"/metrics-history/{latest}").status_code == 200
+
+    series = client.get("/sub-pnls/1/trends", params={"bucket": "month", "metric": "features_shipped"}).json()["series"]
+    point, = series["features_shipped"]
+    assert (point["last"], point["count"]) == (3, 1)
@@ -0,0 +1,61 @@
+from sqlalchemy import delete
+import models
+
+def metrics(**values):
+    return {
+        "features_shipped": 0, "total_testcases_executed": 0, "total_bugs_logged": 0,
+        "regression_bugs_found": 0, "sanity_time_avg_hours": 0, "automation_coverage_percent": 0,
+        "escaped_bugs": 0, **values,
+    }
+
+def selects(statements):
+    return [statement for statement in statements if statement.lstrip().upper().startswith("SELECT")]
+
+def test_sub_pnl_view_matches_the_single_endpoints(client, statements):
+    for features in range(1, 4):
+        assert client.put("/sub-pnls/1/metrics", json=metrics(features_shipped=features)).status_code == 200
+
+    statements.clear()
+    response = client.get("/views/sub-pnl/1", params={"history_limit": 2})
+    assert response.status_code == 200
+    # The Sub-PnL with its family, then one page of history
+    assert len(selects(statements)) == 2
+    view = response.json()
+
+    sub_pnl = client.get("/sub-pnls/1").json()
+    assert view["sub_pnl"] == {key: sub_pnl[key] for key in view["sub_pnl"]}
+    assert view["pnl"] == client.get(f"/pnls/{sub_pnl['pnl_id']}").json()
+    assert view["metrics"] == client.get("/sub-pnls/1/metrics").json()
+    assert view["detail_metrics"] == client.get("/sub-pnls/1/detail-metrics").json()
+    siblings = [row for row in client.get(f"/pnls/{sub_pnl['pnl_id']}/sub-pnls").json() if row["id"] != 1]
+    assert view["siblings"] == siblings
+
+    history = client.get("/sub-pnls/1/metrics-history", params={"limit": 2}).json()
+    assert [entry["id"] for entry in view["history"]] == [entry["id"] for entry in history]
+    assert [entry["metrics_data"]["features_shipped"] for entry in view["history"]] == [3, 2]
+    rest = client.get("/sub-pnls/1/metrics-history", params={"cursor": view["history_next_cursor"]}).json()
+    assert [entry["metrics_data"]["features_shipped"] for entry in rest] == [1]
+
+def test_pnl_view_matches_the_single_endpoints(client):
+    view = client.get("/views/pnl/1").json()
+    assert view["pnl"] == client.get("/pnls/1").json()
+    assert view["metrics"] == client.get("/pnls/1/metrics").json()
+    assert view["sub_pnls"] == client.get("/pnls/1/sub-pnls").json()
+    assert (view["history"], view["history_next_cursor"]) == ([], None)
+
+def test_views_without_stored_metrics_use_virtual_defaults(client, db):
+    db.execute(delete(models.PnLMetrics).where(models.PnLMetrics.pnl_id == 2))
+    db.execute(delete(models.SubPnLMetrics).where(models.SubPnLMetrics.sub_pnl_id == 1))
+    db.commit()
+
+    pnl_view = client.get("/views/pnl/2").json()
+    assert pnl_view["metrics"]["id"] is None
+    assert pnl_view["metrics"] == client.get("/pnls/2/metrics").json()
+    sub_pnl_view = client.get("/views/sub-pnl/1").json()
+    assert sub_pnl_view["metrics"]["id"] is None
+    assert sub_pnl_view["metrics"]["features_shipped"] == 0
+
+def test_view_errors(client):
+    assert client.get("/views/sub-pnl/999").status_code == 404
+    assert client.get("/views/pnl/999").status_code == 404
+    assert client.get("/views/pnl/1", params={"history_limit": 0}).status_code == 422
@@ -0,0 +1,41 @@
+from sqlalchemy import delete, func, select
+import models
+from conftest import writes
+
+def drop_rows(db, model, **owner):
+    (column, value), = owner.items()
+    db.execute(delete(model).where(getattr(model, column) == value))
+    db.commit()
+
+def count(db, model):
+    db.rollback()
+    return db.scalar(select(func.count(model.id)))
+
+def test_metrics_reads_answer_defaults_without_inserting(client, db, statements):
+    drop_rows(db, models.SubPnLMetrics, sub_pnl_id=2)
+    drop_rows(db, models.SubPnLDetailMetrics, sub_pnl_id=2)
+    statements.clear()
+
+    metrics = client.get("/sub-pnls/2/metrics").json()
+    assert (metrics["id"], metrics["sub_pnl_id"], metrics["features_shipped"], metrics["test_coverage_percent"]) == (None, 2, 0, 0)
+    detail = client.get("/sub-pnls/2/detail-metrics").json()
+    assert (detail["id"], detail["total_testcases_executed"]) == (None, 0)
+    assert writes(statements) == []
+    assert count(db, models.SubPnLMetrics) == 9
+    assert count(db, models.SubPnLDetailMetrics) == 9
+
+def test_pnl_metrics_are_aggregated_without_inserting(client, db, statements):
+    drop_rows(db, models.PnLMetrics, pnl_id=3)
+    statements.clear()
+
+    metrics = client.get("/pnls/3/metrics").json()
+    assert metrics["id"] is None
+    assert writes(statements) == []
+    features = db.scalar(
+        select(func.sum(models.SubPnLMetrics.features_shipped)).join(models.SubPnL).where(models.SubPnL.pnl_id == 3)
+    )
+    assert metrics["features_shipped"] == features
+    assert count(db, models.PnLMetrics) == 2
+
+def test_unknown_pnl(client):
+    assert client.get("/pnls/999/metrics").status_code == 404
@@ -0,0 +1,15 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+def as_utc(value: datetime) -> datetime:
+    """An aware UTC datetime; naive values are taken to be UTC already"""
+    # SQLite hands back naive UTC timestamps
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """A query bound comparable with stored timestamps, which SQLite compares as naive text"""
+    if value is None:
+        return None
+    return as_utc(value).replace(tzinfo=None)
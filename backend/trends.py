@@ -0,0 +1,170 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Sequence
+from sqlalchemy import Table, case, delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+import models
+from timeutil import as_utc
+
+BUCKETS = ("day", "week", "month")
+
+# Columns identifying one bucket row; the upsert conflict target
+KEY_COLUMNS = ("entity_type", "entity_id", "bucket", "bucket_start", "metric")
+
+# History rows read per round trip while rebuilding
+REBUILD_BATCH_SIZE = 5000
+
+def bucket_start(bucket: str, at: datetime) -> datetime:
+    """Start of the day, ISO week or month containing ``at``, in UTC"""
+    day = as_utc(at).replace(hour=0, minute=0, second=0, microsecond=0)
+    if bucket == "day":
+        return day
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+def bucket_end(bucket: str, start: datetime) -> datetime:
+    if bucket == "day":
+        return start + timedelta(days=1)
+    if bucket == "week":
+        return start + timedelta(weeks=1)
+    return (start + timedelta(days=32)).replace(day=1)
+
+def _aggregate(history_rows: Iterable[dict], buckets: Sequence[str] = BUCKETS) -> Dict[tuple, dict]:
+    """Fold history snapshots into one stats entry per bucket row.
+
+    Rows are expected in write order: on equal timestamps the later row
+    provides the bucket's last value.
+    """
+    stats = {}
+    now = datetime.now(timezone.utc)
+    for row in history_rows:
+        at = as_utc(row.get("created_at") or now)
+        for metric, value in row["metrics_data"].items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            for bucket in buckets:
+                key = (row["entity_type"], row["entity_id"], bucket, bucket_start(bucket, at), metric)
+                entry = stats.get(key)
+                if entry is None:
+                    stats[key] = {
+                        "last_value": value, "last_at": at, "min_value": value,
+                        "max_value": value, "sum_value": value, "sample_count": 1,
+                    }
+                    continue
+                if at >= entry["last_at"]:
+                    entry["last_value"], entry["last_at"] = value, at
+                entry["min_value"] = min(entry["min_value"], value)
+                entry["max_value"] = max(entry["max_value"], value)
+                entry["sum_value"] += value
+                entry["sample_count"] += 1
+    return stats
+
+def _upsert(db: Session, stats: Dict[tuple, dict], table: Table = None):
+    """Merge stats into the stored buckets with INSERT ... ON CONFLICT DO UPDATE"""
+    if not stats:
+        return
+    if table is None:
+        table = models.MetricsTrendBucket.__table__
+    if db.get_bind().dialect.name == "postgresql":
+        stmt, least, greatest = postgresql.insert(table), func.least, func.greatest
+    else:
+        # SQLite's multi-argument min()/max() are scalar functions
+        stmt, least, greatest = sqlite.insert(table), func.min, func.max
+
+    newer = stmt.excluded.last_at >= table.c.last_at
+    stmt = stmt.on_conflict_do_update(index_elements=list(KEY_COLUMNS), set_={
+        "last_value": case((newer, stmt.excluded.last_value), else_=table.c.last_value),
+        "last_at": case((newer, stmt.excluded.last_at), else_=table.c.last_at),
+        "min_value": least(table.c.min_value, stmt.excluded.min_value),
+        "max_value": greatest(table.c.max_value, stmt.excluded.max_value),
+        "sum_value": table.c.sum_value + stmt.excluded.sum_value,
+        "sample_count": table.c.sample_count + stmt.excluded.sample_count,
+    })
+    db.execute(stmt, [dict(zip(KEY_COLUMNS, key), **entry) for key, entry in stats.items()])
+
+def record(db: Session, history_rows: List[dict]):
+    """Add history rows (MetricsHistory column values) to their trend buckets.
+
+    Snapshots without ``created_at`` count as taken now. The caller commits,
+    so buckets change in the same transaction as the history itself.
+    """
+    _upsert(db, _aggregate(history_rows))
+
+def rebuild_buckets(db: Session, entity_type: str, entity_id: int, at: datetime):
+    """Recompute the buckets of one entity that contain ``at`` from its history"""
+    history = models.MetricsHistory
+    trend = models.MetricsTrendBucket
+    for bucket in BUCKETS:
+        start = bucket_start(bucket, at)
+        db.execute(delete(trend).where(
+            trend.entity_type == entity_type,
+            trend.entity_id == entity_id,
+            trend.bucket == bucket,
+            trend.bucket_start == start
+        ).execution_options(synchronize_session=False))
+        rows = db.execute(
+            select(history.entity_type, history.entity_id, history.metrics_data, history.created_at)
+            .where(
+                history.entity_type == entity_type,
+                history.entity_id == entity_id,
+                history.created_at >= start,
+                history.created_at < bucket_end(bucket, start)
+            )
+            .order_by(history.created_at, history.id)
+        ).mappings()
+        _upsert(db, _aggregate(rows, (bucket,)))
+
+def rebuild(db: Session, history: Table = None, buckets: Table = None) -> int:
+    """Rebuild every trend bucket from metrics history and commit; returns the rows read.
+
+    ``history`` and ``buckets`` default to the models' tables; migrations pass
+    their own definitions of the tables as they are at that point.
+    """
+    history = models.MetricsHistory.__table__ if history is None else history
+    buckets = models.MetricsTrendBucket.__table__ if buckets is None else buckets
+    db.execute(delete(buckets))
+    result = db.execute(
+        select(history.c.entity_type, history.c.entity_id, history.c.metrics_data, history.c.created_at)
+        .order_by(history.c.created_at, history.c.id)
+        .execution_options(yield_per=REBUILD_BATCH_SIZE)
+    ).mappings()
+    count = 0
+    for rows in result.partitions():
+        _upsert(db, _aggregate(rows), buckets)
+        count += len(rows)
+    db.commit()
+    return count
+
+async def load_series(db: AsyncSession, entity_type: str, entity_id: int, bucket: str,
+                      since: Optional[datetime] = None, until: Optional[datetime] = None,
+                      metric: Optional[str] = None) -> Dict[str, List[dict]]:
+    """Stored buckets of one entity as {metric: [points oldest first]}.
+
+    ``since`` includes the whole bucket it falls in; ``until`` is exclusive.
+    """
+    trend = models.MetricsTrendBucket
+    stmt = select(trend).where(
+        trend.entity_type == entity_type,
+        trend.entity_id == entity_id,
+        trend.bucket == bucket
+    ).order_by(trend.metric, trend.bucket_start)
+    if metric:
+        stmt = stmt.where(trend.metric == metric)
+    if since:
+        stmt = stmt.where(trend.bucket_start >= bucket_start(bucket, since))
+    if until:
+        stmt = stmt.where(trend.bucket_start < as_utc(until))
+
+    series = {}
+    for row in (await db.scalars(stmt)).all():
+        series.setdefault(row.metric, []).append({
+            "bucket_start": as_utc(row.bucket_start),
+            "last": row.last_value,
+            "min": row.min_value,
+            "max": row.max_value,
+            "avg": row.sum_value / row.sample_count,
+            "count": row.sample_count,
+        })
+    return series
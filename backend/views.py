@@ -0,0 +1,100 @@
+from typing import Iterable
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import Session, aliased, joinedload
+import models
+import schemas
+import defaults
+import pagination
+
+# History entries included in a page view; later pages come from the history endpoints
+VIEW_HISTORY_LIMIT = 20
+
+def _recent_history(db: Session, entity_types: Iterable[str], entity_id: int, limit: int):
+    history = models.MetricsHistory
+    stmt = select(history).options(joinedload(history.user)).where(
+        history.entity_type.in_(list(entity_types)),
+        history.entity_id == entity_id
+    )
+    return pagination.split_history_page(db.scalars(pagination.history_page_statement(stmt, None, limit)).all(), limit)
+
+def _sub_pnl_summary(sub_pnl: models.SubPnL) -> schemas.SubPnLWithDetailMetrics:
+    return schemas.SubPnLWithDetailMetrics(
+        id=sub_pnl.id,
+        name=sub_pnl.name,
+        description=sub_pnl.description,
+        pnl_id=sub_pnl.pnl_id,
+        created_at=sub_pnl.created_at,
+        updated_at=sub_pnl.updated_at,
+        detail_metrics=sub_pnl.active_detail_metrics or defaults.virtual_row(models.SubPnLDetailMetrics, sub_pnl_id=sub_pnl.id)
+    )
+
+def build_sub_pnl_view(db: Session, sub_pnl_id: int, history_limit: int = VIEW_HISTORY_LIMIT) -> schemas.SubPnLView:
+    """Sub-PnL page payload in two queries.
+
+    The first loads every Sub-PnL of the same PnL with the PnL, metrics and
+    active detail metrics joined in, which covers the Sub-PnL itself and its
+    siblings; the second is the first page of its history.
+    """
+    owner = aliased(models.SubPnL)
+    sub_pnls = db.scalars(
+        select(models.SubPnL)
+        .where(models.SubPnL.pnl_id == select(owner.pnl_id).where(owner.id == sub_pnl_id).scalar_subquery())
+        .options(
+            joinedload(models.SubPnL.pnl),
+            joinedload(models.SubPnL.sub_pnl_metrics),
+            joinedload(models.SubPnL.active_detail_metrics)
+        )
+        .order_by(models.SubPnL.id)
+    ).unique().all()
+    sub_pnl = next((row for row in sub_pnls if row.id == sub_pnl_id), None)
+    if not sub_pnl:
+        raise HTTPException(status_code=404, detail="Sub PnL not found")
+
+    # Virtual defaults for metrics that do not exist yet
+    metrics = min(sub_pnl.sub_pnl_metrics, key=lambda row: row.id, default=None)
+    if not metrics:
+        metrics = defaults.virtual_row(models.SubPnLMetrics, sub_pnl_id=sub_pnl_id)
+    detail_metrics = sub_pnl.active_detail_metrics
+    if not detail_metrics:
+        detail_metrics = defaults.virtual_row(models.SubPnLDetailMetrics, sub_pnl_id=sub_pnl_id)
+
+    history, next_cursor = _recent_history(db, ("sub_pnl", "sub_pnl_detail"), sub_pnl_id, history_limit)
+    return schemas.SubPnLView(
+        sub_pnl=sub_pnl,
+        pnl=sub_pnl.pnl,
+        metrics=metrics,
+        detail_metrics=detail_metrics,
+        history=history,
+        history_next_cursor=next_cursor,
+        siblings=[_sub_pnl_summary(row) for row in sub_pnls if row.id != sub_pnl_id]
+    )
+
+def build_pnl_view(db: Session, pnl_id: int, history_limit: int = VIEW_HISTORY_LIMIT) -> schemas.PnLView:
+    """PnL page payload in two queries: the PnL with its metrics and Sub-PnLs joined in, then its history.
+
+    A PnL without a metrics row gets virtual metrics from its rollup, which
+    costs one more query.
+    """
+    pnl = db.scalars(
+        select(models.PnL).where(models.PnL.id == pnl_id).options(
+            joinedload(models.PnL.pnl_metrics),
+            joinedload(models.PnL.sub_pnls).joinedload(models.SubPnL.active_detail_metrics)
+        )
+    ).unique().one_or_none()
+    if not pnl:
+        raise HTTPException(status_code=404, detail="PnL not found")
+
+    # Keep the oldest metrics row if a PnL ever got duplicates
+    metrics = min(pnl.pnl_metrics, key=lambda row: row.id, default=None)
+    if not metrics:
+        metrics = defaults.virtual_pnl_metrics(db, pnl_id)
+
+    history, next_cursor = _recent_history(db, ("pnl",), pnl_id, history_limit)
+    return schemas.PnLView(
+        pnl=pnl,
+        metrics=metrics,
+        history=history,
+        history_next_cursor=next_cursor,
+        sub_pnls=[_sub_pnl_summary(row) for row in sorted(pnl.sub_pnls, key=lambda row: row.id)]
+    )
@@ -0,0 +1,26 @@
+import { useEffect, useRef } from 'react';
+import { subscribeToEvents } from '../services/api';
+
+// Subscribe to live metric changes while the component is mounted.
+// Handlers may change on every render; the stream is only reopened
+// when the filtered ids change.
+export const useMetricsEvents = ({ pnlIds = [], subPnlIds = [] } = {}, handlers = {}) => {
+  const handlersRef = useRef(handlers);
+  handlersRef.current = handlers;
+
+  const pnlKey = pnlIds.join(',');
+  const subPnlKey = subPnlIds.join(',');
+
+  useEffect(() => {
+    const dispatch = (type) => (data) => handlersRef.current[type]?.(data);
+    return subscribeToEvents(
+      { pnlIds, subPnlIds },
+      {
+        metrics: dispatch('metrics'),
+        history_deleted: dispatch('history_deleted'),
+        refresh: dispatch('refresh'),
+        reset: dispatch('reset'),
+      }
+    );
+  }, [pnlKey, subPnlKey]);
+};
@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { dashboardAPI } from '../services/api';
+import { useMetricsEvents } from '../hooks/useMetricsEvents';
 import { Card } from '../components/ui/card';
 import { Button } from '../components/ui/button';
 import { 
@@ -36,42 +37,26 @@ const Dashboard = () => {
     fetchDashboardData();
   }, []);
 
-  const fetchDashboardData = async () => {
+  useEffect(() => {
+    updateKpis(pnls);
+  }, [pnls]);
+
+  // Patch PnL metrics from live changes instead of re-fetching the dashboard
+  const reloadQuietly = () => fetchDashboardData({ showLoading: false });
+  useMetricsEvents({}, {
+    metrics: (event) => {
+      if (event.entity_type !== 'pnl') return;
+      setPnls((prev) => prev.map((pnl) => (pnl.id === event.pnl_id ? { ...pnl, metrics: event.metrics } : pnl)));
+    },
+    refresh: reloadQuietly,
+    reset: reloadQuietly,
+  });
+
+  const fetchDashboardData = async ({ showLoading = true } = {}) => {
     try {
-      setLoading(true);
+      if (showLoading) setLoading(true);
       const response = await dashboardAPI.getDashboard();
       setPnls(response.data);
-      
-      // Calculate KPIs from metrics data
-      const data = response.data;
-      const totalPnLs = data.length;
-      const totalTestCases = data.reduce((sum, pnl) => sum + (pnl.metrics?.total_testcases_executed || 0), 0);
-      const totalBugsLogged = data.reduce((sum, pnl) => sum + (pnl.metrics?.total_bugs_logged || 0), 0);
-      const totalRegressionBugs = data.reduce((sum, pnl) => sum + (pnl.metrics?.regression_bugs_found || 0), 0);
-      const totalEscapedBugs = data.reduce((sum, pnl) => sum + (pnl.metrics?.escaped_bugs || 0), 0);
-      const totalBugs = totalBugsLogged + totalEscapedBugs;
-      
-      // Calculate averages from actual metrics
-      const averageAutomation = totalPnLs > 0 ? 
-        data.reduce((sum, pnl) => sum + (pnl.metrics?.automation_coverage_percent || 0), 0) / totalPnLs : 0;
-      
-      // Calculate test coverage based on bugs found vs escaped
-      const averageCoverage = totalBugs > 0 ? 
-        ((totalBugsLogged / totalBugs) * 100) : 0;
-      
-      const testCasesPerBug = totalBugs > 0 ? totalTestCases / totalBugs : 0;
-      const bugsPerHundredTests = totalTestCases > 0 ? (totalBugs / totalTestCases) * 100 : 0;
-
-      setKpis({
-        totalPnLs,
-        totalTestCases,
-        averageCoverage: Math.round(averageCoverage * 10) / 10,
-        averageAutomation: Math.round(averageAutomation * 10) / 10,
-        totalLowerEnvBugs: totalBugsLogged,
-        totalProdBugs: totalEscapedBugs,
-        testCasesPerBug: Math.round(testCasesPerBug * 10) / 10,
-        bugsPerHundredTests: Math.round(bugsPerHundredTests * 100) / 100
-      });
     } catch (err) {
       setError('Failed to fetch dashboard data');
       console.error('Dashboard error:', err);
@@ -80,6 +65,38 @@ const Dashboard = () => {
     }
   };
 
+  // Calculate KPIs from metrics data
+  const updateKpis = (data) => {
+    const totalPnLs = data.length;
+    const totalTestCases = data.reduce((sum, pnl) => sum + (pnl.metrics?.total_testcases_executed || 0), 0);
+    const totalBugsLogged = data.reduce((sum, pnl) => sum + (pnl.metrics?.total_bugs_logged || 0), 0);
+    const totalRegressionBugs = data.reduce((sum, pnl) => sum + (pnl.metrics?.regression_bugs_found || 0), 0);
+    const totalEscapedBugs = data.reduce((sum, pnl) => sum + (pnl.metrics?.escaped_bugs || 0), 0);
+    const totalBugs = totalBugsLogged + totalEscapedBugs;
+    
+    // Calculate averages from actual metrics
+    const averageAutomation = totalPnLs > 0 ? 
+      data.reduce((sum, pnl) => sum + (pnl.metrics?.automation_coverage_percent || 0), 0) / totalPnLs : 0;
+    
+    // Calculate test coverage based on bugs found vs escaped
+    const averageCoverage = totalBugs > 0 ? 
+      ((totalBugsLogged / totalBugs) * 100) : 0;
+    
+    const testCasesPerBug = totalBugs > 0 ? totalTestCases / totalBugs : 0;
+    const bugsPerHundredTests = totalTestCases > 0 ? (totalBugs / totalTestCases) * 100 : 0;
+
+    setKpis({
+      totalPnLs,
+      totalTestCases,
+      averageCoverage: Math.round(averageCoverage * 10) / 10,
+      averageAutomation: Math.round(averageAutomation * 10) / 10,
+      totalLowerEnvBugs: totalBugsLogged,
+      totalProdBugs: totalEscapedBugs,
+      testCasesPerBug: Math.round(testCasesPerBug * 10) / 10,
+      bugsPerHundredTests: Math.round(bugsPerHundredTests * 100) / 100
+    });
+  };
+
   if (loading) {
     return (
       <div className="min-h-screen bg-gray-50 flex items-center justify-center">
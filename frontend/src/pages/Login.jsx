@@ -18,10 +18,10 @@ export default function Login() {
 
     try {
       const response = await authAPI.login({ email, password });
-      const { access_token, user } = response.data;
+      const { access_token, refresh_token, user } = response.data;
       
       // Use the auth context to handle login
-      login(access_token, user);
+      login(access_token, user, refresh_token);
 
       // Navigate to dashboard
       navigate('/dashboard');
@@ -66,9 +66,8 @@ const MetricsHistory = () => {
     });
   };
 
-  const formatMetricsData = (jsonString) => {
+  const formatMetricsData = (data) => {
     try {
-      const data = JSON.parse(jsonString);
       return Object.entries(data).map(([key, value]) => (
         <div key={key} className="text-xs">
           <span className="font-medium">{key.replace(/_/g, ' ').replace(/\b\w/g, l => l.toUpperCase())}:</span> {value}
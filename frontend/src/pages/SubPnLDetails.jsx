@@ -1,7 +1,8 @@
 import React, { useState, useEffect } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
-import { subPnlAPI } from '../services/api';
+import { viewsAPI } from '../services/api';
 import api from '../services/api';
+import { useMetricsEvents } from '../hooks/useMetricsEvents';
 import { Card } from '../components/ui/card';
 import { Button } from '../components/ui/button';
 import { Input } from '../components/ui/input';
@@ -42,22 +43,36 @@ const SubPnLDetails = () => {
   useEffect(() => {
     if (subPnlId) {
       fetchSubPnLDetails();
-      fetchMetricsHistory();
     }
   }, [subPnlId]);
 
+  // The page's Sub-PnL with its detail metrics, and its history, in one request
+  const fetchView = async () => {
+    const { data: view } = await viewsAPI.getSubPnL(subPnlId, { history_limit: 100 });
+    setSubPnl({ ...view.sub_pnl, detail_metrics: view.detail_metrics });
+    setMetricsHistory(view.history);
+  };
+
+  // Patch from live changes made here or elsewhere; the form being edited is left alone
+  useMetricsEvents({ subPnlIds: [subPnlId] }, {
+    metrics: (event) => {
+      if (event.entity_type !== 'sub_pnl_detail') return;
+      setSubPnl(prev => (prev ? { ...prev, detail_metrics: event.metrics } : prev));
+      fetchMetricsHistory();
+    },
+    history_deleted: (event) => {
+      setMetricsHistory(prevHistory => prevHistory.filter(item => item.id !== event.id));
+    },
+    refresh: fetchView,
+    reset: fetchView,
+  });
+
   const fetchSubPnLDetails = async () => {
     try {
       setLoading(true);
       setError(null); // Clear previous errors
       
-      const response = await subPnlAPI.getById(subPnlId);
-      
-      if (response.data) {
-        setSubPnl(response.data);
-      } else {
-        setError('No data received from server');
-      }
+      await fetchView();
     } catch (err) {
       
       if (err.response) {
@@ -157,13 +172,7 @@ const SubPnLDetails = () => {
     return key.replace(/_/g, ' ').replace(/\b\w/g, l => l.toUpperCase());
   };
 
-  const parseMetricsData = (jsonString) => {
-    try {
-      return JSON.parse(jsonString);
-    } catch {
-      return {};
-    }
-  };
+  const parseMetricsData = (data) => data || {};
 
   const getChangeTypeColor = (changeType) => {
     switch (changeType) {
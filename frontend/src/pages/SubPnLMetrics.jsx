@@ -3,7 +3,8 @@ import { useParams, useLocation, useNavigate } from 'react-router-dom';
 import { Card, CardHeader, CardTitle, CardContent } from '../components/ui/card';
 import { Button } from '../components/ui/button';
 import { Input } from '../components/ui/input';
-import api, { metricsHistoryAPI } from '../services/api';
+import api, { metricsHistoryAPI, viewsAPI } from '../services/api';
+import { useMetricsEvents } from '../hooks/useMetricsEvents';
 import { 
   ArrowLeft, 
   Edit3, 
@@ -105,6 +106,9 @@ const EditableMetricCard = React.memo(({
 
 EditableMetricCard.displayName = 'EditableMetricCard';
 
+// History entries shown, as many as the history endpoint returns by default
+const HISTORY_LIMIT = 100;
+
 const SubPnLMetrics = () => {
   const { subPnlId } = useParams();
   const location = useLocation();
@@ -129,25 +133,38 @@ const SubPnLMetrics = () => {
     loadAllData();
   }, [subPnlId]);
 
+  // Patch from live changes made here or elsewhere; the form being edited is left alone
+  const reloadMetrics = async () => {
+    const { data: view } = await viewsAPI.getSubPnL(subPnlId, { history_limit: HISTORY_LIMIT });
+    setMetrics(view.detail_metrics);
+    setHistory(view.history);
+  };
+  useMetricsEvents({ subPnlIds: [subPnlId] }, {
+    metrics: (event) => {
+      if (event.entity_type !== 'sub_pnl_detail') return;
+      setMetrics(event.metrics);
+      loadHistory();
+    },
+    history_deleted: (event) => {
+      setHistory(prevHistory => prevHistory.filter(item => item.id !== event.id));
+    },
+    refresh: reloadMetrics,
+    reset: reloadMetrics,
+  });
+
   const loadAllData = async () => {
     try {
       setLoading(true);
       setError(null);
       
-      // Load Sub-PnL details
-      const detailsResponse = await api.get(`/sub-pnls/${subPnlId}`);
-      setSubPnlDetails(detailsResponse.data);
-      
-      // Load current metrics
-      const metricsResponse = await api.get(`/sub-pnls/${subPnlId}/detail-metrics`);
-      const metricsData = metricsResponse.data;
+      // Sub-PnL details, current metrics and history in one round trip
+      const { data: view } = await viewsAPI.getSubPnL(subPnlId, { history_limit: HISTORY_LIMIT });
+      setSubPnlDetails(view.sub_pnl);
       
       // Set the loaded metrics data
-      setMetrics(metricsData);
-      setFormData(metricsData);
-      
-      // Load history (with timeout protection)
-      await loadHistory();
+      setMetrics(view.detail_metrics);
+      setFormData(view.detail_metrics);
+      setHistory(view.history);
       
     } catch (err) {
       console.error('Error loading data:', err);
@@ -242,17 +259,10 @@ const SubPnLMetrics = () => {
   };
 
   const calculateDerivedMetrics = () => {
-    const bugBasedCoverage = metrics.total_bugs_logged > 0 
-      ? ((metrics.total_bugs_logged / (metrics.total_bugs_logged + metrics.escaped_bugs)) * 100).toFixed(1)
-      : 0;
-    
-    const testcasesPerBug = metrics.total_bugs_logged > 0
-      ? (metrics.total_testcases_executed / metrics.total_bugs_logged).toFixed(1)
-      : 0;
-    
-    const bugsPer100Tests = metrics.total_testcases_executed > 0
-      ? ((metrics.total_bugs_logged / metrics.total_testcases_executed) * 100).toFixed(1)
-      : 0;
+    // Calculated by the API on every write
+    const bugBasedCoverage = Number(metrics.test_coverage_percent || 0).toFixed(1);
+    const testcasesPerBug = Number(metrics.testcases_per_bug || 0).toFixed(1);
+    const bugsPer100Tests = Number(metrics.bugs_per_100_tests || 0).toFixed(1);
     
     const peerReviewPercentage = metrics.total_testcases_executed > 0
       ? ((metrics.testcase_peer_review / metrics.total_testcases_executed) * 100).toFixed(1)
@@ -645,7 +655,7 @@ const SubPnLMetrics = () => {
                             <div className="grid grid-cols-2 md:grid-cols-3 gap-2">
                               {(() => {
                                 try {
-                                  const data = JSON.parse(item.metrics_data);
+                                  const data = item.metrics_data;
                                   return Object.entries(data).map(([key, value]) => (
                                     <div key={key} className="text-xs">
                                       <span className="font-medium">
@@ -666,7 +676,7 @@ const SubPnLMetrics = () => {
                               <div className="grid grid-cols-2 md:grid-cols-3 gap-2">
                                 {(() => {
                                   try {
-                                    const data = JSON.parse(item.previous_values);
+                                    const data = item.previous_values;
                                     return Object.entries(data).map(([key, value]) => (
                                       <div key={key} className="text-xs">
                                         <span className="font-medium">
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
-import { subPnlAPI, pnlAPI } from '../services/api';
+import { viewsAPI } from '../services/api';
 import { Card } from '../components/ui/card';
 import { Button } from '../components/ui/button';
 import { Building2, ChevronRight, ChevronLeft, Package, TestTube, Bug, Clock, TrendingUp, AlertTriangle } from 'lucide-react';
@@ -23,14 +23,11 @@ const SubPnLs = () => {
     try {
       setLoading(true);
       
-      // Fetch PnL details and sub PnLs
-      const [pnlResponse, subPnlsResponse] = await Promise.all([
-        pnlAPI.getById(pnlId),
-        subPnlAPI.getByPnL(pnlId)
-      ]);
+      // PnL details and its sub PnLs in one request
+      const { data: view } = await viewsAPI.getPnL(pnlId, { history_limit: 1 });
       
-      setPnl(pnlResponse.data);
-      setSubPnls(subPnlsResponse.data);
+      setPnl(view.pnl);
+      setSubPnls(view.sub_pnls);
     } catch (err) {
       setError('Failed to fetch Sub-PnL data');
       console.error('Sub-PnL error:', err);
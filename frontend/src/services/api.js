@@ -9,30 +9,110 @@ const api = axios.create({
   timeout: 10000,
   headers: {
     'Content-Type': 'application/json',
-  }
+  },
+  // 304 Not Modified is answered from the ETag cache below
+  validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
 });
 
+// Last ETag, body and headers per GET URL, used for conditional requests
+const MAX_ETAG_ENTRIES = 200;
+const etagCache = new Map();
+
+const etagCacheKey = (config) => api.getUri(config);
+
 // Request interceptor for auth token
 api.interceptors.request.use((config) => {
   const token = localStorage.getItem('token');
   if (token) {
     config.headers.Authorization = `Bearer ${token}`;
   }
+  if ((config.method || 'get').toLowerCase() === 'get') {
+    const cached = etagCache.get(etagCacheKey(config));
+    if (cached) {
+      config.headers['If-None-Match'] = cached.etag;
+    }
+  }
   return config;
 });
 
-// Response interceptor for error handling
+// Response interceptor for conditional requests
+api.interceptors.response.use((response) => {
+  if ((response.config.method || 'get').toLowerCase() !== 'get') {
+    return response;
+  }
+  const key = etagCacheKey(response.config);
+  if (response.status === 304) {
+    const cached = etagCache.get(key);
+    if (cached) {
+      return { ...response, status: 200, data: cached.data, headers: cached.headers };
+    }
+    return response;
+  }
+  const etag = response.headers?.etag;
+  if (etag) {
+    etagCache.delete(key);
+    etagCache.set(key, { etag, data: response.data, headers: response.headers });
+    if (etagCache.size > MAX_ETAG_ENTRIES) {
+      etagCache.delete(etagCache.keys().next().value);
+    }
+  }
+  return response;
+});
+
+const clearSession = () => {
+  localStorage.removeItem('token');
+  localStorage.removeItem('refresh_token');
+  localStorage.removeItem('user');
+  window.location.href = '/login';
+};
+
+// One refresh at a time; concurrent 401s wait for the same new token
+let refreshPromise = null;
+
+const refreshAccessToken = () => {
+  if (!refreshPromise) {
+    const refreshToken = localStorage.getItem('refresh_token');
+    refreshPromise = axios
+      .post(`${API_BASE_URL}/auth/refresh`, { refresh_token: refreshToken })
+      .then(({ data }) => {
+        localStorage.setItem('token', data.access_token);
+        localStorage.setItem('refresh_token', data.refresh_token);
+        return data.access_token;
+      })
+      .finally(() => {
+        refreshPromise = null;
+      });
+  }
+  return refreshPromise;
+};
+
+// Response interceptor for error handling: expired access tokens are
+// refreshed silently and the request retried once
 api.interceptors.response.use(
   (response) => {
     return response;
   },
-  (error) => {
-    if (error.response?.status === 401) {
-      localStorage.removeItem('token');
-      localStorage.removeItem('user');
-      window.location.href = '/login';
+  async (error) => {
+    const { config, response } = error;
+    if (response?.status !== 401) {
+      return Promise.reject(error);
+    }
+    const isAuthCall = config?.url?.startsWith('/auth/');
+    if (!config || config._retried || isAuthCall || !localStorage.getItem('refresh_token')) {
+      if (!isAuthCall) {
+        clearSession();
+      }
+      return Promise.reject(error);
+    }
+    try {
+      const token = await refreshAccessToken();
+      config._retried = true;
+      config.headers.Authorization = `Bearer ${token}`;
+      return api(config);
+    } catch (refreshError) {
+      clearSession();
+      return Promise.reject(error);
     }
-    return Promise.reject(error);
   }
 );
 
@@ -41,6 +121,7 @@ export const authAPI = {
     return api.post('/auth/login', credentials);
   },
   signup: (userData) => api.post('/auth/signup', userData),
+  logout: (refreshToken) => api.post('/auth/logout', refreshToken ? { refresh_token: refreshToken } : undefined),
 };
 
 // Dashboard API - Main PnL list with metrics
@@ -68,13 +149,39 @@ export const subPnlAPI = {
   updateDetailMetrics: (id, data) => api.put(`/sub-pnls/${id}/detail-metrics`, data),
 };
 
+// Page views: everything a page shows in one request
+export const viewsAPI = {
+  // params.history_limit: history entries included (the rest via the history endpoints)
+  getPnL: (pnlId, params = {}) => api.get(`/views/pnl/${pnlId}`, { params }),
+  getSubPnL: (subPnlId, params = {}) => api.get(`/views/sub-pnl/${subPnlId}`, { params }),
+};
+
 // Metrics History API
 export const metricsHistoryAPI = {
   getAll: (params = {}) => api.get('/metrics-history', { params }),
-  getBySubPnL: (subPnlId) => api.get(`/sub-pnls/${subPnlId}/metrics-history`),
+  // Paginated: pass the previous response's X-Next-Cursor header as params.cursor
+  getBySubPnL: (subPnlId, params = {}) => api.get(`/sub-pnls/${subPnlId}/metrics-history`, { params }),
   getByPnL: (pnlId) => api.get(`/pnls/${pnlId}/metrics-history`),
   getById: (id) => api.get(`/metrics-history/${id}`),
   delete: (id) => api.delete(`/metrics-history/${id}`),
+  // Pre-aggregated trend buckets: params.bucket ('day' | 'week' | 'month'), metric, from, to
+  getTrends: (subPnlId, params = {}) => api.get(`/sub-pnls/${subPnlId}/trends`, { params }),
+};
+
+// Live metric changes over Server-Sent Events. filters: { pnlIds, subPnlIds }
+// (a PnL also gets its Sub-PnLs' events; no filters means every event).
+// handlers: { metrics, history_deleted, refresh, reset }, called with the
+// parsed event data. The browser reconnects and resumes on its own.
+// Returns a function that closes the stream.
+export const subscribeToEvents = ({ pnlIds = [], subPnlIds = [] } = {}, handlers = {}) => {
+  const params = new URLSearchParams();
+  pnlIds.forEach((id) => params.append('pnl_id', id));
+  subPnlIds.forEach((id) => params.append('sub_pnl_id', id));
+  const source = new EventSource(`${API_BASE_URL}/events?${params}`);
+  Object.entries(handlers).forEach(([type, handler]) => {
+    source.addEventListener(type, (event) => handler(JSON.parse(event.data)));
+  });
+  return () => source.close();
 };
 
 export default api;
\ No newline at end of file